@@ -1,7 +1,12 @@
 #!/usr/bin/python
-from random import shuffle
+from random import Random
 from random import randint
-from itertools import cycle
+from random import getrandbits
+import copy
+from timeit import default_timer
+
+from dominion_events import *
+from dominion_profile import *
 
 # Config
 DRAW_SIZE = 5
@@ -11,26 +16,117 @@ DRAW_SIZE = 5
 ERROR_NUM_CARDS_TOO_FEW = 100
 ERROR_CARD_NOT_IN_SUPPLY = 101
 
-class Card:
-	"""Represents a card."""
-	def __init__(self, name, cost, kind, value, points, actions = None, end_game = False):
-		self.name = name
-		self.cost = cost
-		self.kind = kind
-		self.value = value
-		self.points = points
-		self.actions = actions
-		self.end_game = end_game
+# Turn phases
+PHASE_ACTION = "action"
+PHASE_BUY = "buy"
+
+# Card types
+CARD_COIN = "coin"
+CARD_POINT = "point"
+CARD_POITION = "potion"
+CARD_ACTION = "action"
+
+# Card effect ops, Card.effect is a flat tuple of op, argument pairs that
+# GameStateMachine.run_effect interprets in order.
+EFFECT_CARDS = 0   # Draw argument cards.
+EFFECT_ACTIONS = 1 # Argument more actions.
+EFFECT_BUYS = 2    # Argument more buys.
+EFFECT_MONEY = 3   # Argument more money.
+EFFECT_GAIN = 4    # Gain the registered card with id argument from the supply into the discard.
+EFFECT_TRASH = 5   # Trash the registered card with id argument from hand, if it is there.
+EFFECT_NAMES = ["cards", "actions", "buys", "money", "gain", "trash"] # Names in the card file, indexed by op.
+
+# Card registry, card name to the one shared Card and the Cards by card_id,
+# filled by dominion_cards from the card definition file.
+card_registry = {}
+registered_cards = []
+
+class Card(object):
+	"""Represents a card.
+
+	Cards are immutable and every copy of a card in piles and decks is the same
+	object, so equality is identity. Use the dominion_cards factories (Copper()
+	etc.) or RegisterCard instead of making Cards directly.
+
+	Members:
+	effect  -- what playing the card does, a tuple of EFFECT_* ops and their arguments
+	actions -- optional callable for effects the ops can't describe, called with the
+	           GameStateMachine after the effect
+	card_id -- index in registered_cards, None for unregistered cards
+	"""
+	__slots__ = ("card_id", "name", "cost", "kind", "value", "points", "actions", "end_game", "effect")
+
+	def __init__(self, name, cost, kind, value, points, actions = None, end_game = False, effect = (),
+				 card_id = None):
+		set_field = object.__setattr__
+		set_field(self, "card_id", card_id)
+		set_field(self, "name", name)
+		set_field(self, "cost", cost)
+		set_field(self, "kind", kind)
+		set_field(self, "value", value)
+		set_field(self, "points", points)
+		set_field(self, "actions", actions)
+		set_field(self, "end_game", end_game)
+		set_field(self, "effect", tuple(effect))
+
+	def __setattr__(self, name, value):
+		raise AttributeError("Cards are shared between games and can't be changed.")
+
+	def __delattr__(self, name):
+		raise AttributeError("Cards are shared between games and can't be changed.")
+
+	def __reduce__(self):
+		# Unpickled and copied cards are the registered card, not a new object.
+		if self.card_id is not None:
+			return (get_registered_card, (self.name,))
+		return (Card, (self.name, self.cost, self.kind, self.value, self.points, self.actions, self.end_game,
+					   self.effect))
 
 	def __repr__(self):
 		return self.name
 
 	def __str__(self):
-		return ("name: {0} cost: {1} kind: {2} value: {3} points: {4} actions: {5}".format(
-				self.name, self.cost, self.kind, self.value, self.points, self.actions))
+		return ("name: {0} cost: {1} kind: {2} value: {3} points: {4} effect: {5}".format(
+				self.name, self.cost, self.kind, self.value, self.points, describe_effect(self.effect)))
 
 	def __eq__(self, other):
-		return self.name == other.name
+		return self is other
+
+	def __ne__(self, other):
+		return self is not other
+
+	def __hash__(self):
+		return id(self)
+
+def describe_effect(effect):
+	"""Returns the effect as text, e.g. "+3 cards" or "+1 cards, +2 actions"."""
+	parts = []
+	for index in range(0, len(effect), 2):
+		op, argument = effect[index], effect[index + 1]
+		if op == EFFECT_GAIN or op == EFFECT_TRASH:
+			parts.append("{0} {1}".format(EFFECT_NAMES[op], registered_cards[argument].name))
+		else:
+			parts.append("+{0} {1}".format(argument, EFFECT_NAMES[op]))
+	return ", ".join(parts) or "none"
+
+def effect_totals(effect):
+	"""Returns the summed argument of each op in the effect, indexed by op.
+
+	Only meaningful for the counting ops, engines that don't interpret effects
+	step by step (dominion_batch) precompute these per card.
+	"""
+	totals = [0] * len(EFFECT_NAMES)
+	for index in range(0, len(effect), 2):
+		totals[effect[index]] += effect[index + 1]
+	return totals
+
+def get_registered_card(name):
+	"""Returns the registered Card with the given name."""
+	card = card_registry.get(name)
+	if card is None:
+		import dominion_cards # Registers the cards in the definition file.
+		card = card_registry[name]
+	return card
 
 class Pile:
 	"""Represents a pile in play that a player can purchase cards from or interact with."""
@@ -59,7 +155,7 @@ class Pile:
 
 	def remove_cards(self, amount):
 		"""Removes a card from this pile."""
-		if self.num > amount:
+		if self.num >= amount:
 			self.num -= amount
 			return True
 		else:
@@ -89,8 +185,32 @@ class Deck:
 	in_play -- cards that are currently in play, these typically will
 	           have been played from a player's hand and get moved into
 	           the discard pile once no longer in_play
+	rng     -- random.Random used for every shuffle, GameStateMachine shares
+	           one seeded per game between its decks
+
+	Running totals over the whole deck, updated whenever a card is gained or trashed:
+	size           -- number of cards
+	points         -- victory points
+	money          -- total value of the coin cards
+	counts_by_name -- card name to number of copies
+	counts_by_kind -- card kind to number of cards
+
+	The same counts over the hand only, kept in step with the ordered hand list so
+	play_kind, find_kind and discards can tell straight away a card isn't in hand:
+	hand_names -- card name to number of copies in hand
+	hand_kinds -- card kind to number of cards in hand
+
+	Cloned decks share their zone lists copy-on-write, every method that changes
+	a zone calls _unshare first and anything holding on to a zone list from
+	get_hand() etc. should get it again after changing the deck.
+
+	profiler -- Profiler timing shuffles, set by GameStateMachine.set_profiler
 	"""
-	def __init__(self, starting_cards):
+	profiler = None
+
+	def __init__(self, starting_cards, events = None, rng = None):
+		self.events = events or ConsoleEvents()
+		self.rng = rng or Random()
 		self._init_deck(starting_cards, DRAW_SIZE)
 
 	def __repr__(self):
@@ -108,16 +228,85 @@ class Deck:
 		num_estates -- the number of estates to start with
 		hand_size   -- the number of cards to go into hand
 		"""
-		print "init deck..."
 		self.hand = []
+		self.hand_names = {}
+		self.hand_kinds = {}
 		self.discard = []
-		self.draw = starting_cards
+		self.draw = list(starting_cards) # Players must not share the starting list.
 		self.in_play = []
-		shuffle(self.draw)
+		self._shared = False
+		self._reset_stats()
+		for card in self.draw:
+			self._add_to_stats(card, 1)
+		if self.events.enabled:
+			self.events.emit(EVENT_SHUFFLE, num_cards = len(self.draw))
+		self.rng.shuffle(self.draw)
 		self.draw_cards(DRAW_SIZE)
 
+	def _reset_stats(self):
+		self.size = 0
+		self.points = 0
+		self.money = 0
+		self.counts_by_name = {}
+		self.counts_by_kind = {}
+
+	def _add_to_stats(self, card, amount):
+		"""Updates the running totals for amount copies of card joining (or leaving if negative) the deck."""
+		self.size += amount
+		self.points += card.points * amount
+		if card.kind is CARD_COIN:
+			self.money += card.value * amount
+		self.counts_by_name[card.name] = self.counts_by_name.get(card.name, 0) + amount
+		self.counts_by_kind[card.kind] = self.counts_by_kind.get(card.kind, 0) + amount
+
+	def _add_to_hand(self, cards):
+		"""Puts cards at the end of the hand, keeping hand_names and hand_kinds up to date."""
+		self.hand += cards
+		hand_names = self.hand_names
+		hand_kinds = self.hand_kinds
+		for card in cards:
+			hand_names[card.name] = hand_names.get(card.name, 0) + 1
+			hand_kinds[card.kind] = hand_kinds.get(card.kind, 0) + 1
+
+	def _pop_from_hand(self, card_index):
+		"""Removes and returns the card at card_index in hand, keeping the hand counts up to date."""
+		card = self.hand.pop(card_index)
+		self.hand_names[card.name] -= 1
+		self.hand_kinds[card.kind] -= 1
+		return card
+
+	def _find_in_hand(self, card_to_find):
+		"""Returns the index of the first card in hand named like card_to_find, None if there isn't one."""
+		if not self.hand_names.get(card_to_find.name):
+			return None
+		for card_index, card in enumerate(self.hand):
+			if card.name == card_to_find.name:
+				return card_index
+
+	def _clear_hand(self):
+		self.hand = []
+		self.hand_names = {}
+		self.hand_kinds = {}
+
+	def set_hand(self, cards):
+		"""Replaces the hand with cards, e.g. to set up a test position.
+
+		The cards in hand before leave the deck and the new ones join it, so the
+		running totals stay those of the whole deck.
+		"""
+		if self._shared:
+			self._unshare()
+		for card in self.hand:
+			self._add_to_stats(card, -1)
+		self._clear_hand()
+		for card in cards:
+			self._add_to_stats(card, 1)
+		self._add_to_hand(list(cards))
+
 	def draw_cards(self, num_cards):
 		"""Puts num_cards into hand. Shuffles and moves discard into draw as necessary."""
+		if self._shared:
+			self._unshare()
 		in_draw = []
 		in_draw = self.draw[0:num_cards]
 		del self.draw[0:num_cards]
@@ -126,17 +315,29 @@ class Deck:
 			self.shuffle_cards()
 			in_draw += self.draw[0:needed_cards]
 			del self.draw[0:needed_cards]
-		self.hand += in_draw
-		print "hand after draw {0} card: {1}".format(num_cards, str(self.hand))
+		self._add_to_hand(in_draw)
+		if self.events.enabled:
+			self.events.emit(EVENT_DRAW, num_cards = num_cards, hand = self.hand)
 
 	def discard_cards(self, card_to_discard):
 		"""Moves card from hand into discard. Returns True if successful, otherwise False."""
-		for card_index, card in enumerate(self.hand):
-		   if card_to_discard.name == card.name:
-		      self.hand.pop(card_index)
-		      self.discard.insert(-0, card) # Put on top of discard
-		      return True
-		return False
+		card_index = self._find_in_hand(card_to_discard)
+		if card_index is None:
+			return False
+		if self._shared:
+			self._unshare()
+		self.discard.insert(-0, self._pop_from_hand(card_index)) # Put on top of discard
+		return True
+
+	def trash_card(self, card_to_trash):
+		"""Removes card from hand and from the deck. Returns True if successful, otherwise False."""
+		card_index = self._find_in_hand(card_to_trash)
+		if card_index is None:
+			return False
+		if self._shared:
+			self._unshare()
+		self._add_to_stats(self._pop_from_hand(card_index), -1)
+		return True
 
 	def shuffle_cards(self, check_empty = True):
 		"""Moves discard into draw and shuffles the draw cards.
@@ -149,12 +350,32 @@ class Deck:
 		"""
 		if check_empty:
 			assert len(self.draw) == 0, "Trying to shuffle cards but draw is not empty."
+		profiler = self.profiler
+		if profiler is not None:
+			start = default_timer()
+		if self._shared:
+			self._unshare()
 		self.draw = self.discard
 		self.discard = []
-		shuffle(self.draw)
+		if self.events.enabled:
+			self.events.emit(EVENT_SHUFFLE, num_cards = len(self.draw))
+		self.rng.shuffle(self.draw)
+		if profiler is not None:
+			profiler.add(PROFILE_SHUFFLE, start)
+
+	def shuffle_draw(self):
+		"""Shuffles the draw pile in place, lookahead uses this to sample unknown draw orders."""
+		if self._shared:
+			self._unshare()
+		self.rng.shuffle(self.draw)
 
 	def gain_card(self, card, pile_name):
 		"""Adds the given card to the specified pile ("draw", "discard", "hand", "in_play")."""
+		if self.events.enabled:
+			self.events.emit(EVENT_GAIN, card = card, pile_name = pile_name)
+		if self._shared:
+			self._unshare()
+		self._add_to_stats(card, 1)
 		if pile_name is "draw":
 			# I think in general if things are gained to the draw they go on top, this 
 			# is probably fine for now but may need to eventually change.
@@ -162,7 +383,7 @@ class Deck:
 		elif pile_name is "discard":
 			self.discard.insert(-0, card) 
 		elif pile_name is "hand":
-			self.hand.append(card)
+			self._add_to_hand([card])
 		elif pile_name is "in_play":
 			# Not sure if this case is super relevant but I think there might be "play immediately"
 			# cards which would require this and probably further logic, this is mainly here so
@@ -173,10 +394,39 @@ class Deck:
 		#TODO: do this by card, not card index.
 		"""Moves the card at card_index from hand and into in_play. Returns the Card for conveinence."""
 		assert len(self.hand) > card_index, "Trying to play card not in hand index: %r" % card_index
-		played_card = self.hand.pop(card_index)
+		if self._shared:
+			self._unshare()
+		played_card = self._pop_from_hand(card_index)
 		self.in_play.append(played_card)
 		return played_card
 
+	def play_kind(self, kind):
+		"""Moves every card of the given kind from hand into in_play in one pass, returns them in hand order."""
+		if not self.hand_kinds.get(kind):
+			return []
+		if self._shared:
+			self._unshare()
+		played = []
+		kept = []
+		for card in self.hand:
+			if card.kind is kind:
+				played.append(card)
+			else:
+				kept.append(card)
+		self.hand = kept
+		self.in_play += played
+		hand_names = self.hand_names
+		for card in played:
+			hand_names[card.name] -= 1
+		self.hand_kinds[kind] = 0
+		return played
+
+	def find_kind(self, kind):
+		"""Returns the hand indexes of the cards of the given kind, e.g. the playable actions."""
+		if not self.hand_kinds.get(kind):
+			return []
+		return [card_index for card_index, card in enumerate(self.hand) if card.kind is kind]
+
 	def end_turn(self):
 		"""Cleans up cards at the end of the turn.
 
@@ -184,19 +434,63 @@ class Deck:
 		# TODO discard should be inserted on top for consistency with gain_card "draw" case.
 		# TODO some cards have effects that happen during the clean up phase, this may need
 		#      to be less specific.
+		if self._shared:
+			self._unshare()
 		self.discard += self.in_play
 		self.discard += self.hand
 		self.in_play = []
-		self.hand = []
+		self._clear_hand()
 		self.draw_cards(DRAW_SIZE)
 
+	def clone(self, events = None, rng = None):
+		"""Returns a copy of this deck, the two share zones until either one changes them."""
+		deck = copy.copy(self)
+		deck.events = events or self.events
+		deck.rng = rng or self.rng
+		deck._shared = True
+		self._shared = True
+		return deck
+
+	def _unshare(self):
+		"""Gives this deck its own copy of every zone."""
+		self.hand = list(self.hand)
+		self.draw = list(self.draw)
+		self.discard = list(self.discard)
+		self.in_play = list(self.in_play)
+		self._unshare_stats()
+		self._shared = False
+
+	def _unshare_stats(self):
+		self.counts_by_name = dict(self.counts_by_name)
+		self.counts_by_kind = dict(self.counts_by_kind)
+		self.hand_names = dict(self.hand_names)
+		self.hand_kinds = dict(self.hand_kinds)
+
 	def count_card(self, card_to_count):
 		"""Returns the count of the given card in a players deck."""
-		count = 0
-		for card in self.get_deck():
-			if card == card_to_count:
-				count += 1
-		return count
+		return self.counts_by_name.get(card_to_count.name, 0)
+
+	def count_kind(self, kind):
+		"""Returns the number of cards of the given kind (CARD_COIN etc.) in the deck."""
+		return self.counts_by_kind.get(kind, 0)
+
+	def count_points(self):
+		"""Returns the victory points in the deck."""
+		return self.points
+
+	def get_size(self):
+		"""Returns the number of cards in the deck."""
+		return self.size
+
+	def get_money(self):
+		"""Returns the total value of the coin cards in the deck."""
+		return self.money
+
+	def get_action_density(self):
+		"""Returns the share of the deck that is action cards."""
+		if not self.size:
+			return 0.0
+		return float(self.counts_by_kind.get(CARD_ACTION, 0)) / self.size
 
 	def get_deck(self):
 		"""Returns all cards in a list."""
@@ -210,6 +504,13 @@ class Deck:
 		"""Returns cards in draw."""
 		return self.draw
 
+	def get_draw_counts(self):
+		"""Returns {Card: count} of the cards in draw, without fixing or changing their order."""
+		counts = {}
+		for card in self.draw:
+			counts[card] = counts.get(card, 0) + 1
+		return counts
+
 	def get_discard(self):
 		"""Returns cards in discard."""
 		return self.discard
@@ -247,14 +548,74 @@ class Player:
 		return self.name
 
 class Supply:
-	"""Contols the card piles (supply) in the game."""
-	def __init__(self, supply_piles, game_over_at = 3):
+	"""Contols the card piles (supply) in the game.
+
+	Members:
+	supply_piles        -- the piles in the order they were given
+	piles_by_name       -- card name to pile
+	empty_piles         -- number of empty piles
+	emptied             -- names of the empty piles, in the order they emptied
+	end_game_pile_empty -- True once a pile that can end the game (Province) is empty
+	"""
+	def __init__(self, supply_piles, game_over_at = 3, events = None):
 		self.supply_piles = supply_piles
-		self.empty_piles = 0
+		self.piles_by_name = {}
+		for pile in supply_piles:
+			self.piles_by_name[pile.get_card().name] = pile
+		self.max_cost = max([pile.get_card().cost for pile in supply_piles] + [0])
+		self.emptied = [pile.get_card().name for pile in supply_piles if pile.is_empty()]
+		self.empty_piles = len(self.emptied)
 		self.game_over_at = game_over_at
+		self.end_game_pile_empty = False
+		for pile in supply_piles:
+			if pile.is_empty() and pile.can_end_game():
+				self.end_game_pile_empty = True
+		self.events = events or ConsoleEvents()
+		self._shared = False
+		self._index_affordable()
+
+	def clone(self, events = None):
+		"""Returns a copy of the supply, the two share piles until either one changes them."""
+		supply = copy.copy(self)
+		supply.events = events or self.events
+		supply._shared = True
+		self._shared = True
+		return supply
+
+	def _unshare(self):
+		"""Gives this supply its own piles and indexes."""
+		self.supply_piles = [Pile(pile.get_card(), pile.get_quantity()) for pile in self.supply_piles]
+		self.piles_by_name = {}
+		for pile in self.supply_piles:
+			self.piles_by_name[pile.get_card().name] = pile
+		self.emptied = list(self.emptied)
+		self._index_affordable()
+		self._shared = False
+
+	def _index_affordable(self):
+		"""Builds affordable[money], the non empty piles costing at most money, most expensive first.
+
+		Only needs rebuilding when a pile empties or refills.
+		"""
+		by_cost = sorted([pile for pile in self.supply_piles if not pile.is_empty()],
+						 key = lambda pile: pile.get_card().cost, reverse = True)
+		self.affordable = []
+		for money in range(0, self.max_cost + 1):
+			self.affordable.append([pile for pile in by_cost if pile.get_card().cost <= money])
 
 	def is_game_over(self):
-		return (self.empty_piles == self.game_over_at)
+		"""Returns True once enough piles are empty or a game ending pile (Province) is empty."""
+		return self.end_game_pile_empty or self.empty_piles >= self.game_over_at
+
+	def get_pile(self, card_name):
+		"""Returns the pile for the given card name, or None if it isn't in the supply."""
+		return self.piles_by_name.get(card_name)
+
+	def get_affordable_piles(self, money):
+		"""Returns the non empty piles costing at most money, most expensive first. Don't modify it."""
+		if money < 0:
+			return []
+		return self.affordable[min(money, self.max_cost)]
 
 	def remove_from_supply(self, card):
 		"""Removes a card from the supply.
@@ -262,84 +623,306 @@ class Supply:
 		Returns True if the game is over, False if not, and an error code otherwise.
 		Any bought or gained cards must go through this function.
 		"""
-		for pile in self.supply_piles:
-			if card == pile.get_card():
-				success = pile.remove_cards(1)
-				if success is True:
-					if pile.is_empty():
-						print "   pile is empty: " + pile.card.name
-						self.empty_piles += 1
-					return self.empty_piles == self.game_over_at
-				else:
-					return success # This will be ERROR_NUM_CARDS_TOO_FEW
-		return ERROR_CARD_NOT_IN_SUPPLY
+		if self._shared:
+			self._unshare()
+		pile = self.piles_by_name.get(card.name)
+		if pile is None:
+			return ERROR_CARD_NOT_IN_SUPPLY
+		success = pile.remove_cards(1)
+		if success is not True:
+			return success # This will be ERROR_NUM_CARDS_TOO_FEW
+		if pile.is_empty():
+			if self.events.enabled:
+				self.events.emit(EVENT_PILE_EMPTY, card = pile.card)
+			self.empty_piles += 1
+			self.emptied.append(card.name)
+			if pile.can_end_game():
+				self.end_game_pile_empty = True
+			self._index_affordable()
+		return self.is_game_over()
 
 	def add_to_supply(self, card):
 		"""Adds a card to the supply.
 
 		Returns True if able to add, an error code otherwise.
 		"""
-		for pile in self.supply_piles:
-			if card == pile.get_card():
-				pile.add_cards(1)
-				return True
-		return ERROR_CARD_NOT_IN_SUPPLY
+		if self._shared:
+			self._unshare()
+		pile = self.piles_by_name.get(card.name)
+		if pile is None:
+			return ERROR_CARD_NOT_IN_SUPPLY
+		refilled = pile.is_empty()
+		pile.add_cards(1)
+		if refilled:
+			self.empty_piles -= 1
+			self.emptied.remove(card.name)
+			if pile.can_end_game():
+				self.end_game_pile_empty = False
+			self._index_affordable()
+		return True
 
 class GameStateMachine:
-	"""Manages player turns and reactions and updates players' decks and Supply accordingly."""
-	def __init__(self, players, supply_piles, starting_cards):
-		self.game_state = Supply(supply_piles)
+	"""Manages player turns and reactions and updates players' decks and Supply accordingly.
+
+	Arguments:
+	players        -- list of Players, in turn order
+	supply_piles   -- list of Piles making up the supply
+	starting_cards -- cards every player starts with, each player gets their own copy
+	strategies     -- list of Strategies, one per player, defaults to ConsoleStrategy
+	headless       -- when True nothing is printed, use with bot strategies to simulate games
+	deck_class     -- Deck implementation used for every player, see dominion_decks.py
+	events         -- EventBus every event in the game goes to, defaults to printing to the
+	                  console or to no sinks at all when headless
+	seed           -- seeds the game's random.Random, the same seed and decisions always
+	                  play the same game, a random seed is picked and kept in self.seed if None
+	seat_seeds     -- one seed per player, gives each player's deck its own random.Random
+	                  instead of sharing the game's, so a seat shuffles the same way whoever
+	                  plays it, see dominion_compare.py
+	profiler       -- Profiler timing each phase of every turn, see set_profiler
+	"""
+	def __init__(self, players, supply_piles, starting_cards, strategies = None, headless = False,
+				 deck_class = None, events = None, seed = None, profiler = None, seat_seeds = None):
+		if seed is None:
+			seed = getrandbits(63)
+		self.seed = seed
+		self.rng = Random(seed)
+		if events is None:
+			events = EventBus() if headless else ConsoleEvents()
+		self.events = events
+		self.game_state = Supply(supply_piles, events = events)
+		if strategies is None:
+			strategies = [ConsoleStrategy() for player in players]
+		assert len(strategies) == len(players), "Need one strategy per player."
+		self.seat_seeds = seat_seeds
+		if seat_seeds is None:
+			rngs = [self.rng] * len(players)
+		else:
+			assert len(seat_seeds) == len(players), "Need one seat seed per player."
+			rngs = [Random(seat_seed) for seat_seed in seat_seeds]
 		turn_objects_list = []
-		for player in players:
-			turn_objects_list.append(TurnObject(player, starting_cards))
-		self.turn_objects = cycle(turn_objects_list)
-		self.curr_turn_object = next(self.turn_objects)
+		for player, strategy, rng in zip(players, strategies, rngs):
+			turn_objects_list.append(TurnObject(player, starting_cards, strategy, events, deck_class, rng))
+		self.turn_objects_list = turn_objects_list
+		self.curr_index = 0
+		self.curr_turn_object = turn_objects_list[0]
+		self.turn_number = 0
+		self.set_profiler(profiler)
+		for turn in turn_objects_list:
+			turn.strategy.start_game(self, turn)
+
+	def set_profiler(self, profiler):
+		"""Starts timing turns into the given Profiler, None stops profiling."""
+		self.profiler = profiler
+		for turn in self.turn_objects_list:
+			turn.get_deck().profiler = profiler
 
 	def next_turn_object(self):
-		self.curr_turn_object = next(self.turn_objects)
+		self.curr_index = (self.curr_index + 1) % len(self.turn_objects_list)
+		self.curr_turn_object = self.turn_objects_list[self.curr_index]
+
+	def clone(self, events = None, seed = None):
+		"""Returns a copy of the game for lookahead, playing either game doesn't change the other.
 
-	def play_game(self):
+		Cards and players are shared, decks and the supply are copy-on-write. The
+		clone gets a silent EventBus unless events is given, and continues the
+		same random sequence unless a seed is given.
+		"""
+		game = copy.copy(self)
+		game.events = events or EventBus()
+		if seed is None:
+			game.rng = Random(0) # Seeding from the OS is slower than copying the state.
+			game.rng.setstate(self.rng.getstate())
+		else:
+			game.rng = Random(seed)
+		game.game_state = self.game_state.clone(game.events)
+		if self.seat_seeds is None:
+			game.turn_objects_list = [turn.clone(game.events, game.rng) for turn in self.turn_objects_list]
+		else:
+			game.turn_objects_list = [turn.clone(game.events, self._clone_seat_rng(turn, seed))
+									  for turn in self.turn_objects_list]
+		game.curr_turn_object = game.turn_objects_list[self.curr_index]
+		if self.profiler is not None:
+			game.set_profiler(None) # Lookahead shouldn't count towards the real game's profile.
+		return game
+
+	def _clone_seat_rng(self, turn, seed):
+		if seed is not None:
+			return Random(seed + self.turn_objects_list.index(turn))
+		rng = Random(0)
+		rng.setstate(turn.get_deck().rng.getstate())
+		return rng
+
+	def play_game(self, max_turns = None):
+		"""Plays turns until the game is over or max_turns (counting every player's turn) is reached."""
 		while not self.game_state.is_game_over():
+			if max_turns is not None and self.turn_number >= max_turns:
+				break
 			self.handle_turn()
-			self.next_turn_object()
+			self.advance_turn()
 
-	def handle_turn(self):
+	def advance_turn(self):
+		"""Counts the finished turn and moves on to the next player."""
+		self.turn_number += 1
+		self.next_turn_object()
+
+	def handle_turn(self, phase = PHASE_ACTION):
+		"""Plays the current player's turn.
+
+		Arguments:
+		phase -- PHASE_BUY skips the action phase, used to finish a turn in a
+		         clone made while the player was deciding what to buy
+		"""
+		curr_turn = self.curr_turn_object
+		strategy = curr_turn.strategy
+		profiler = self.profiler
+		if profiler is not None:
+			turn_start = default_timer()
+		if phase is PHASE_ACTION:
+			self.start_turn()
+			if profiler is not None:
+				start = default_timer()
+			self.action_phase(curr_turn, strategy)
+			if profiler is not None:
+				profiler.add(PROFILE_ACTION_PHASE, start)
+		if profiler is not None:
+			start = default_timer()
+		self.buy_phase(curr_turn, strategy)
+		if profiler is not None:
+			profiler.add(PROFILE_BUY_PHASE, start)
+		self.finish_turn()
+		if profiler is not None:
+			profiler.add(PROFILE_TURN, turn_start)
+
+	def start_turn(self):
+		"""Announces the current player's turn."""
+		if self.events.enabled:
+			self.events.emit(EVENT_TURN_START, player = self.curr_turn_object.player, turn = self.turn_number)
+
+	def finish_turn(self):
+		"""Cleans up the current player's turn, advance_turn moves on to the next player."""
 		curr_turn = self.curr_turn_object
-		print "---------------------------------------"
-		print "TURN STARTING FOR: " + str(curr_turn.player)
-		# Action / card playing phase
+		profiler = self.profiler
+		if profiler is not None:
+			start = default_timer()
+		curr_turn.end_turn()
+		if profiler is not None:
+			profiler.add(PROFILE_CLEANUP, start)
+		if self.events.enabled:
+			self.events.emit(EVENT_TURN_END, player = curr_turn.player, turn = self.turn_number)
+
+	def action_phase(self, curr_turn, strategy):
+		"""Plays cards until the strategy is done."""
+		profiler = self.profiler
 		while True:
-			card_to_play, card = play_valid_card(curr_turn.get_deck().get_hand())
-			if card_to_play == "done":
+			if profiler is not None:
+				start = default_timer()
+			card_to_play = strategy.choose_play(curr_turn.get_deck().get_hand(), curr_turn)
+			if profiler is not None:
+				profiler.add(PROFILE_CHOOSE_PLAY, start)
+			if not self.apply_play(curr_turn, card_to_play):
 				break
-			if card_to_play == "all":
-				print "   Playing all money cards..."
-				curr_turn.play_all_money()
-			else:
-				card_played = curr_turn.play_card(int(card_to_play))
-				self.resolve_card(card_played)
 
-		print "   Turn options: " + str(curr_turn)
-		# Buy cards
+	def apply_play(self, curr_turn, card_to_play):
+		"""Applies one choose_play decision. Returns False once the player is done playing cards."""
+		if card_to_play == "done":
+			return False
+		if card_to_play == "all":
+			curr_turn.play_all_money()
+		else:
+			card_played = curr_turn.play_card(int(card_to_play))
+			self.resolve_card(card_played)
+		return True
+
+	def buy_phase(self, curr_turn, strategy):
+		"""Buys cards until the strategy buys nothing or the player is out of buys."""
+		profiler = self.profiler
 		while curr_turn.get_buys():
-			card_to_buy = buy_valid_card(self.game_state.supply_piles)
-			if card_to_buy is "none":
-				print "   Not buying anything..."
+			if profiler is not None:
+				start = default_timer()
+			card_to_buy = strategy.choose_buy(self.game_state, curr_turn)
+			if profiler is not None:
+				profiler.add(PROFILE_CHOOSE_BUY, start)
+			if not self.apply_buy(curr_turn, card_to_buy):
 				break
-			else:
-				print "   Buying card: " + str(card_to_buy)
-				self.game_state.remove_from_supply(card_to_buy)
-				curr_turn.buy_card(card_to_buy)
-		curr_turn.end_turn()
-		print "---------------------------------------"
+
+	def apply_buy(self, curr_turn, card_to_buy):
+		"""Applies one choose_buy decision. Returns False if nothing was bought.
+
+		A card the player can't afford, or whose pile is empty or not in the
+		supply, isn't bought: nothing is gained, no money or buy is spent and the
+		buy phase ends as if the player had chosen "none".
+		"""
+		events = self.events
+		if card_to_buy is "none" or card_to_buy.cost > curr_turn.money:
+			if events.enabled:
+				events.emit(EVENT_BUY, card = None)
+			return False
+		removed = self.game_state.remove_from_supply(card_to_buy)
+		if removed is not True and removed is not False:
+			if events.enabled:
+				events.emit(EVENT_BUY, card = None)
+			return False # ERROR_CARD_NOT_IN_SUPPLY or ERROR_NUM_CARDS_TOO_FEW
+		if events.enabled:
+			events.emit(EVENT_BUY, card = card_to_buy)
+		if self.profiler is not None:
+			self.profiler.count("buy " + card_to_buy.name)
+		curr_turn.buy_card(card_to_buy)
+		return True
+
+	def get_scores(self):
+		"""Returns a list of (player, points) in turn order."""
+		return [(turn.player, turn.count_points()) for turn in self.turn_objects_list]
+
+	def get_winners(self):
+		"""Returns the players with the most points, ties go to the player with fewer turns."""
+		best = None
+		winners = []
+		for turn in self.turn_objects_list:
+			rank = (turn.count_points(), -turn.turns)
+			if best is None or rank > best:
+				best = rank
+				winners = [turn.player]
+			elif rank == best:
+				winners.append(turn.player)
+		return winners
 
 	def resolve_reactions(self):
 		return True
 
 	def resolve_card(self, card):
 		if card:
-			if card.actions:
-				card.actions(self)
+			if card.effect or card.actions:
+				profiler = self.profiler
+				if profiler is None:
+					self.run_effect(card)
+				else:
+					start = default_timer()
+					self.run_effect(card)
+					profiler.add(PROFILE_CARD_ACTION + card.name, start)
+
+	def run_effect(self, card):
+		"""Applies a played card's effect ops for the current player, then its actions callable."""
+		curr_turn = self.curr_turn_object
+		effect = card.effect
+		for index in range(0, len(effect), 2):
+			op = effect[index]
+			argument = effect[index + 1]
+			if op == EFFECT_CARDS:
+				curr_turn.deck.draw_cards(argument)
+			elif op == EFFECT_ACTIONS:
+				curr_turn.actions += argument
+			elif op == EFFECT_BUYS:
+				curr_turn.buys += argument
+			elif op == EFFECT_MONEY:
+				curr_turn.money += argument
+			elif op == EFFECT_GAIN:
+				gained_card = registered_cards[argument]
+				if self.game_state.remove_from_supply(gained_card) in (True, False):
+					curr_turn.deck.gain_card(gained_card, "discard")
+			elif op == EFFECT_TRASH:
+				curr_turn.deck.trash_card(registered_cards[argument])
+		if card.actions:
+			card.actions(self)
 
 	def resolve_buy(self):
 		return True
@@ -347,9 +930,12 @@ class GameStateMachine:
 class TurnObject:
 	"""Executes a turn"""
 
-	def __init__(self, player, starting_cards):
+	def __init__(self, player, starting_cards, strategy = None, events = None, deck_class = None, rng = None):
 		self.player = player
-		self.deck = Deck(starting_cards)
+		self.strategy = strategy
+		self.events = events or ConsoleEvents()
+		self.deck = (deck_class or Deck)(starting_cards, self.events, rng)
+		self.turns = 0
 		self.reset() # Resets actions, buys, and money counts.
 
 	def __repr__(self):
@@ -367,6 +953,13 @@ class TurnObject:
 	def get_buys(self):
 		return self.buys
 
+	def clone(self, events = None, rng = None):
+		"""Returns a copy of this turn with a copy-on-write clone of the deck."""
+		turn = copy.copy(self)
+		turn.events = events or self.events
+		turn.deck = self.deck.clone(turn.events, rng)
+		return turn
+
 	def update_for_card_played(self, play_card):
 		if play_card.kind is CARD_COIN:
 			self.money += play_card.value
@@ -375,7 +968,8 @@ class TurnObject:
 			if self.actions > 0:
 				self.actions -= 1
 			else:
-				print "   no more actions, can't play card {0}".format(play_card.name)
+				if self.events.enabled:
+					self.events.emit(EVENT_PLAY, card = play_card, played = False)
 				return None
 
 	def update_for_card_bought(self, bought_card):
@@ -384,14 +978,14 @@ class TurnObject:
 
 	def play_card(self, card_index):
 		card = self.deck.get_hand()[card_index]
-		print "   playing card: " + card.name
+		if self.events.enabled:
+			self.events.emit(EVENT_PLAY, card = card, played = card.kind is not CARD_ACTION or self.actions > 0)
 		if card.kind is CARD_ACTION:
 			if self.actions > 0:
 				card_played = self.deck.play_card(card_index)
 				self.update_for_card_played(card_played)
 				return card_played
 			else:
-				print "   Not enough actions, can't play"
 				return None
 		elif card.kind is CARD_COIN:
 			card_played = self.deck.play_card(card_index)
@@ -404,14 +998,17 @@ class TurnObject:
 
 	def play_all_money(self):
 		"""Plays all of the money cards in the current players hand."""
-		hand = self.deck.get_hand()
-		index = 0
-		for i in range(0, len(hand)):
-			card = hand[index]
-			if card.kind is CARD_COIN:
-				self.play_card(index)
-			else:
-				index += 1 # Skip non coin cards
+		played = self.deck.play_kind(CARD_COIN)
+		if not played:
+			return
+		if self.events.enabled:
+			for card in played:
+				self.events.emit(EVENT_PLAY, card = card, played = True)
+		money = 0
+		for card in played:
+			money += card.value
+		self.money += money
+		self.actions = 0
 
 	def buy_card(self, bought_card):
 		self.deck.gain_card(bought_card, "discard")
@@ -423,13 +1020,45 @@ class TurnObject:
 
 	def end_turn(self):
 		self.reset()
+		self.turns += 1
 		self.deck.end_turn()
 
 	def count_points(self):
-		points = 0
-		for card in self.deck.get_deck():
-			points += card.points
-		return points
+		return self.deck.count_points()
+
+# Player strategies
+class Strategy:
+	"""Decides what a player plays and buys, GameStateMachine.handle_turn asks it every step.
+
+	choose_play returns the index of a card in hand, "all" to play all money cards or "done".
+	choose_buy returns the Card to buy from the supply or "none".
+	"""
+	name = "strategy"
+
+	def __repr__(self):
+		return self.name
+
+	def choose_play(self, hand, turn):
+		return "done"
+
+	def choose_buy(self, supply, turn):
+		return "none"
+
+	def start_game(self, game, turn):
+		"""Called once the GameStateMachine is set up, turn is this strategy's TurnObject."""
+		pass
+
+class ConsoleStrategy(Strategy):
+	"""Asks the person at the keyboard for every decision."""
+	name = "console"
+
+	def choose_play(self, hand, turn):
+		card_to_play, card = play_valid_card(hand)
+		return card_to_play
+
+	def choose_buy(self, supply, turn):
+		print "   Turn options: " + str(turn)
+		return buy_valid_card(supply.supply_piles)
 
 # Input functions
 def play_valid_card(cards):
@@ -457,20 +1086,20 @@ def buy_valid_card(piles):
 	card = None
 	msg = "   Card to buy or \'none\': "
 	print piles
+	piles_by_name = dict((pile.get_card().name, pile) for pile in piles)
 	while not card:
 		buy_card = raw_input(msg)
 		if buy_card == "none":
 			card = "none"
 			return card
-		for pile in piles:
-			if pile.is_same(buy_card):
-				if not pile.is_empty():
-					return pile.get_card()
-				else:
-					print piles
-					msg = "   That pile is empty, choose a different card or \'none\': "
-					break
+		pile = piles_by_name.get(buy_card)
+		if pile is None:
 			msg = "   Card to buy or \'none\': "
+		elif not pile.is_empty():
+			return pile.get_card()
+		else:
+			print piles
+			msg = "   That pile is empty, choose a different card or \'none\': "
 
 # Random utility functions
 def is_number(string):
@@ -0,0 +1,264 @@
+#!/usr/bin/python
+import os
+import sys
+import mmap
+import struct
+from timeit import default_timer
+
+from dominion import Player
+from dominion_cards import CreateStartingCards
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_replay import record_game, decode_replay, _pack_names, _unpack_names
+from dominion_tournament import CreateKingdom, MAX_TURNS, NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Recorded games packed one after another in an append-only data file, with
+# a fixed width index next to it (file name + INDEX_SUFFIX) so game i is read
+# straight out of an mmap of the data file without touching the others.
+#
+# Data file: ARCHIVE_HEADER (magic, version), then one entry per game:
+#	ENTRY_HEADER (entry length, turns, number of players), the final
+#	count_points of every seat as signed shorts, the strategy names packed
+#	like replay names, then the GameRecord.encode bytes (seed, supply piles,
+#	starting cards and every play / buy decision, see dominion_replay.py).
+# Index file: ARCHIVE_HEADER, then INDEX_ENTRY (data offset, entry length,
+#	turns) per game. Entries are only indexed once they are fully written,
+#	and the index can be rebuilt from the data file with rebuild_index.
+ARCHIVE_MAGIC = "DOMA"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = "<4sI"
+ENTRY_HEADER = "<IHB"
+INDEX_ENTRY = "<QIH"
+INDEX_SUFFIX = ".idx"
+
+HEADER_SIZE = struct.calcsize(ARCHIVE_HEADER)
+ENTRY_HEADER_SIZE = struct.calcsize(ENTRY_HEADER)
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY)
+
+class ArchivedGame:
+	"""One game read from an archive.
+
+	Members:
+	turns      -- turns played, every player's turn
+	points     -- final count_points of each seat
+	strategies -- strategy name of each seat
+	replay     -- the GameRecord.encode bytes, see get_record
+	"""
+	def __init__(self, turns, points, strategies, replay):
+		self.turns = turns
+		self.points = points
+		self.strategies = strategies
+		self.replay = replay
+
+	def __repr__(self):
+		return "ArchivedGame({0} turns, {1})".format(self.turns, zip(self.strategies, self.points))
+
+	def get_record(self):
+		"""Decodes the replay, a GameRecord with the seed, supply and decisions."""
+		return decode_replay(self.replay)
+
+def encode_entry(record, strategies, points, turns):
+	"""Returns the archive entry for a GameRecord and its result."""
+	body = (struct.pack("<%dh" % len(points), *points) + _pack_names([(name, 0) for name in strategies]) +
+			record.encode())
+	return struct.pack(ENTRY_HEADER, ENTRY_HEADER_SIZE + len(body), turns, len(points)) + body
+
+def decode_entry(data, offset = 0):
+	"""Returns the ArchivedGame of the entry at offset in data (a string or an mmap)."""
+	length, turns, num_players = struct.unpack_from(ENTRY_HEADER, data, offset)
+	end = offset + length
+	offset += ENTRY_HEADER_SIZE
+	points = list(struct.unpack_from("<%dh" % num_players, data, offset))
+	offset += 2 * num_players
+	strategies, offset = _unpack_names(data, offset)
+	return ArchivedGame(turns, points, [name for name, count in strategies], data[offset:end])
+
+def _check_header(header, file_name):
+	assert len(header) == HEADER_SIZE, "%s is not an archive." % file_name
+	magic, version = struct.unpack(ARCHIVE_HEADER, header)
+	assert magic == ARCHIVE_MAGIC, "%s is not an archive." % file_name
+	assert version == ARCHIVE_VERSION, "Unknown archive version %r" % version
+
+class ArchiveWriter:
+	"""Appends games to an archive, creating it if needed.
+
+	Arguments:
+	sync -- fsyncs every entry before indexing it, so the index never gets
+	        ahead of the data even if the machine goes down, at the cost of a
+	        disk flush per game
+
+	Members:
+	num_games -- games in the archive, the ones added by this writer included
+
+	A writer that died part way through an entry leaves bytes past the last
+	indexed entry, they are cut off when the archive is opened for writing
+	again, and index entries pointing past the end of the data are dropped.
+	"""
+	def __init__(self, file_name, sync = False):
+		self.file_name = file_name
+		self.sync = sync
+		index_name = file_name + INDEX_SUFFIX
+		if not os.path.exists(file_name):
+			with open(file_name, "wb") as data_file:
+				data_file.write(struct.pack(ARCHIVE_HEADER, ARCHIVE_MAGIC, ARCHIVE_VERSION))
+			with open(index_name, "wb") as index_file:
+				index_file.write(struct.pack(ARCHIVE_HEADER, ARCHIVE_MAGIC, ARCHIVE_VERSION))
+		self.data_file = open(file_name, "r+b")
+		self.index_file = open(index_name, "r+b")
+		_check_header(self.data_file.read(HEADER_SIZE), file_name)
+		_check_header(self.index_file.read(HEADER_SIZE), index_name)
+		self.index_file.seek(0, os.SEEK_END)
+		index_size = self.index_file.tell()
+		index_size -= (index_size - HEADER_SIZE) % INDEX_ENTRY_SIZE # A torn index entry.
+		# Index entries past the end of the data never had their entry written, drop them.
+		data_size = os.fstat(self.data_file.fileno()).st_size
+		self.end = HEADER_SIZE
+		while index_size > HEADER_SIZE:
+			self.index_file.seek(index_size - INDEX_ENTRY_SIZE)
+			offset, length, turns = struct.unpack(INDEX_ENTRY, self.index_file.read(INDEX_ENTRY_SIZE))
+			if offset + length <= data_size:
+				self.end = offset + length
+				break
+			index_size -= INDEX_ENTRY_SIZE
+		self.index_file.truncate(index_size)
+		self.num_games = (index_size - HEADER_SIZE) // INDEX_ENTRY_SIZE
+		self.data_file.truncate(self.end) # Only ever shrinks, self.end is at most data_size.
+		self.data_file.seek(self.end)
+		self.index_file.seek(index_size)
+
+	def add(self, record, strategies, points, turns):
+		"""Appends a GameRecord with its seats' strategy names, final points and turns played."""
+		entry = encode_entry(record, strategies, points, turns)
+		self.data_file.write(entry)
+		self.data_file.flush() # The entry has to reach the file before its index entry does.
+		if self.sync:
+			os.fsync(self.data_file.fileno())
+		self.index_file.write(struct.pack(INDEX_ENTRY, self.end, len(entry), turns))
+		self.end += len(entry)
+		self.num_games += 1
+
+	def add_game(self, game, record):
+		"""Appends a finished game and its GameRecord, as returned by record_game."""
+		self.add(record, [turn.strategy.name for turn in game.turn_objects_list],
+				 [turn.count_points() for turn in game.turn_objects_list], game.turn_number)
+
+	def flush(self):
+		"""Makes the games added so far visible to readers opened after this."""
+		self.data_file.flush()
+		self.index_file.flush()
+
+	def close(self):
+		self.flush()
+		self.data_file.close()
+		self.index_file.close()
+
+class GameArchive:
+	"""Reads an archive, any game by index through mmap, or all of them with scan.
+
+	Games appended after the archive was opened aren't seen, open it again for them.
+	"""
+	def __init__(self, file_name):
+		self.file_name = file_name
+		self.data_file = open(file_name, "rb")
+		self.index_file = open(file_name + INDEX_SUFFIX, "rb")
+		_check_header(self.data_file.read(HEADER_SIZE), file_name)
+		_check_header(self.index_file.read(HEADER_SIZE), file_name + INDEX_SUFFIX)
+		self.data = mmap.mmap(self.data_file.fileno(), 0, access = mmap.ACCESS_READ)
+		self.index = mmap.mmap(self.index_file.fileno(), 0, access = mmap.ACCESS_READ)
+		self.num_games = (len(self.index) - HEADER_SIZE) // INDEX_ENTRY_SIZE
+		while self.num_games:
+			offset, length, turns = self.get_index_entry(self.num_games - 1)
+			if offset + length <= len(self.data):
+				break
+			self.num_games -= 1 # Indexed but not in the data file (yet), see ArchiveWriter.
+
+	def __len__(self):
+		return self.num_games
+
+	def __getitem__(self, game_index):
+		offset, length, turns = self.get_index_entry(game_index)
+		return decode_entry(self.data, offset)
+
+	def get_index_entry(self, game_index):
+		"""Returns (data offset, entry length, turns) of a game, without reading the game."""
+		if game_index < 0:
+			game_index += self.num_games
+		if not 0 <= game_index < self.num_games:
+			raise IndexError("Game %r not in the archive." % game_index)
+		return struct.unpack_from(INDEX_ENTRY, self.index, HEADER_SIZE + game_index * INDEX_ENTRY_SIZE)
+
+	def get_turns(self, game_index):
+		return self.get_index_entry(game_index)[2]
+
+	def scan(self, start = 0):
+		"""Yields every ArchivedGame from game start on, in order, reading the data file front to back."""
+		if start >= self.num_games:
+			return
+		offset = self.get_index_entry(start)[0]
+		last_offset, last_length, turns = self.get_index_entry(self.num_games - 1)
+		end = last_offset + last_length
+		data_file = open(self.file_name, "rb")
+		try:
+			data_file.seek(offset)
+			while offset < end:
+				header = data_file.read(ENTRY_HEADER_SIZE)
+				length = struct.unpack(ENTRY_HEADER, header)[0]
+				yield decode_entry(header + data_file.read(length - ENTRY_HEADER_SIZE))
+				offset += length
+		finally:
+			data_file.close()
+
+	def close(self):
+		self.data.close()
+		self.index.close()
+		self.data_file.close()
+		self.index_file.close()
+
+def rebuild_index(file_name):
+	"""Rewrites an archive's index from its data file, returns the number of games indexed.
+
+	A torn entry at the end of the data file is left out.
+	"""
+	size = os.path.getsize(file_name)
+	entries = []
+	with open(file_name, "rb") as data_file:
+		_check_header(data_file.read(HEADER_SIZE), file_name)
+		offset = HEADER_SIZE
+		while offset + ENTRY_HEADER_SIZE <= size:
+			length, turns, num_players = struct.unpack(ENTRY_HEADER, data_file.read(ENTRY_HEADER_SIZE))
+			if length < ENTRY_HEADER_SIZE or offset + length > size:
+				break
+			entries.append(struct.pack(INDEX_ENTRY, offset, length, turns))
+			data_file.seek(length - ENTRY_HEADER_SIZE, os.SEEK_CUR)
+			offset += length
+	with open(file_name + INDEX_SUFFIX, "wb") as index_file:
+		index_file.write(struct.pack(ARCHIVE_HEADER, ARCHIVE_MAGIC, ARCHIVE_VERSION))
+		index_file.write("".join(entries))
+	return len(entries)
+
+def archive_games(writer, strategy_classes, seeds, pile_factories = None, max_turns = MAX_TURNS):
+	"""Plays and records a headless game per seed into an ArchiveWriter."""
+	for seed in seeds:
+		players = [Player(str(index)) for index in range(0, len(strategy_classes))]
+		game, record = record_game(players, CreateKingdom(pile_factories),
+								   CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								   [cls() for cls in strategy_classes], seed = seed, max_turns = max_turns,
+								   headless = True)
+		writer.add_game(game, record)
+
+if __name__ == "__main__":
+	# python dominion_archive.py archive.dom [num games to add]
+	if len(sys.argv) < 2:
+		sys.exit("Usage: dominion_archive.py archive_file [num games to add]")
+	file_name = sys.argv[1]
+	if len(sys.argv) > 2:
+		writer = ArchiveWriter(file_name)
+		archive_games(writer, [BigMoney, SmithyBigMoney], range(writer.num_games, writer.num_games + int(sys.argv[2])))
+		writer.close()
+	archive = GameArchive(file_name)
+	start = default_timer()
+	longest = max(range(0, len(archive)), key = archive.get_turns) if len(archive) else None
+	elapsed = default_timer() - start
+	print "{0} games, {1} bytes".format(len(archive), os.path.getsize(file_name))
+	if longest is not None:
+		print "Longest game {0}: {1} (found in {2:.3f}s from the index)".format(longest, archive[longest], elapsed)
+	archive.close()
@@ -0,0 +1,268 @@
+#!/usr/bin/python
+import sys
+import time
+import heapq
+from collections import deque
+from timeit import default_timer
+
+from dominion import GameStateMachine, Player, Strategy, PHASE_ACTION, PHASE_BUY, PROFILE_TURN
+from dominion_cards import CreateStartingCards
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import CreateKingdom, MAX_TURNS, NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Plays many games in one thread without blocking on slow players. A strategy
+# may return a Decision from choose_play or choose_buy instead of a move, the
+# game is then parked until someone calls Decision.set_result, e.g. when a
+# person's request or a remote bot's answer comes in, and the GameLoop keeps
+# playing the other games meanwhile. Games are generators
+# (AsyncGameStateMachine.play_steps) that yield the Decisions they wait on,
+# the GameLoop sends each result back in.
+#
+# Strategies that return moves straight away play exactly as they do with
+# GameStateMachine.play_game, which stays the way to simulate bot games.
+
+# Config
+POLL_TIMEOUT = 0.05 # Longest wait, in seconds, for a poller when no game can move.
+
+class Decision:
+	"""A move that isn't made yet, see set_result.
+
+	Members:
+	done   -- True once the move is made
+	result -- the move, what choose_play or choose_buy would have returned
+	"""
+	def __init__(self):
+		self.done = False
+		self.result = None
+		self.callbacks = []
+
+	def __repr__(self):
+		return "Decision({0})".format(repr(self.result) if self.done else "pending")
+
+	def set_result(self, result):
+		"""Makes the move, the game waiting on it resumes on the GameLoop's next step."""
+		assert not self.done, "Decision already made."
+		self.done = True
+		self.result = result
+		callbacks = self.callbacks
+		self.callbacks = []
+		for callback in callbacks:
+			callback(self)
+
+	def add_callback(self, callback):
+		"""Calls callback(decision) once the move is made, right away if it already is."""
+		if self.done:
+			callback(self)
+		else:
+			self.callbacks.append(callback)
+
+class AsyncGameStateMachine(GameStateMachine):
+	"""A GameStateMachine whose strategies may return Decisions, see play_steps.
+
+	Takes the same arguments as GameStateMachine. Choose play and choose buy
+	aren't profiled, their time would be time spent waiting on the player.
+	"""
+	def play_game(self, max_turns = None):
+		"""Plays the game like GameStateMachine.play_game, every Decision must already be made."""
+		steps = self.play_steps(max_turns)
+		for decision in steps:
+			raise RuntimeError("play_game can't wait on {0}, run the game in a GameLoop.".format(decision))
+
+	def play_steps(self, max_turns = None):
+		"""Generator playing turns like play_game.
+
+		Yields every Decision that isn't made yet and expects its result sent
+		back with send(). Finishes when the game is over or max_turns is reached.
+		"""
+		game_state = self.game_state
+		while not game_state.is_game_over():
+			if max_turns is not None and self.turn_number >= max_turns:
+				break
+			curr_turn = self.curr_turn_object
+			strategy = curr_turn.strategy
+			profiler = self.profiler
+			if profiler is not None:
+				turn_start = default_timer()
+			self.start_turn()
+			while True:
+				card_to_play = strategy.choose_play(curr_turn.get_deck().get_hand(), curr_turn)
+				if isinstance(card_to_play, Decision):
+					card_to_play = card_to_play.result if card_to_play.done else (yield card_to_play)
+				if not self.apply_play(curr_turn, card_to_play):
+					break
+			while curr_turn.get_buys():
+				card_to_buy = strategy.choose_buy(game_state, curr_turn)
+				if isinstance(card_to_buy, Decision):
+					card_to_buy = card_to_buy.result if card_to_buy.done else (yield card_to_buy)
+				if not self.apply_buy(curr_turn, card_to_buy):
+					break
+			self.finish_turn()
+			if profiler is not None:
+				profiler.add(PROFILE_TURN, turn_start)
+			self.advance_turn()
+
+class GameLoop:
+	"""Interleaves AsyncGameStateMachines in one thread.
+
+	Games that can move are played until they wait on a Decision, timers run
+	when due, and when nothing else can move the pollers get to wait for
+	outside input (e.g. select on sockets) and make Decisions.
+
+	Members:
+	ready    -- (game, steps, move) of the games that can move
+	waiting  -- number of games waiting on a Decision
+	finished -- games that played to the end or to their turn limit, in the order they did
+	"""
+	def __init__(self, poll_timeout = POLL_TIMEOUT):
+		self.poll_timeout = poll_timeout
+		self.ready = deque()
+		self.timers = []
+		self.timer_count = 0
+		self.pollers = []
+		self.waiting = 0
+		self.finished = []
+
+	def add_game(self, game, max_turns = None):
+		"""Starts playing an AsyncGameStateMachine on the next step."""
+		self.ready.append((game, game.play_steps(max_turns), None))
+
+	def call_later(self, delay, callback):
+		"""Calls callback() after delay seconds."""
+		self.timer_count += 1 # Keeps callbacks due at the same time in order, callbacks don't compare.
+		heapq.heappush(self.timers, (default_timer() + delay, self.timer_count, callback))
+
+	def sleep(self, delay, result = None):
+		"""Returns a Decision the loop makes, with result, after delay seconds."""
+		decision = Decision()
+		self.call_later(delay, lambda: decision.set_result(result))
+		return decision
+
+	def add_poller(self, poll):
+		"""Adds poll(timeout), called when no game can move, it may block for up to timeout seconds."""
+		self.pollers.append(poll)
+
+	def is_busy(self):
+		"""Returns True while a game can still move without new games being added."""
+		return bool(self.ready or self.timers or (self.waiting and self.pollers))
+
+	def step(self):
+		"""Moves every ready game until it waits or finishes, then runs due timers or polls."""
+		ready = self.ready
+		for i in range(0, len(ready)):
+			game, steps, move = ready.popleft()
+			self._resume(game, steps, move)
+		timers = self.timers
+		now = default_timer()
+		while timers and timers[0][0] <= now:
+			heapq.heappop(timers)[2]()
+		if ready:
+			return
+		timeout = self.poll_timeout
+		if timers:
+			timeout = min(timeout, timers[0][0] - now) if self.pollers else timers[0][0] - now
+		if self.pollers:
+			for poll in self.pollers:
+				poll(timeout)
+		elif timers and timeout > 0:
+			time.sleep(timeout)
+
+	def run(self):
+		"""Steps until no game can move, returns the finished games."""
+		while self.is_busy():
+			self.step()
+		return self.finished
+
+	def _resume(self, game, steps, move):
+		try:
+			decision = steps.send(move)
+		except StopIteration:
+			self.finished.append(game)
+			return
+		self.waiting += 1
+		decision.add_callback(lambda decision: self._wake(game, steps, decision))
+
+	def _wake(self, game, steps, decision):
+		self.waiting -= 1
+		self.ready.append((game, steps, decision.result))
+
+class ThinkingStrategy(Strategy):
+	"""Plays like another strategy, but takes think_time seconds over every move.
+
+	Stands in for a remote bot or a person, the GameLoop plays other games meanwhile.
+	"""
+	def __init__(self, strategy, loop, think_time):
+		self.strategy = strategy
+		self.name = strategy.name
+		self.loop = loop
+		self.think_time = think_time
+		self.moves = 0
+
+	def start_game(self, game, turn):
+		self.strategy.start_game(game, turn)
+
+	def choose_play(self, hand, turn):
+		self.moves += 1
+		return self.loop.sleep(self.think_time, self.strategy.choose_play(hand, turn))
+
+	def choose_buy(self, supply, turn):
+		self.moves += 1
+		return self.loop.sleep(self.think_time, self.strategy.choose_buy(supply, turn))
+
+class RemoteStrategy(Strategy):
+	"""Waits for moves from outside the game, e.g. a web request or a socket.
+
+	Members:
+	pending -- the Decision the game is waiting on, None when it isn't this player's move
+	phase   -- PHASE_ACTION or PHASE_BUY, what the pending Decision is for
+	"""
+	name = "remote"
+
+	def __init__(self):
+		self.pending = None
+		self.phase = None
+
+	def choose_play(self, hand, turn):
+		return self._wait(PHASE_ACTION)
+
+	def choose_buy(self, supply, turn):
+		return self._wait(PHASE_BUY)
+
+	def decide(self, move):
+		"""Makes the pending move, returns False if the game isn't waiting on this player."""
+		decision = self.pending
+		if decision is None:
+			return False
+		self.pending = None
+		self.phase = None
+		decision.set_result(move)
+		return True
+
+	def _wait(self, phase):
+		self.pending = Decision()
+		self.phase = phase
+		return self.pending
+
+def create_async_game(strategies, seed, pile_factories = None):
+	"""Returns a headless two or more player AsyncGameStateMachine for the given strategy objects."""
+	players = [Player(str(index)) for index in range(0, len(strategies))]
+	return AsyncGameStateMachine(players, CreateKingdom(pile_factories),
+								 CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								 strategies, headless = True, seed = seed)
+
+if __name__ == "__main__":
+	# Plays games whose bots take think_time per move: python dominion_async.py [num games] [think time]
+	num_games = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	think_time = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+	loop = GameLoop()
+	strategies = []
+	for seed in range(0, num_games):
+		game_strategies = [ThinkingStrategy(BigMoney(), loop, think_time),
+						   ThinkingStrategy(SmithyBigMoney(), loop, think_time)]
+		strategies += game_strategies
+		loop.add_game(create_async_game(game_strategies, seed), MAX_TURNS)
+	start = default_timer()
+	games = loop.run()
+	elapsed = default_timer() - start
+	moves = sum([strategy.moves for strategy in strategies])
+	print "{0} games, {1} turns in {2:.2f}s, {3:.2f}s of thinking played one game at a time".format(
+			len(games), sum([game.turn_number for game in games]), elapsed, moves * think_time)
@@ -0,0 +1,210 @@
+#!/usr/bin/python
+import random
+import sys
+
+from dominion import DRAW_SIZE, CARD_ACTION, effect_totals, EFFECT_NAMES
+from dominion import EFFECT_CARDS, EFFECT_ACTIONS, EFFECT_MONEY
+from dominion_cards import *
+from dominion_tournament import MatchupStats, CreateKingdom, MAX_TURNS
+from dominion_tournament import NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Batch engine for money and draw strategies over the simple card set.
+#
+# Every game is a handful of flat count lists indexed by card id instead of a
+# GameStateMachine, and all games are advanced one turn at a time in lock-step.
+# The rules match GameStateMachine with the dominion_bots strategies: action
+# cards are played while there are actions, all money is played, then at most
+# one card is bought from an ordered list of buy rules. Card effects come from
+# the same Card.effect ops GameStateMachine runs, summed up per card.
+
+# Card ids
+COPPER, SILVER, GOLD, ESTATE, DUCHIE, PROVINCE, SMITHY, VILLAGE = range(0, 8)
+BATCH_CARDS = [Copper(), Silver(), Gold(), Estate(), Duchie(), Province(), Smithy(), Village()]
+CARD_IDS = dict((card.name, card_id) for card_id, card in enumerate(BATCH_CARDS))
+NUM_CARD_TYPES = len(BATCH_CARDS)
+CARD_COSTS = [card.cost for card in BATCH_CARDS]
+CARD_POINTS = [card.points for card in BATCH_CARDS]
+CARD_VALUES = [card.value for card in BATCH_CARDS]
+BATCH_EFFECTS = [EFFECT_CARDS, EFFECT_ACTIONS, EFFECT_MONEY] # Ops the batch engine can run.
+CARD_EFFECTS = [effect_totals(card.effect) for card in BATCH_CARDS]
+for card, totals in zip(BATCH_CARDS, CARD_EFFECTS):
+	for op, total in enumerate(totals):
+		assert total == 0 or op in BATCH_EFFECTS, "Batch engine can't run %s effects of %s" % (EFFECT_NAMES[op], card.name)
+# Action card ids in play order, cards giving actions first so they don't use up the action a draw card needs.
+PLAY_ORDER = sorted([card_id for card_id, card in enumerate(BATCH_CARDS) if card.kind is CARD_ACTION],
+					key = lambda card_id: -CARD_EFFECTS[card_id][EFFECT_ACTIONS])
+
+class BatchStrategy:
+	"""A money and draw strategy described by its buy rules.
+
+	Members:
+	name      -- name used in MatchupStats, matches the dominion_bots strategy it mirrors
+	buy_rules -- list of (card name, per_cards, max_money) in priority order, the first
+	             affordable card is bought, per_cards limits it to one copy per that many
+	             cards in the deck and max_money to turns with at most that much money
+	             (None for no limit)
+	"""
+	def __init__(self, name, buy_rules):
+		self.name = name
+		self.buy_rules = [(CARD_IDS[card_name], per_cards, max_money) for card_name, per_cards, max_money in buy_rules]
+
+	def __repr__(self):
+		return self.name
+
+	def choose_buy(self, money, supply, owned):
+		"""Returns the card id to buy given count lists of the supply and the deck, None to buy nothing."""
+		for card_id, per_cards, max_money in self.buy_rules:
+			if money < CARD_COSTS[card_id] or not supply[card_id]:
+				continue
+			if max_money is not None and money > max_money:
+				continue
+			if per_cards is not None and owned[card_id] * per_cards >= sum(owned):
+				continue
+			return card_id
+		return None
+
+BATCH_BIG_MONEY = BatchStrategy("big money", [("province", None, None), ("gold", None, None), ("silver", None, None)])
+# SmithyBigMoney only thinks about Smithy with $4-5, with more it buys like BigMoney even if Gold is gone.
+BATCH_SMITHY_BIG_MONEY = BatchStrategy("smithy big money",
+		[("province", None, None), ("gold", None, None), ("smithy", 11, 5), ("silver", None, None)])
+
+class BatchSimulator:
+	"""Plays num_games games between strategies in lock-step.
+
+	Game g seats strategy (g + seat) % len(strategies) in each seat, the same
+	rotation dominion_tournament.play_game uses.
+
+	Members (slot = game * num_players + seat):
+	draws    -- per slot, card ids in the draw pile, the top card is last
+	discards -- per slot, count of each card id in the discard
+	hands    -- per slot, count of each card id in hand
+	owned    -- per slot, count of each card id in the whole deck
+	supplies -- per game, count of each card id left in the supply
+	"""
+	def __init__(self, strategies, num_games, seed = 0, max_turns = MAX_TURNS, pile_factories = None):
+		self.strategies = strategies
+		self.num_games = num_games
+		self.num_players = len(strategies)
+		self.max_turns = max_turns
+		self.rng = random.Random(seed)
+		supply = [0] * NUM_CARD_TYPES
+		empty_piles = 0
+		for pile in CreateKingdom(pile_factories):
+			card_id = CARD_IDS.get(pile.get_card().name)
+			assert card_id is not None, "Batch engine can't play %s" % pile.get_card().name
+			supply[card_id] = pile.get_quantity()
+			if pile.is_empty():
+				empty_piles += 1
+		starting = [0] * NUM_CARD_TYPES
+		starting[COPPER] = NUM_STARTING_COPPER
+		starting[ESTATE] = NUM_STARTING_ESTATES
+		num_slots = num_games * self.num_players
+		self.seats = [[strategies[(game + seat) % self.num_players] for seat in range(0, self.num_players)]
+					  for game in range(0, num_games)]
+		self.supplies = [list(supply) for game in range(0, num_games)]
+		self.empty_piles = [empty_piles] * num_games
+		self.game_over = [False] * num_games
+		self.game_turns = [0] * num_games
+		self.owned = [list(starting) for slot in range(0, num_slots)]
+		self.discards = [list(starting) for slot in range(0, num_slots)]
+		self.hands = [[0] * NUM_CARD_TYPES for slot in range(0, num_slots)]
+		self.draws = [[] for slot in range(0, num_slots)]
+		self.turns = [0] * num_slots
+		for slot in range(0, num_slots):
+			self._draw(slot, DRAW_SIZE)
+
+	def _draw(self, slot, num_cards):
+		"""Draws num_cards into hand, shuffling the discard into the draw when it runs out."""
+		draw = self.draws[slot]
+		hand = self.hands[slot]
+		if len(draw) < num_cards:
+			num_cards -= len(draw)
+			for card_id in draw:
+				hand[card_id] += 1
+			discard = self.discards[slot]
+			draw = []
+			for card_id in range(0, NUM_CARD_TYPES):
+				draw += [card_id] * discard[card_id]
+				discard[card_id] = 0
+			self.rng.shuffle(draw)
+			self.draws[slot] = draw
+		for i in range(0, min(num_cards, len(draw))):
+			hand[draw.pop()] += 1
+
+	def _play_turn(self, game):
+		seat = self.game_turns[game] % self.num_players
+		slot = game * self.num_players + seat
+		hand = self.hands[slot]
+		in_play = [0] * NUM_CARD_TYPES
+		# Action phase
+		actions = 1
+		money = 0
+		while actions:
+			for card_id in PLAY_ORDER:
+				if hand[card_id]:
+					break
+			else:
+				break
+			hand[card_id] -= 1
+			in_play[card_id] += 1
+			totals = CARD_EFFECTS[card_id]
+			actions += totals[EFFECT_ACTIONS] - 1
+			money += totals[EFFECT_MONEY]
+			self._draw(slot, totals[EFFECT_CARDS])
+		# Buy phase
+		money += sum([CARD_VALUES[card_id] * hand[card_id] for card_id in (COPPER, SILVER, GOLD)])
+		supply = self.supplies[game]
+		owned = self.owned[slot]
+		card_id = self.seats[game][seat].choose_buy(money, supply, owned)
+		if card_id is not None:
+			supply[card_id] -= 1
+			owned[card_id] += 1
+			self.discards[slot][card_id] += 1
+			if not supply[card_id]:
+				self.empty_piles[game] += 1
+				if card_id == PROVINCE or self.empty_piles[game] >= 3:
+					self.game_over[game] = True
+		# Clean up
+		discard = self.discards[slot]
+		for card_id in range(0, NUM_CARD_TYPES):
+			discard[card_id] += hand[card_id] + in_play[card_id]
+			hand[card_id] = 0
+		self._draw(slot, DRAW_SIZE)
+		self.turns[slot] += 1
+		self.game_turns[game] += 1
+		if self.game_turns[game] >= self.max_turns:
+			self.game_over[game] = True
+
+	def run(self):
+		"""Plays every game to the end and returns MatchupStats indexed like strategies."""
+		active = [game for game in range(0, self.num_games) if not self.game_over[game]]
+		while active:
+			for game in active:
+				self._play_turn(game)
+			active = [game for game in active if not self.game_over[game]]
+		return self.get_stats()
+
+	def get_stats(self):
+		"""Returns MatchupStats for the finished games."""
+		stats = MatchupStats([strategy.name for strategy in self.strategies])
+		for game in range(0, self.num_games):
+			points = [0] * self.num_players
+			ranks = []
+			for seat in range(0, self.num_players):
+				slot = game * self.num_players + seat
+				index = (game + seat) % self.num_players
+				points[index] = sum([CARD_POINTS[card_id] * count for card_id, count in enumerate(self.owned[slot])])
+				ranks.append(((points[index], -self.turns[slot]), index))
+			best = max(ranks)[0]
+			stats.add_game(points, [index for rank, index in ranks if rank == best], self.game_turns[game])
+		return stats
+
+def run_batch(strategies, num_games, seed = 0, max_turns = MAX_TURNS, pile_factories = None):
+	"""Plays num_games between the given BatchStrategies and returns their MatchupStats."""
+	return BatchSimulator(strategies, num_games, seed, max_turns, pile_factories).run()
+
+if __name__ == "__main__":
+	num_games = 10000
+	if len(sys.argv) > 1:
+		num_games = int(sys.argv[1])
+	print run_batch([BATCH_BIG_MONEY, BATCH_SMITHY_BIG_MONEY], num_games)
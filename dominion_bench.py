@@ -0,0 +1,270 @@
+#!/usr/bin/python
+import sys
+import json
+import time
+import resource
+import argparse
+from timeit import default_timer
+from multiprocessing import Pool
+
+from dominion import *
+from dominion_cards import *
+from dominion_decks import LazyDeck
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import CreateKingdom, play_game, NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Engine benchmarks, run after performance changes:
+#   python dominion_bench.py                 runs, compares with the last run and saves to the history
+#   python dominion_bench.py --compare-only  compares the last two saved runs
+# Exits with status 1 if any benchmark got worse than the threshold.
+
+# Config
+HISTORY_FILE = "bench_history.json"
+REGRESSION_THRESHOLD = 0.10 # Relative change counted as a regression.
+REPEAT = 5 # Timed runs per benchmark, the best one is kept.
+LOOPS = 20000 # Operations per timed run for the micro benchmarks.
+NUM_GAMES = 50 # Games per timed run for the full game benchmarks.
+MEMORY_GAMES = 200 # Games kept alive at once to measure memory per game.
+BENCH_STRATEGIES = [BigMoney, SmithyBigMoney]
+THICK_DECK_CARDS = 60 # Cards in the late game deck the thick deck benchmarks draw from.
+
+class BenchResult:
+	"""One benchmark's number.
+
+	Members:
+	name             -- benchmark name, the key in the history
+	value            -- the measured number
+	unit             -- what value counts, e.g. "ops/s"
+	higher_is_better -- True for throughput, False for latency and memory
+	"""
+	def __init__(self, name, value, unit, higher_is_better):
+		self.name = name
+		self.value = value
+		self.unit = unit
+		self.higher_is_better = higher_is_better
+
+	def __repr__(self):
+		return str(self)
+
+	def __str__(self):
+		return "{0:<28} {1:>14.2f} {2}".format(self.name, self.value, self.unit)
+
+	def to_dict(self):
+		return {"value": self.value, "unit": self.unit, "higher_is_better": self.higher_is_better}
+
+def best_time(run, loops, repeat = REPEAT):
+	"""Returns the fastest of repeat timed calls of run(loops), in seconds."""
+	best = None
+	for i in range(0, repeat):
+		start = default_timer()
+		run(loops)
+		elapsed = default_timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+def new_deck(deck_class = Deck, num_cards = None):
+	cards = CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES) + [Silver(), Gold(), Smithy()]
+	if num_cards is not None:
+		cards = (cards * (num_cards // len(cards) + 1))[:num_cards]
+	return deck_class(cards, EventBus(), Random(0))
+
+def _take_hand(deck, cards = ()):
+	"""Empties the hand zone, or fills it with cards, without touching the deck's totals.
+
+	The benchmarks move cards between zones by hand, this keeps the hand counts in step.
+	"""
+	deck._clear_hand()
+	deck._add_to_hand(list(cards))
+
+def bench_draw_cards(loops, repeat = REPEAT, deck_class = Deck, num_cards = None, name = "deck.draw_cards"):
+	"""Draws a hand and discards it, the discard is shuffled back in whenever the draw runs out."""
+	deck = new_deck(deck_class, num_cards)
+	def run(loops):
+		draw_cards = deck.draw_cards
+		for i in range(0, loops):
+			draw_cards(DRAW_SIZE)
+			deck.discard += deck.hand
+			_take_hand(deck)
+	return BenchResult(name, loops / best_time(run, loops, repeat), "ops/s", True)
+
+def bench_shuffle_draw(loops, repeat = REPEAT, deck_class = Deck, num_cards = None, name = "deck.shuffle_draw"):
+	"""Reshuffles the draw pile then draws a hand, like every MCTS playout does."""
+	deck = new_deck(deck_class, num_cards)
+	def run(loops):
+		shuffle_draw = deck.shuffle_draw
+		draw_cards = deck.draw_cards
+		for i in range(0, loops):
+			shuffle_draw()
+			draw_cards(DRAW_SIZE)
+			deck.discard += deck.hand
+			_take_hand(deck)
+	return BenchResult(name, loops / best_time(run, loops, repeat), "ops/s", True)
+
+def bench_shuffle_cards(loops, repeat = REPEAT):
+	deck = new_deck()
+	deck.draw += deck.hand # Each loop swaps the full draw into the discard and shuffles it back.
+	_take_hand(deck)
+	def run(loops):
+		shuffle_cards = deck.shuffle_cards
+		for i in range(0, loops):
+			deck.discard, deck.draw = deck.draw, deck.discard
+			shuffle_cards()
+	return BenchResult("deck.shuffle_cards", loops / best_time(run, loops, repeat), "ops/s", True)
+
+def bench_end_turn(loops, repeat = REPEAT):
+	deck = new_deck()
+	def run(loops):
+		end_turn = deck.end_turn
+		for i in range(0, loops):
+			end_turn()
+	return BenchResult("deck.end_turn", loops / best_time(run, loops, repeat), "ops/s", True)
+
+def bench_play_all_money(loops, repeat = REPEAT, hand_size = 3 * DRAW_SIZE):
+	"""Plays a big Smithy hand's money, then puts the hand back for the next loop."""
+	turn = TurnObject(Player("0"), CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES), None,
+					  EventBus(), None, Random(0))
+	hand = ([Copper(), Silver(), Gold(), Estate(), Smithy()] * hand_size)[:hand_size]
+	def run(loops):
+		deck = turn.deck
+		for i in range(0, loops):
+			_take_hand(deck, hand)
+			deck.in_play = []
+			turn.play_all_money()
+	return BenchResult("turn.play_all_money", loops / best_time(run, loops, repeat), "ops/s", True)
+
+def bench_remove_from_supply(loops, repeat = REPEAT):
+	"""Latency of one remove_from_supply, piles are big enough never to empty."""
+	cards = [pile.get_card() for pile in CreateKingdom()]
+	piles = [Pile(card, (loops + 1) * repeat) for card in cards if card.name != "province"]
+	supply = Supply(piles, events = EventBus())
+	cards = [pile.get_card() for pile in piles]
+	def run(loops):
+		remove_from_supply = supply.remove_from_supply
+		num_cards = len(cards)
+		for i in range(0, loops):
+			remove_from_supply(cards[i % num_cards])
+	return BenchResult("supply.remove_from_supply", best_time(run, loops, repeat) / loops * 1e6, "us", False)
+
+def bench_games(num_games, repeat = REPEAT, strategy_classes = BENCH_STRATEGIES):
+	"""Returns turns per second and games per second for headless bot games."""
+	turns = [0]
+	def run(num_games):
+		turns[0] = 0
+		for seed in range(0, num_games):
+			turns[0] += play_game(strategy_classes, seed)[2]
+	elapsed = best_time(run, num_games, repeat)
+	return [BenchResult("game.turns_per_second", turns[0] / elapsed, "turns/s", True),
+			BenchResult("game.games_per_second", num_games / elapsed, "games/s", True)]
+
+def _game_memory(job):
+	"""Worker entry point, returns the peak resident memory added per finished game in KB.
+
+	Runs in a fresh process so the baseline doesn't include earlier benchmarks.
+	"""
+	num_games, strategy_classes = job
+	baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	games = []
+	for seed in range(0, num_games):
+		game = GameStateMachine([Player("0"), Player("1")], CreateKingdom(),
+								CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								[cls() for cls in strategy_classes], headless = True, seed = seed)
+		game.play_game(400)
+		games.append(game)
+	return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / num_games # ru_maxrss is in KB on Linux.
+
+def bench_game_memory(num_games = MEMORY_GAMES, strategy_classes = BENCH_STRATEGIES):
+	pool = Pool(1)
+	try:
+		per_game = pool.apply(_game_memory, [(num_games, strategy_classes)])
+	finally:
+		pool.terminate()
+		pool.join()
+	return BenchResult("game.peak_memory", per_game, "KB/game", False)
+
+def run_benchmarks(loops = LOOPS, num_games = NUM_GAMES, repeat = REPEAT, memory_games = MEMORY_GAMES):
+	"""Runs every benchmark and returns a list of BenchResults."""
+	results = [bench_draw_cards(loops, repeat),
+			   bench_draw_cards(loops, repeat, Deck, THICK_DECK_CARDS, "deck.draw_cards_thick"),
+			   bench_draw_cards(loops, repeat, LazyDeck, THICK_DECK_CARDS, "lazy_deck.draw_cards_thick"),
+			   bench_shuffle_draw(loops, repeat, Deck, THICK_DECK_CARDS, "deck.shuffle_draw_thick"),
+			   bench_shuffle_draw(loops, repeat, LazyDeck, THICK_DECK_CARDS, "lazy_deck.shuffle_draw_thick"),
+			   bench_shuffle_cards(loops, repeat),
+			   bench_end_turn(loops, repeat), bench_play_all_money(loops, repeat),
+			   bench_remove_from_supply(loops, repeat)]
+	results += bench_games(num_games, repeat)
+	results.append(bench_game_memory(memory_games))
+	return results
+
+def load_history(file_name = HISTORY_FILE):
+	"""Returns the list of saved runs, oldest first, each {"time": ..., "label": ..., "results": {...}}."""
+	try:
+		with open(file_name) as history_file:
+			return json.load(history_file)
+	except IOError:
+		return []
+
+def save_run(results, label = "", file_name = HISTORY_FILE):
+	"""Appends a run to the history file and returns it."""
+	history = load_history(file_name)
+	run = {"time": time.time(), "label": label,
+		   "results": dict((result.name, result.to_dict()) for result in results)}
+	history.append(run)
+	with open(file_name, "w") as history_file:
+		json.dump(history, history_file, indent = 1, sort_keys = True)
+	return run
+
+def compare_runs(old_results, new_results, threshold = REGRESSION_THRESHOLD):
+	"""Returns [(name, old value, new value, relative change, regressed)] for benchmarks in both runs.
+
+	The relative change is positive when the benchmark got better, whichever
+	direction better is for it, and regressed is True past -threshold.
+	"""
+	comparison = []
+	for name in sorted(new_results):
+		if name not in old_results or not old_results[name]["value"]:
+			continue
+		old_value = old_results[name]["value"]
+		new_value = new_results[name]["value"]
+		change = (new_value - old_value) / float(old_value)
+		if not new_results[name]["higher_is_better"]:
+			change = -change
+		comparison.append((name, old_value, new_value, change, change < -threshold))
+	return comparison
+
+def print_comparison(comparison):
+	for name, old_value, new_value, change, regressed in comparison:
+		print "{0:<28} {1:>14.2f} -> {2:>14.2f} {3:>+8.1%}{4}".format(
+				name, old_value, new_value, change, "  REGRESSION" if regressed else "")
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "Benchmarks the game engine.")
+	parser.add_argument("--history", default = HISTORY_FILE, help = "JSON history file")
+	parser.add_argument("--label", default = "", help = "saved with the run, e.g. a commit")
+	parser.add_argument("--threshold", type = float, default = REGRESSION_THRESHOLD)
+	parser.add_argument("--compare-only", action = "store_true", help = "compare the last two saved runs")
+	parser.add_argument("--no-save", action = "store_true", help = "don't add this run to the history")
+	parser.add_argument("--quick", action = "store_true", help = "fewer loops, noisier numbers")
+	args = parser.parse_args()
+	history = load_history(args.history)
+	if args.compare_only:
+		if len(history) < 2:
+			sys.exit("Need two saved runs to compare.")
+		old_results, new_results = history[-2]["results"], history[-1]["results"]
+	else:
+		if args.quick:
+			results = run_benchmarks(LOOPS / 10, NUM_GAMES / 10, 3, MEMORY_GAMES / 10)
+		else:
+			results = run_benchmarks()
+		for result in results:
+			print result
+		new_results = dict((result.name, result.to_dict()) for result in results)
+		old_results = history[-1]["results"] if history else {}
+		if not args.no_save:
+			save_run(results, args.label, args.history)
+	comparison = compare_runs(old_results, new_results, args.threshold)
+	if comparison:
+		print
+		print_comparison(comparison)
+	if [entry for entry in comparison if entry[4]]:
+		sys.exit(1)
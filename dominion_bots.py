@@ -0,0 +1,50 @@
+#!/usr/bin/python
+from dominion import Strategy, CARD_COIN, CARD_ACTION
+
+# Built in bot strategies, use with GameStateMachine(..., headless = True).
+
+def has_kind(cards, kind):
+	"""Returns True if any of the given cards is of the given kind."""
+	for card in cards:
+		if card.kind is kind:
+			return True
+	return False
+
+def first_affordable(supply, card_names, money):
+	"""Returns the first card in card_names that is in the supply, not empty and costs at most money."""
+	for card_name in card_names:
+		pile = supply.get_pile(card_name)
+		if pile and not pile.is_empty() and pile.get_card().cost <= money:
+			return pile.get_card()
+	return "none"
+
+class BigMoney(Strategy):
+	"""Plays all money, buys Province at 8, Gold at 6 and Silver at 3."""
+	name = "big money"
+
+	def choose_play(self, hand, turn):
+		if has_kind(hand, CARD_COIN):
+			return "all"
+		return "done"
+
+	def choose_buy(self, supply, turn):
+		return first_affordable(supply, ["province", "gold", "silver"], turn.money)
+
+class SmithyBigMoney(BigMoney):
+	"""Big Money that plays Smithy first and buys one Smithy for roughly every 11 cards in the deck."""
+	name = "smithy big money"
+
+	def choose_play(self, hand, turn):
+		if turn.actions > 0:
+			for card_index, card in enumerate(hand):
+				if card.kind is CARD_ACTION and card.name == "smithy":
+					return card_index
+		return BigMoney.choose_play(self, hand, turn)
+
+	def choose_buy(self, supply, turn):
+		deck = turn.get_deck()
+		smithy_pile = supply.get_pile("smithy")
+		if smithy_pile and turn.money >= 4 and turn.money < 6:
+			if deck.count_card(smithy_pile.get_card()) * 11 < deck.get_size():
+				return first_affordable(supply, ["smithy", "silver"], turn.money)
+		return BigMoney.choose_buy(self, supply, turn)
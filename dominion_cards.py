@@ -1,70 +1,134 @@
 #!/usr/bin/python
-from dominion import Card, Pile
+import os
+import json
+
+from dominion import Card, Pile, card_registry, registered_cards
+from dominion import CARD_COIN, CARD_POINT, CARD_POITION, CARD_ACTION
+from dominion import EFFECT_NAMES, EFFECT_GAIN, EFFECT_TRASH
 
 # Pile sizes
 NUM_MONEY_CARDS = 30
 NUM_POINT_CARDS = 10
 NUM_PILE_CARDS = 10
 
-# Card types
-CARD_COIN = "coin"
-CARD_POINT = "point"
-CARD_POITION = "potion"
-CARD_ACTION = "action"
-
 # Error codes
 # TODO move this to a method in dominion.py ?
 ERROR_NUM_CARDS_TOO_FEW = 100
 ERROR_CARD_NOT_IN_SUPPLY = 101
 
+# Card definitions live in CARD_FILE, a JSON list of
+#	{"name": ..., "cost": ..., "kind": "coin" | "point" | "potion" | "action",
+#	 "value": ..., "points": ..., "end_game": ..., "effect": [[op, argument], ...],
+#	 "action": name in CARD_ACTIONS}
+# with everything after kind optional. Effect ops are EFFECT_NAMES, e.g.
+# [["cards", 1], ["actions", 2]], gain and trash take a card name. Every card is
+# registered once and the factories below return that one shared Card.
+CARD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cards.json")
+CARD_KINDS = dict((kind, kind) for kind in [CARD_COIN, CARD_POINT, CARD_POITION, CARD_ACTION])
+
+# Python callables for effects the ops can't describe, see Card.actions.
+CARD_ACTIONS = {}
+
+def CompileEffect(effect, card_ids = None):
+	"""Returns the Card.effect tuple for a list of (op name, argument) pairs.
+
+	Arguments:
+	card_ids -- card name to card_id for gain and trash arguments, on top of the
+	            registered cards, for cards that are about to be registered
+	"""
+	ops = []
+	for op_name, argument in effect:
+		op = EFFECT_NAMES.index(op_name)
+		if op == EFFECT_GAIN or op == EFFECT_TRASH:
+			if argument in card_registry:
+				argument = card_registry[argument].card_id
+			else:
+				argument = card_ids[argument]
+		ops += [op, int(argument)]
+	return tuple(ops)
+
+def RegisterCard(name, cost, kind, value = 0, points = 0, actions = None, end_game = False, effect = ()):
+	"""Returns the shared Card with the given name, registering it the first time.
+
+	A card registered twice must have the same definition both times.
+	"""
+	card = card_registry.get(name)
+	if card is not None:
+		assert ((card.cost, card.kind, card.value, card.points, card.actions, card.end_game, card.effect) ==
+				(cost, kind, value, points, actions, end_game, tuple(effect))), "Card %s registered twice differently." % name
+		return card
+	card = Card(name, cost, kind, value, points, actions, end_game, effect, len(registered_cards))
+	card_registry[name] = card
+	registered_cards.append(card)
+	return card
+
+def LoadCards(file_name = CARD_FILE):
+	"""Registers every card in the definition file, returns them in file order."""
+	with open(file_name) as card_file:
+		definitions = json.load(card_file)
+	# Cards may gain or trash cards defined later in the file, work out their ids first.
+	card_ids = {}
+	for definition in definitions:
+		name = str(definition["name"])
+		if name not in card_registry and name not in card_ids:
+			card_ids[name] = len(registered_cards) + len(card_ids)
+	cards = []
+	for definition in definitions:
+		action = definition.get("action")
+		effect = [(str(op_name), argument if isinstance(argument, int) else str(argument))
+				  for op_name, argument in definition.get("effect", [])]
+		# JSON strings are unicode, kinds are compared with "is" so use the constants.
+		cards.append(RegisterCard(str(definition["name"]), definition["cost"], CARD_KINDS[definition["kind"]],
+								  definition.get("value", 0), definition.get("points", 0),
+								  CARD_ACTIONS[action] if action else None, definition.get("end_game", False),
+								  CompileEffect(effect, card_ids)))
+	return cards
+
+LoadCards()
+
 # Basic cards
 def CoinCard(name, cost, value):
-	return Card(name, cost, CARD_COIN, value, 0)
+	return RegisterCard(name, cost, CARD_COIN, value, 0)
 
 def PointCard(name, cost, points, end_game = False):
-	return Card(name, cost, CARD_POINT, 0, points, None, end_game)
+	return RegisterCard(name, cost, CARD_POINT, 0, points, None, end_game)
 
-def ActionCard(name, cost, action):
-	return Card(name, cost, CARD_ACTION, 0, 0, action)
+def ActionCard(name, cost, effect):
+	"""effect is a list of (op name, argument) pairs, e.g. [("cards", 3)]."""
+	return RegisterCard(name, cost, CARD_ACTION, 0, 0, None, False, CompileEffect(effect))
 
 # Card definitions
 # Standard cards
 def Copper():
-	return CoinCard("copper", 0, 1) # name, cost, value
+	return card_registry["copper"]
 def Silver():
-	return CoinCard("silver", 3, 2) # name, cost, value
+	return card_registry["silver"]
 def Gold():
-	return CoinCard("gold", 6, 3)   # name, cost, value
+	return card_registry["gold"]
 def Platinum():
-	return CoinCard("platinum", 9, 5) # name, cost, value
+	return card_registry["platinum"]
 def Potion():
-	return Card("potion", 4, CARD_POITION, 1, 0) # name, cost, kind, value, points
+	return card_registry["potion"]
 def Estate():
-	return PointCard("estate", 2, 1) # name, cost, points
+	return card_registry["estate"]
 def Province():
-	return PointCard("province", 8, 6, True) # name, cost, points, will end game
+	return card_registry["province"]
 def Duchie():
-	return PointCard("duchie", 5, 3) # name, cost, points
+	return card_registry["duchie"]
 def Colony():
-	return PointCard("colony", 11, 10) # name, cost, points
+	return card_registry["colony"]
 def Curse():
-	return PointCard("curse", 0, -1) # name, costs, points
+	return card_registry["curse"]
 
 # Base set
 def Village():
-	return ActionCard("village", 3, VillageAction) # name, cost, action
+	return card_registry["village"]
 def Smithy():
-	return ActionCard("smithy", 4, SmithyAction) # name, cost, action
-
-# Card actions
-def VillageAction(game_state_machine):
-	curr_turn = game_state_machine.curr_turn_object
-	curr_turn.deck.draw_cards(1)
-	curr_turn.actions += 2
+	return card_registry["smithy"]
 
-def SmithyAction(game_state_machine):
-	curr_turn = game_state_machine.curr_turn_object
-	curr_turn.deck.draw_cards(3)
+def CreateCard(name):
+	"""Returns the card with the given name."""
+	return card_registry[name]
 
 # Simple game piles
 def CreateStartingCards(numCopper, numEstates):
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+import sys
+import math
+from random import Random
+
+from dominion import GameStateMachine, Player
+from dominion_cards import CreateStartingCards
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import CreateKingdom, MAX_TURNS, NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Compares two strategies in as few games as it takes to tell them apart.
+#
+# Games come in mirrored pairs with common random numbers: both games of a
+# pair use the same seat seeds (GameStateMachine seat_seeds), so each seat
+# shuffles the same way in both, and the strategies swap seats between them.
+# The luck of the shuffles then mostly cancels out within a pair, and what
+# is left of a pair's score is mostly down to the strategies.
+#
+# After every pair a sequential probability ratio test compares
+# H0: mean pair score = 0.5 - margin (the second strategy is better) with
+# H1: mean pair score = 0.5 + margin (the first one is), using the normal
+# approximation with the pairs' observed variance. It stops as soon as
+# either is accepted at the requested error rates, or after max_pairs.
+
+# Config
+MARGIN = 0.05 # Half the width of the indifference zone around a 0.5 score.
+ALPHA = 0.05 # Chance of calling the second strategy worse when it is better by margin.
+BETA = 0.05 # Chance of calling the first strategy worse when it is better by margin.
+MIN_PAIRS = 10 # Pairs before the test may stop, the variance estimate needs a few.
+MAX_PAIRS = 5000
+MIN_VARIANCE = 1e-4 # Keeps the test going while every pair so far scored the same.
+
+COMPARE_FIRST = "first"
+COMPARE_SECOND = "second"
+
+class Comparison:
+	"""The state of a sequential comparison, scores are the first strategy's.
+
+	Members:
+	strategies -- names of the two strategies
+	pairs      -- pairs of games played, games is twice that
+	total      -- sum of the pair scores, a pair scores 1 per win and 0.5 per tie over 2
+	squares    -- sum of the squared pair scores
+	llr        -- log likelihood ratio of H1 over H0
+	decision   -- COMPARE_FIRST or COMPARE_SECOND once a hypothesis is accepted, else None
+	"""
+	def __init__(self, strategies, margin = MARGIN, alpha = ALPHA, beta = BETA):
+		self.strategies = strategies
+		self.margin = margin
+		self.lower = math.log(beta / (1.0 - alpha))
+		self.upper = math.log((1.0 - beta) / alpha)
+		self.pairs = 0
+		self.total = 0.0
+		self.squares = 0.0
+		self.llr = 0.0
+		self.decision = None
+
+	def __repr__(self):
+		return str(self)
+
+	def __str__(self):
+		return "{0} vs {1}: score {2:.3f} +- {3:.3f} over {4} games, llr {5:.2f}, better: {6}".format(
+				self.strategies[0], self.strategies[1], self.get_score(), self.get_stderr(), self.get_games(),
+				self.llr, self.get_winner() or "undecided")
+
+	def add_pair(self, score, min_pairs = MIN_PAIRS):
+		"""Adds one pair's score and updates the test, returns the decision."""
+		self.pairs += 1
+		self.total += score
+		self.squares += score * score
+		variance = max(self.get_variance(), MIN_VARIANCE)
+		# Normal approximation: llr = sum over pairs of (mu1 - mu0) * (x - (mu0 + mu1) / 2) / variance.
+		self.llr = 2.0 * self.margin * (self.total - 0.5 * self.pairs) / variance
+		if self.pairs >= min_pairs:
+			if self.llr >= self.upper:
+				self.decision = COMPARE_FIRST
+			elif self.llr <= self.lower:
+				self.decision = COMPARE_SECOND
+		return self.decision
+
+	def get_games(self):
+		return 2 * self.pairs
+
+	def get_score(self):
+		if not self.pairs:
+			return 0.0
+		return self.total / self.pairs
+
+	def get_variance(self):
+		"""Returns the sample variance of the pair scores."""
+		if self.pairs < 2:
+			return 0.0
+		mean = self.total / self.pairs
+		return max(0.0, (self.squares - self.pairs * mean * mean) / (self.pairs - 1))
+
+	def get_stderr(self):
+		if not self.pairs:
+			return 0.0
+		return math.sqrt(self.get_variance() / self.pairs)
+
+	def get_winner(self):
+		"""Returns the name of the strategy found better, None while undecided."""
+		if self.decision is COMPARE_FIRST:
+			return self.strategies[0]
+		if self.decision is COMPARE_SECOND:
+			return self.strategies[1]
+		return None
+
+def seat_seeds(seed, num_seats = 2):
+	"""Returns the seat seeds both games of pair seed use."""
+	rng = Random(seed)
+	return [rng.getrandbits(63) for seat in range(0, num_seats)]
+
+def play_pair(strategy_classes, seed, common = True, pile_factories = None, max_turns = MAX_TURNS):
+	"""Plays a mirrored pair of games and returns the first strategy's pair score in [0, 1].
+
+	common -- True gives both games the same seat seeds, False plays two independently
+	          seeded games, for measuring what common random numbers save
+	"""
+	score = 0.0
+	for mirror in (0, 1):
+		seats = [0, 1] if not mirror else [1, 0]
+		if common:
+			seeds = seat_seeds(seed)
+		else:
+			seeds = seat_seeds((1 << 32) + 2 * seed + mirror)
+		game = GameStateMachine([Player(str(index)) for index in seats], CreateKingdom(pile_factories),
+								CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								[strategy_classes[index]() for index in seats], headless = True, seed = seed,
+								seat_seeds = seeds)
+		game.play_game(max_turns)
+		winners = [player.name for player in game.get_winners()]
+		if "0" in winners:
+			score += 1.0 / len(winners)
+	return score / 2
+
+def compare(strategy_classes, margin = MARGIN, alpha = ALPHA, beta = BETA, min_pairs = MIN_PAIRS,
+			max_pairs = MAX_PAIRS, base_seed = 0, common = True, pile_factories = None, max_turns = MAX_TURNS):
+	"""Plays pairs until the test decides or max_pairs is reached, returns the Comparison.
+
+	Pair i uses seed base_seed + i, so a comparison can be replayed.
+	"""
+	comparison = Comparison([cls.name for cls in strategy_classes], margin, alpha, beta)
+	for pair in range(0, max_pairs):
+		score = play_pair(strategy_classes, base_seed + pair, common, pile_factories, max_turns)
+		if comparison.add_pair(score, min_pairs) is not None:
+			break
+	return comparison
+
+if __name__ == "__main__":
+	# python dominion_compare.py [margin]
+	margin = float(sys.argv[1]) if len(sys.argv) > 1 else MARGIN
+	for common in (True, False):
+		print "Common random numbers" if common else "Independent games"
+		print "   " + str(compare([BigMoney, SmithyBigMoney], margin, common = common))
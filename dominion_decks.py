@@ -0,0 +1,420 @@
+#!/usr/bin/python
+from array import array
+from timeit import default_timer
+
+from dominion import Deck, DRAW_SIZE
+from dominion_events import EVENT_DRAW, EVENT_GAIN, EVENT_SHUFFLE
+from dominion_profile import PROFILE_SHUFFLE
+
+# Alternative Deck backends, pass one to GameStateMachine(..., deck_class = CountDeck).
+
+# Card ids, every card name gets a small integer the first time a deck sees it.
+card_ids = {}
+cards_by_id = []
+
+def get_card_id(card):
+	"""Returns the integer id for the given card, assigning a new one if necessary."""
+	card_id = card_ids.get(card.name)
+	if card_id is None:
+		card_id = len(cards_by_id)
+		card_ids[card.name] = card_id
+		cards_by_id.append(card)
+	return card_id
+
+def get_card(card_id):
+	"""Returns the Card for the given id."""
+	return cards_by_id[card_id]
+
+class CountDeck(Deck):
+	"""Deck that stores card ids with a count vector per zone.
+
+	The draw pile is an array of card ids with the top card at the end, the
+	discard is only a count vector since it is shuffled before it is drawn from.
+	Hand and in_play stay lists of Cards because TurnObject indexes the hand.
+
+	Members:
+	draw           -- card ids in draw order, the last id is the top card
+	counts         -- number of each card id in the whole deck
+	draw_counts    -- number of each card id in draw
+	discard_counts -- number of each card id in discard
+	hand_counts    -- number of each card id in hand
+	in_play_counts -- number of each card id in in_play
+	"""
+	def __str__(self):
+		return ("hand: {0} \ndiscard: {1}\ndraw: {2}\nin play: {3}".format(
+				str(self.hand), str(self.get_discard()), str(self.get_draw()), str(self.in_play)))
+
+	def _init_deck(self, starting_cards, hand_size):
+		"""Shuffles starting cards and puts hand_size into hand and the rest into draw."""
+		self._clear_hand()
+		self.in_play = []
+		self.draw = array("H")
+		self.counts = array("i")
+		self.draw_counts = array("i")
+		self.discard_counts = array("i")
+		self.hand_counts = array("i")
+		self.in_play_counts = array("i")
+		self._shared = False
+		self._reset_stats()
+		for card in starting_cards:
+			self._add_to_stats(card, 1)
+			card_id = self._get_id(card)
+			self.draw.append(card_id)
+			self.counts[card_id] += 1
+			self.draw_counts[card_id] += 1
+		if self.events.enabled:
+			self.events.emit(EVENT_SHUFFLE, num_cards = len(self.draw))
+		self.rng.shuffle(self.draw)
+		self.draw_cards(hand_size)
+
+	def _get_id(self, card):
+		"""Returns the id for card, growing the count vectors if it is a new card type."""
+		card_id = get_card_id(card)
+		missing = card_id + 1 - len(self.counts)
+		if missing > 0:
+			zeros = [0] * missing
+			for counts in (self.counts, self.draw_counts, self.discard_counts,
+						   self.hand_counts, self.in_play_counts):
+				counts.extend(zeros)
+		return card_id
+
+	def draw_cards(self, num_cards):
+		"""Puts num_cards into hand. Shuffles and moves discard into draw as necessary."""
+		if self._shared:
+			self._unshare()
+		draw = self.draw
+		if len(draw) < num_cards:
+			in_draw = len(draw)
+			self._draw_from_top(in_draw)
+			self.shuffle_cards()
+			self._draw_from_top(min(num_cards - in_draw, len(self.draw)))
+		else:
+			self._draw_from_top(num_cards)
+		if self.events.enabled:
+			self.events.emit(EVENT_DRAW, num_cards = num_cards, hand = self.hand)
+
+	def _draw_from_top(self, num_cards):
+		draw = self.draw
+		drawn = []
+		for i in range(0, num_cards):
+			card_id = draw.pop()
+			self.draw_counts[card_id] -= 1
+			self.hand_counts[card_id] += 1
+			drawn.append(cards_by_id[card_id])
+		self._add_to_hand(drawn)
+
+	def set_hand(self, cards):
+		"""Replaces the hand with cards, the cards in hand before leave the deck."""
+		if self._shared:
+			self._unshare()
+		for card in self.hand:
+			card_id = card_ids[card.name]
+			self.hand_counts[card_id] -= 1
+			self.counts[card_id] -= 1
+		for card in cards:
+			card_id = self._get_id(card)
+			self.hand_counts[card_id] += 1
+			self.counts[card_id] += 1
+		Deck.set_hand(self, cards)
+
+	def discard_cards(self, card_to_discard):
+		"""Moves card from hand into discard. Returns True if successful, otherwise False."""
+		card_id = card_ids.get(card_to_discard.name)
+		if card_id is None or card_id >= len(self.counts) or not self.hand_counts[card_id]:
+			return False
+		if self._shared:
+			self._unshare()
+		self._pop_from_hand(self._find_in_hand(card_to_discard))
+		self.hand_counts[card_id] -= 1
+		self.discard_counts[card_id] += 1
+		return True
+
+	def trash_card(self, card_to_trash):
+		"""Removes card from hand and from the deck. Returns True if successful, otherwise False."""
+		card_id = card_ids.get(card_to_trash.name)
+		if card_id is None or card_id >= len(self.counts) or not self.hand_counts[card_id]:
+			return False
+		if self._shared:
+			self._unshare()
+		self._add_to_stats(self._pop_from_hand(self._find_in_hand(card_to_trash)), -1)
+		self.hand_counts[card_id] -= 1
+		self.counts[card_id] -= 1
+		return True
+
+	def shuffle_cards(self, check_empty = True):
+		"""Moves discard into draw and shuffles the draw cards."""
+		if check_empty:
+			assert len(self.draw) == 0, "Trying to shuffle cards but draw is not empty."
+		profiler = self.profiler
+		if profiler is not None:
+			start = default_timer()
+		if self._shared:
+			self._unshare()
+		draw = self.draw
+		discard_counts = self.discard_counts
+		draw_counts = self.draw_counts
+		for card_id, count in enumerate(discard_counts):
+			if count:
+				draw.extend(array("H", [card_id]) * count)
+				draw_counts[card_id] += count
+				discard_counts[card_id] = 0
+		if self.events.enabled:
+			self.events.emit(EVENT_SHUFFLE, num_cards = len(draw))
+		self.rng.shuffle(draw)
+		if profiler is not None:
+			profiler.add(PROFILE_SHUFFLE, start)
+
+	def shuffle_draw(self):
+		"""Shuffles the draw pile in place, lookahead uses this to sample unknown draw orders."""
+		if self._shared:
+			self._unshare()
+		self.rng.shuffle(self.draw)
+
+	def gain_card(self, card, pile_name):
+		"""Adds the given card to the specified pile ("draw", "discard", "hand", "in_play")."""
+		if self.events.enabled:
+			self.events.emit(EVENT_GAIN, card = card, pile_name = pile_name)
+		if self._shared:
+			self._unshare()
+		card_id = self._get_id(card)
+		if pile_name not in ("draw", "discard", "hand", "in_play"):
+			return
+		self._add_to_stats(card, 1)
+		if pile_name == "draw":
+			self.draw.append(card_id) # Top of draw is the end of the array.
+			self.draw_counts[card_id] += 1
+		elif pile_name == "discard":
+			self.discard_counts[card_id] += 1
+		elif pile_name == "hand":
+			self._add_to_hand([card])
+			self.hand_counts[card_id] += 1
+		elif pile_name == "in_play":
+			self.in_play.append(card)
+			self.in_play_counts[card_id] += 1
+		self.counts[card_id] += 1
+
+	def play_card(self, card_index):
+		"""Moves the card at card_index from hand and into in_play. Returns the Card for conveinence."""
+		assert len(self.hand) > card_index, "Trying to play card not in hand index: %r" % card_index
+		if self._shared:
+			self._unshare()
+		played_card = self._pop_from_hand(card_index)
+		card_id = card_ids[played_card.name]
+		self.hand_counts[card_id] -= 1
+		self.in_play_counts[card_id] += 1
+		self.in_play.append(played_card)
+		return played_card
+
+	def play_kind(self, kind):
+		"""Moves every card of the given kind from hand into in_play in one pass, returns them in hand order."""
+		played = Deck.play_kind(self, kind)
+		hand_counts = self.hand_counts
+		in_play_counts = self.in_play_counts
+		for card in played:
+			card_id = card_ids[card.name]
+			hand_counts[card_id] -= 1
+			in_play_counts[card_id] += 1
+		return played
+
+	def end_turn(self):
+		"""Cleans up cards at the end of the turn.
+
+		Moves cards in hand and in_play into discard and draws a new hand."""
+		if self._shared:
+			self._unshare()
+		discard_counts = self.discard_counts
+		hand_counts = self.hand_counts
+		in_play_counts = self.in_play_counts
+		for card_id in range(0, len(discard_counts)):
+			discard_counts[card_id] += hand_counts[card_id] + in_play_counts[card_id]
+			hand_counts[card_id] = 0
+			in_play_counts[card_id] = 0
+		self.in_play = []
+		self._clear_hand()
+		self.draw_cards(DRAW_SIZE)
+
+	def _unshare(self):
+		"""Gives this deck its own copy of every zone and count vector."""
+		self.hand = list(self.hand)
+		self.in_play = list(self.in_play)
+		self.draw = self.draw[:]
+		self.counts = self.counts[:]
+		self.draw_counts = self.draw_counts[:]
+		self.discard_counts = self.discard_counts[:]
+		self.hand_counts = self.hand_counts[:]
+		self.in_play_counts = self.in_play_counts[:]
+		self._unshare_stats()
+		self._shared = False
+
+	def count_card(self, card_to_count):
+		"""Returns the count of the given card in a players deck."""
+		card_id = card_ids.get(card_to_count.name)
+		if card_id is None or card_id >= len(self.counts):
+			return 0
+		return self.counts[card_id]
+
+	def get_composition(self, zone_counts = None):
+		"""Returns a dict of card name to count for the whole deck or the given count vector."""
+		if zone_counts is None:
+			zone_counts = self.counts
+		composition = {}
+		for card_id, count in enumerate(zone_counts):
+			if count:
+				composition[cards_by_id[card_id].name] = count
+		return composition
+
+	def get_deck(self):
+		"""Returns all cards in a list."""
+		return self.hand + self.get_draw() + self.get_discard() + self.in_play
+
+	def get_draw(self):
+		"""Returns cards in draw, top card first."""
+		return [cards_by_id[card_id] for card_id in reversed(self.draw)]
+
+	def get_draw_counts(self):
+		"""Returns {Card: count} of the cards in draw."""
+		return dict((cards_by_id[card_id], count) for card_id, count in enumerate(self.draw_counts) if count)
+
+	def get_discard(self):
+		"""Returns cards in discard, grouped by card since the discard order isn't kept."""
+		return _expand_counts(self.discard_counts)
+
+def _expand_counts(counts):
+	cards = []
+	for card_id, count in enumerate(counts):
+		if count:
+			cards += [cards_by_id[card_id]] * count
+	return cards
+
+class LazyDeck(Deck):
+	"""Deck that only shuffles the cards it actually draws.
+
+	The draw pile keeps its top card at the end so drawing is a pop. After a
+	shuffle the whole draw pile is an unshuffled prefix, and each draw from it
+	swaps a uniformly random prefix card to the top first, one step of a
+	Fisher-Yates shuffle. Every draw order is as likely as with a full shuffle,
+	but the random numbers are used differently, so the same seed plays a
+	different game than with Deck. Replays must use the same deck_class.
+
+	Members:
+	draw       -- unshuffled cards first, then cards in known order, the top card last
+	unshuffled -- number of cards at the start of draw that haven't been shuffled yet
+	discard    -- the top card is last
+	"""
+	def _init_deck(self, starting_cards, hand_size):
+		"""Puts the starting cards into draw unshuffled and draws hand_size cards."""
+		self._clear_hand()
+		self.discard = []
+		self.draw = list(starting_cards)
+		self.unshuffled = len(self.draw)
+		self.in_play = []
+		self._shared = False
+		self._reset_stats()
+		for card in self.draw:
+			self._add_to_stats(card, 1)
+		if self.events.enabled:
+			self.events.emit(EVENT_SHUFFLE, num_cards = len(self.draw))
+		self.draw_cards(hand_size)
+
+	def draw_cards(self, num_cards):
+		"""Puts num_cards into hand. Shuffles and moves discard into draw as necessary."""
+		if self._shared:
+			self._unshare()
+		in_draw = len(self.draw)
+		if in_draw < num_cards:
+			self._draw_from_top(in_draw)
+			self.shuffle_cards()
+			self._draw_from_top(min(num_cards - in_draw, len(self.draw)))
+		else:
+			self._draw_from_top(num_cards)
+		if self.events.enabled:
+			self.events.emit(EVENT_DRAW, num_cards = num_cards, hand = self.hand)
+
+	def _draw_from_top(self, num_cards):
+		draw = self.draw
+		stop = len(draw) - num_cards
+		unshuffled = self.unshuffled
+		if unshuffled > stop:
+			# Shuffle just the positions being drawn, the same picks random.shuffle makes for them.
+			random = self.rng.random
+			for top in range(unshuffled - 1, stop - 1, -1):
+				swap = int(random() * (top + 1))
+				draw[swap], draw[top] = draw[top], draw[swap]
+			self.unshuffled = stop
+		drawn = draw[stop:]
+		del draw[stop:]
+		drawn.reverse() # Top card first, like Deck.
+		self._add_to_hand(drawn)
+
+	def discard_cards(self, card_to_discard):
+		"""Moves card from hand into discard. Returns True if successful, otherwise False."""
+		card_index = self._find_in_hand(card_to_discard)
+		if card_index is None:
+			return False
+		if self._shared:
+			self._unshare()
+		self.discard.append(self._pop_from_hand(card_index))
+		return True
+
+	def shuffle_cards(self, check_empty = True):
+		"""Moves discard into draw, the cards are shuffled as they are drawn."""
+		if check_empty:
+			assert len(self.draw) == 0, "Trying to shuffle cards but draw is not empty."
+		profiler = self.profiler
+		if profiler is not None:
+			start = default_timer()
+		if self._shared:
+			self._unshare()
+		self.draw = self.discard
+		self.discard = []
+		self.unshuffled = len(self.draw)
+		if self.events.enabled:
+			self.events.emit(EVENT_SHUFFLE, num_cards = len(self.draw))
+		if profiler is not None:
+			profiler.add(PROFILE_SHUFFLE, start)
+
+	def shuffle_draw(self):
+		"""Marks the whole draw pile unshuffled, lookahead uses this to sample unknown draw orders."""
+		self.unshuffled = len(self.draw)
+
+	def gain_card(self, card, pile_name):
+		"""Adds the given card to the specified pile ("draw", "discard", "hand", "in_play")."""
+		if pile_name is "draw" or pile_name is "discard":
+			if self.events.enabled:
+				self.events.emit(EVENT_GAIN, card = card, pile_name = pile_name)
+			if self._shared:
+				self._unshare()
+			self._add_to_stats(card, 1)
+			if pile_name is "draw":
+				self.draw.append(card) # On top, above the unshuffled cards.
+			else:
+				self.discard.append(card)
+		else:
+			Deck.gain_card(self, card, pile_name)
+
+	def _settle(self):
+		"""Shuffles the unshuffled cards for good, so the whole draw order is fixed."""
+		if self.unshuffled > 1:
+			if self._shared:
+				self._unshare()
+			unshuffled = self.draw[:self.unshuffled]
+			self.rng.shuffle(unshuffled)
+			self.draw[:self.unshuffled] = unshuffled
+		self.unshuffled = 0
+
+	def get_deck(self):
+		"""Returns all cards in a list."""
+		return self.hand + self.draw + self.discard + self.in_play
+
+	def get_draw(self):
+		"""Returns cards in draw, top card first.
+
+		Fixes the order of the unshuffled cards, which uses the rng, so anything
+		that only needs to know which cards are in draw should use get_draw_counts.
+		"""
+		self._settle()
+		return self.draw[::-1]
+
+	def get_discard(self):
+		"""Returns cards in discard, top card first."""
+		return self.discard[::-1]
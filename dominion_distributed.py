@@ -0,0 +1,292 @@
+#!/usr/bin/python
+import sys
+import json
+import time
+import socket
+import threading
+from collections import deque, OrderedDict
+from itertools import combinations
+from multiprocessing import Pool, cpu_count
+
+from dominion_cards import CreateMoneyPiles, CreatePointPiles, CreateCardPiles, CreateEndingPiles
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import MatchupStats, _play_chunk, MAX_TURNS, GAMES_PER_CHUNK
+
+# Spreads tournament jobs over worker processes on other hosts. The
+# coordinator holds the jobs, workers connect to it over TCP and ask for
+# jobs, play them on every core and send the results back with their next
+# request. Messages are JSON objects, one per line:
+#
+#	worker      {"type": "request", "count": 4, "results": [[job id, stats], ...]}
+#	coordinator {"type": "jobs", "jobs": [job, ...]}, {"type": "wait"} or {"type": "done"}
+#
+# A job is {"id", "strategies": [name, ...], "seeds": [first, end], "kingdom":
+# [pile factory name, ...] or null, "max_turns"}, names are looked up in
+# STRATEGY_CLASSES and PILE_FACTORIES on the worker, and stats are
+# MatchupStats fields. Jobs of a worker whose connection drops go back on the
+# queue. Once the queue is empty, workers asking for more steal copies of
+# jobs other workers still hold, so a slow or hung worker doesn't hold up the
+# sweep, and the first result back for a job is the one kept.
+
+# Config
+PORT = 9123
+MAX_COPIES = 2 # Workers a job is handed to at most at the same time.
+WAIT_TIME = 0.5 # Seconds a worker waits when the coordinator has nothing to hand out.
+JOBS_PER_PROCESS = 2 # Jobs a worker asks for per worker process.
+STRATEGY_CLASSES = {BigMoney.name: BigMoney, SmithyBigMoney.name: SmithyBigMoney}
+PILE_FACTORIES = dict((factory.__name__, factory) for factory in
+					  [CreateMoneyPiles, CreatePointPiles, CreateCardPiles, CreateEndingPiles])
+
+def send_message(connection, message):
+	connection.sendall(json.dumps(message) + "\n")
+
+def read_message(reader):
+	"""Returns the next message from a connection's makefile, None once the connection is closed."""
+	line = reader.readline()
+	if not line:
+		return None
+	return json.loads(line)
+
+def stats_to_dict(stats):
+	return {"games": stats.games, "wins": stats.wins, "ties": stats.ties, "points": stats.points,
+			"turns": stats.turns}
+
+def stats_from_dict(strategies, fields):
+	stats = MatchupStats(list(strategies))
+	stats.games = fields["games"]
+	stats.wins = list(fields["wins"])
+	stats.ties = fields["ties"]
+	stats.points = list(fields["points"])
+	stats.turns = fields["turns"]
+	return stats
+
+def sweep_jobs(matchups, num_games, base_seed = 0, chunk_size = GAMES_PER_CHUNK, kingdom = None,
+			   max_turns = MAX_TURNS):
+	"""Returns the jobs playing num_games of every matchup, a list of strategy name tuples.
+
+	Game i of a matchup uses seed base_seed + i, like dominion_tournament.run_matchup.
+	kingdom is a list of PILE_FACTORIES names, None for the default kingdom.
+	"""
+	for names in matchups:
+		for name in names:
+			assert name in STRATEGY_CLASSES, "Unknown strategy " + name
+	for name in kingdom or []:
+		assert name in PILE_FACTORIES, "Unknown pile factory " + name
+	jobs = []
+	for names in matchups:
+		for start in range(0, num_games, chunk_size):
+			jobs.append({"id": len(jobs), "strategies": list(names), "kingdom": kingdom, "max_turns": max_turns,
+						 "seeds": [base_seed + start, base_seed + min(start + chunk_size, num_games)]})
+	return jobs
+
+def play_job(job):
+	"""Worker process entry point, plays a job and returns (job id, stats dict)."""
+	strategy_classes = [STRATEGY_CLASSES[name] for name in job["strategies"]]
+	pile_factories = None
+	if job["kingdom"]:
+		pile_factories = [PILE_FACTORIES[name] for name in job["kingdom"]]
+	first, end = job["seeds"]
+	stats = _play_chunk((strategy_classes, range(first, end), pile_factories, job["max_turns"]))
+	return job["id"], stats_to_dict(stats)
+
+class Coordinator:
+	"""Hands jobs to workers and collects their results, see run.
+
+	Members:
+	results  -- job id to stats dict, the first result back for each job
+	requeued -- jobs put back on the queue after their worker's connection dropped
+	stolen   -- extra copies of jobs handed out while other workers held them
+	"""
+	def __init__(self, jobs, max_copies = MAX_COPIES):
+		self.jobs = jobs
+		self.jobs_by_id = dict((job["id"], job) for job in jobs)
+		self.max_copies = max_copies
+		self.pending = deque(job["id"] for job in jobs)
+		self.holders = OrderedDict() # Job id to the workers holding it, in the order jobs were first handed out.
+		self.held = {} # Worker to the ids of the jobs it holds.
+		self.results = {}
+		self.requeued = 0
+		self.stolen = 0
+		self.lock = threading.Lock()
+		self.finished = threading.Event()
+		self.next_worker = 0
+		self.server = None
+		if not jobs:
+			self.finished.set()
+
+	def listen(self, host = "", port = PORT):
+		"""Opens the server socket and starts accepting workers, returns the (host, port) bound."""
+		self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.server.bind((host, port))
+		self.server.listen(64)
+		thread = threading.Thread(target = self._accept)
+		thread.daemon = True
+		thread.start()
+		return self.server.getsockname()
+
+	def run(self, host = "", port = PORT, timeout = None):
+		"""Serves workers until every job has a result, returns get_stats().
+
+		Returns None if timeout seconds pass first.
+		"""
+		if self.server is None:
+			self.listen(host, port)
+		try:
+			self.finished.wait(timeout)
+		finally:
+			self.server.close()
+		if not self.finished.is_set():
+			return None
+		return self.get_stats()
+
+	def get_stats(self):
+		"""Returns {strategy name tuple: MatchupStats} merged over the finished jobs."""
+		matchups = {}
+		with self.lock:
+			for job in self.jobs:
+				fields = self.results.get(job["id"])
+				if fields is None:
+					continue
+				names = tuple(job["strategies"])
+				if names not in matchups:
+					matchups[names] = MatchupStats(list(names))
+				matchups[names].merge(stats_from_dict(names, fields))
+		return matchups
+
+	def handle_request(self, worker, message):
+		"""Takes a request message's results, returns the reply."""
+		with self.lock:
+			for job_id, fields in message.get("results", []):
+				if job_id not in self.results:
+					self.results[job_id] = fields
+					for holder in self.holders.pop(job_id, ()):
+						self.held[holder].discard(job_id)
+			if len(self.results) == len(self.jobs):
+				self.finished.set()
+				return {"type": "done"}
+			batch = self._take(worker, message.get("count", 1))
+		if batch:
+			return {"type": "jobs", "jobs": [self.jobs_by_id[job_id] for job_id in batch]}
+		return {"type": "wait"}
+
+	def drop_worker(self, worker):
+		"""Puts the jobs only this worker held back on the queue."""
+		with self.lock:
+			for job_id in self.held.pop(worker, ()):
+				holders = self.holders.get(job_id)
+				if holders is None:
+					continue
+				holders.discard(worker)
+				if not holders:
+					del self.holders[job_id]
+					self.pending.appendleft(job_id)
+					self.requeued += 1
+
+	def _take(self, worker, count):
+		"""Hands up to count jobs to worker, queued ones first, then copies of held ones."""
+		batch = []
+		while self.pending and len(batch) < count:
+			job_id = self.pending.popleft()
+			if job_id not in self.results:
+				batch.append(job_id)
+		if not batch:
+			# Jobs held by the fewest workers first, then the ones handed out first.
+			candidates = sorted([(len(holders), order, job_id) for order, (job_id, holders)
+								 in enumerate(self.holders.items())
+								 if worker not in holders and len(holders) < self.max_copies])
+			batch = [job_id for copies, order, job_id in candidates[:count]]
+			self.stolen += len(batch)
+		held = self.held.setdefault(worker, set())
+		for job_id in batch:
+			self.holders.setdefault(job_id, set()).add(worker)
+			held.add(job_id)
+		return batch
+
+	def _accept(self):
+		while not self.finished.is_set():
+			try:
+				connection, address = self.server.accept()
+			except socket.error:
+				return # Closed by run.
+			with self.lock:
+				worker = self.next_worker
+				self.next_worker += 1
+			thread = threading.Thread(target = self._serve, args = (worker, connection))
+			thread.daemon = True
+			thread.start()
+
+	def _serve(self, worker, connection):
+		reader = connection.makefile("rb")
+		try:
+			while True:
+				message = read_message(reader)
+				if message is None:
+					break
+				reply = self.handle_request(worker, message)
+				send_message(connection, reply)
+				if reply["type"] == "done":
+					break
+		except (socket.error, ValueError):
+			pass # A dead or misbehaving worker, its jobs go back on the queue below.
+		finally:
+			self.drop_worker(worker)
+			reader.close()
+			connection.close()
+
+def run_worker(host, port = PORT, processes = None, batch_size = None, wait_time = WAIT_TIME):
+	"""Plays jobs from the coordinator at host until it says done, returns the number of jobs played.
+
+	Arguments:
+	processes  -- worker processes, defaults to every core, 1 plays in this process
+	batch_size -- jobs asked for at a time, defaults to JOBS_PER_PROCESS per process
+	"""
+	processes = processes or cpu_count()
+	batch_size = batch_size or processes * JOBS_PER_PROCESS
+	pool = None
+	if processes != 1:
+		pool = Pool(processes)
+	connection = socket.create_connection((host, port))
+	reader = connection.makefile("rb")
+	played = 0
+	results = []
+	try:
+		while True:
+			send_message(connection, {"type": "request", "count": batch_size, "results": results})
+			results = []
+			reply = read_message(reader)
+			if reply is None or reply["type"] == "done":
+				break
+			if reply["type"] == "wait":
+				time.sleep(wait_time)
+				continue
+			if pool is None:
+				results = [play_job(job) for job in reply["jobs"]]
+			else:
+				results = pool.map(play_job, reply["jobs"])
+			played += len(results)
+	finally:
+		reader.close()
+		connection.close()
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+	return played
+
+if __name__ == "__main__":
+	# python dominion_distributed.py coordinator [port] [games per matchup]
+	# python dominion_distributed.py worker host [port] [processes]
+	if len(sys.argv) < 2 or sys.argv[1] not in ("coordinator", "worker"):
+		sys.exit("Usage: dominion_distributed.py coordinator [port] [games] | worker host [port] [processes]")
+	if sys.argv[1] == "coordinator":
+		port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+		num_games = int(sys.argv[3]) if len(sys.argv) > 3 else 10000
+		coordinator = Coordinator(sweep_jobs(list(combinations(sorted(STRATEGY_CLASSES), 2)), num_games))
+		for names, stats in sorted(coordinator.run(port = port).items()):
+			print " vs ".join(names)
+			print stats
+		print "{0} jobs requeued, {1} copies stolen".format(coordinator.requeued, coordinator.stolen)
+	else:
+		port = int(sys.argv[3]) if len(sys.argv) > 3 else PORT
+		processes = int(sys.argv[4]) if len(sys.argv) > 4 else None
+		print "Played {0} jobs".format(run_worker(sys.argv[2], port, processes))
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+import json
+
+# Game events, emitted through an EventBus instead of printing.
+# Fields sent with each event:
+EVENT_DRAW = "draw"             # num_cards, hand
+EVENT_PLAY = "play"             # card, played (False if there were no actions left)
+EVENT_BUY = "buy"               # card, None when nothing is bought
+EVENT_GAIN = "gain"             # card, pile_name
+EVENT_SHUFFLE = "shuffle"       # num_cards
+EVENT_PILE_EMPTY = "pile_empty" # card
+EVENT_TURN_START = "turn_start" # player, turn
+EVENT_TURN_END = "turn_end"     # player, turn
+
+class EventBus:
+	"""Sends events to the subscribed sinks.
+
+	Callers check enabled before emitting so that with no sinks (or only
+	NullSinks) nothing is formatted or even collected into a dict:
+
+		if self.events.enabled:
+			self.events.emit(EVENT_DRAW, num_cards = num_cards, hand = self.hand)
+	"""
+	def __init__(self, sinks = None):
+		self.sinks = []
+		self.enabled = False
+		for sink in sinks or []:
+			self.subscribe(sink)
+
+	def subscribe(self, sink):
+		"""Adds a sink, returns it for convenience."""
+		self.sinks.append(sink)
+		self._update_enabled()
+		return sink
+
+	def unsubscribe(self, sink):
+		"""Removes a sink."""
+		self.sinks.remove(sink)
+		self._update_enabled()
+
+	def _update_enabled(self):
+		self.enabled = any(sink.active for sink in self.sinks)
+
+	def emit(self, event, **fields):
+		"""Sends the event and its fields to every sink."""
+		for sink in self.sinks:
+			if sink.active:
+				sink.handle(event, fields)
+
+class NullSink:
+	"""Ignores every event, subscribing it leaves the bus disabled."""
+	active = False
+
+	def handle(self, event, fields):
+		pass
+
+class ConsoleSink:
+	"""Prints events the way the console game always has."""
+	active = True
+
+	def handle(self, event, fields):
+		if event == EVENT_DRAW:
+			print "hand after draw {0} card: {1}".format(fields["num_cards"], str(fields["hand"]))
+		elif event == EVENT_PLAY:
+			if fields["played"]:
+				print "   playing card: " + fields["card"].name
+			else:
+				print "   no more actions, can't play card {0}".format(fields["card"].name)
+		elif event == EVENT_BUY:
+			if fields["card"] is None:
+				print "   Not buying anything..."
+			else:
+				print "   Buying card: " + str(fields["card"])
+		elif event == EVENT_SHUFFLE:
+			print "   shuffling {0} cards".format(fields["num_cards"])
+		elif event == EVENT_PILE_EMPTY:
+			print "   pile is empty: " + fields["card"].name
+		elif event == EVENT_TURN_START:
+			print "---------------------------------------"
+			print "TURN STARTING FOR: " + str(fields["player"])
+		elif event == EVENT_TURN_END:
+			print "---------------------------------------"
+
+class JsonlSink:
+	"""Writes one JSON object per event to a file, cards and players are written by name."""
+	active = True
+
+	def __init__(self, file_name):
+		self.file = open(file_name, "a")
+
+	def handle(self, event, fields):
+		record = {"event": event}
+		record.update(fields)
+		self.file.write(json.dumps(record, default = repr) + "\n")
+
+	def close(self):
+		self.file.close()
+
+def ConsoleEvents():
+	"""Returns an EventBus printing to the console."""
+	return EventBus([ConsoleSink()])
@@ -0,0 +1,249 @@
+#!/usr/bin/python
+import sys
+from random import Random
+from multiprocessing import Pool, cpu_count
+
+from dominion import GameStateMachine, Player, Strategy, CARD_COIN, CARD_ACTION
+from dominion import effect_totals, EFFECT_ACTIONS, EFFECT_CARDS
+from dominion_cards import CreateStartingCards
+from dominion_bots import BigMoney, SmithyBigMoney, has_kind, first_affordable
+from dominion_tournament import CreateKingdom, MAX_TURNS, NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Evolves buy rules for a kingdom through self-play. A genome is a dict of
+# gene name to int, ParamStrategy plays it. Every generation each genome plays
+# the baseline bots and last generation's best genomes on the same seeds, and
+# the games are spread over a process pool.
+
+# Config
+POPULATION_SIZE = 16
+ELITE = 4 # Best genomes kept unchanged, and the self-play opponents of the next generation.
+GAMES_PER_OPPONENT = 40
+MUTATION_RATE = 0.2 # Chance of each gene changing in a child.
+BASELINE_CLASSES = [BigMoney, SmithyBigMoney]
+
+# Genes every kingdom has, (name, lowest, highest). Action cards add their own, see kingdom_genes.
+BASE_GENES = [
+	("golds before province", 0, 4),   # Buy Gold over Province until the deck has this many.
+	("duchie at provinces left", 0, 8), # Buy Duchie at $5-7 once this few Provinces are left.
+	("estate at provinces left", 0, 4), # Buy Estate at $2-4 once this few Provinces are left.
+]
+
+def kingdom_genes(pile_factories = None):
+	"""Returns the genes for a kingdom, BASE_GENES plus a limit and a ratio per action card."""
+	genes = list(BASE_GENES)
+	for pile in CreateKingdom(pile_factories):
+		card = pile.get_card()
+		if card.kind is CARD_ACTION:
+			genes.append(("max " + card.name, 0, 6))              # Copies to buy at most.
+			genes.append((card.name + " per cards", 0, 20))        # One copy per this many cards, 0 for no ratio.
+	return genes
+
+def play_order(hand):
+	"""Returns the index of the action card to play first, cards giving actions before draw cards."""
+	best_index = None
+	best_rank = None
+	for card_index, card in enumerate(hand):
+		if card.kind is CARD_ACTION:
+			totals = effect_totals(card.effect)
+			rank = (totals[EFFECT_ACTIONS], totals[EFFECT_CARDS])
+			if best_rank is None or rank > best_rank:
+				best_index = card_index
+				best_rank = rank
+	return best_index
+
+class ParamStrategy(Strategy):
+	"""Plays every action it can, then all money, and buys by the genome's rules.
+
+	Arguments:
+	params -- dict of gene name to value, missing genes count as 0
+	"""
+	name = "genetic"
+
+	def __init__(self, params):
+		self.params = params
+		self.action_limits = [(gene[len("max "):], value, params.get(gene[len("max "):] + " per cards", 0))
+							  for gene, value in sorted(params.items()) if gene.startswith("max ")]
+
+	def choose_play(self, hand, turn):
+		if turn.actions > 0:
+			card_index = play_order(hand)
+			if card_index is not None:
+				return card_index
+		if has_kind(hand, CARD_COIN):
+			return "all"
+		return "done"
+
+	def choose_buy(self, supply, turn):
+		params = self.params
+		money = turn.money
+		deck = turn.get_deck()
+		province_pile = supply.get_pile("province")
+		provinces_left = province_pile.get_quantity() if province_pile else 0
+		if money >= 8 and province_pile and not province_pile.is_empty():
+			gold_pile = supply.get_pile("gold")
+			if not gold_pile or deck.count_card(gold_pile.get_card()) >= params.get("golds before province", 0):
+				return province_pile.get_card()
+		if money >= 5 and provinces_left <= params.get("duchie at provinces left", 0):
+			card = first_affordable(supply, ["duchie"], money)
+			if card is not "none":
+				return card
+		if 2 <= money < 5 and provinces_left <= params.get("estate at provinces left", 0):
+			card = first_affordable(supply, ["estate"], money)
+			if card is not "none":
+				return card
+		if money >= 6:
+			card = first_affordable(supply, ["gold"], money)
+			if card is not "none":
+				return card
+		best = None
+		for card_name, limit, per_cards in self.action_limits:
+			pile = supply.get_pile(card_name)
+			if not pile or pile.is_empty() or pile.get_card().cost > money:
+				continue
+			count = deck.count_card(pile.get_card())
+			if count >= limit or (per_cards and count * per_cards >= deck.get_size()):
+				continue
+			if best is None or pile.get_card().cost > best.cost:
+				best = pile.get_card()
+		if best is not None:
+			return best
+		return first_affordable(supply, ["silver"], money)
+
+def _new_strategy(opponent):
+	if isinstance(opponent, dict):
+		return ParamStrategy(opponent)
+	return opponent()
+
+def play_match(params, opponent, seeds, pile_factories = None, max_turns = MAX_TURNS):
+	"""Returns the genome's score over the seeds, 1 per win and 0.5 per tie, seats alternating.
+
+	opponent is another genome or a Strategy class.
+	"""
+	score = 0.0
+	for seed in seeds:
+		strategies = [ParamStrategy(params), _new_strategy(opponent)]
+		seat = seed % 2
+		if seat:
+			strategies.reverse()
+		game = GameStateMachine([Player("0"), Player("1")], CreateKingdom(pile_factories),
+								CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								strategies, headless = True, seed = seed)
+		game.play_game(max_turns)
+		winners = [player.name for player in game.get_winners()]
+		if str(seat) in winners:
+			score += 1.0 / len(winners)
+	return score
+
+def _evaluate(job):
+	"""Worker entry point, returns a genome's average score against every opponent."""
+	params, opponents, seeds, pile_factories, max_turns = job
+	total = 0.0
+	for opponent in opponents:
+		total += play_match(params, opponent, seeds, pile_factories, max_turns)
+	return total / (len(opponents) * len(seeds))
+
+class GeneticOptimizer:
+	"""Evolves ParamStrategy genomes for a kingdom.
+
+	Arguments:
+	pile_factories    -- dominion_cards pile factories making up the kingdom
+	processes         -- worker processes for fitness evaluation, 1 evaluates in this process
+	games_per_opponent -- games each genome plays against each opponent per generation
+
+	Members:
+	genes      -- (name, lowest, highest) of every gene
+	population -- the current genomes
+	best       -- (fitness, genome) of the best genome of the last generation
+	"""
+	def __init__(self, pile_factories = None, population_size = POPULATION_SIZE, elite = ELITE,
+				 games_per_opponent = GAMES_PER_OPPONENT, mutation_rate = MUTATION_RATE, processes = None,
+				 seed = 0, baseline_classes = BASELINE_CLASSES, max_turns = MAX_TURNS):
+		self.pile_factories = pile_factories
+		self.elite = elite
+		self.games_per_opponent = games_per_opponent
+		self.mutation_rate = mutation_rate
+		self.processes = processes
+		self.baseline_classes = baseline_classes
+		self.max_turns = max_turns
+		self.rng = Random(seed)
+		self.genes = kingdom_genes(pile_factories)
+		self.population = [self.random_genome() for i in range(0, population_size)]
+		self.elites = []
+		self.best = None
+		self.generation = 0
+
+	def random_genome(self):
+		return dict((name, self.rng.randint(low, high)) for name, low, high in self.genes)
+
+	def mutate(self, genome):
+		child = dict(genome)
+		for name, low, high in self.genes:
+			if self.rng.random() < self.mutation_rate:
+				step = max(1, (high - low) // 4)
+				child[name] = min(high, max(low, child[name] + self.rng.randint(-step, step)))
+		return child
+
+	def crossover(self, mother, father):
+		return dict((name, (mother if self.rng.random() < 0.5 else father)[name]) for name, low, high in self.genes)
+
+	def select(self, ranked):
+		"""Tournament selection of two, ranked is [(fitness, genome)] best first."""
+		first = self.rng.randrange(len(ranked))
+		second = self.rng.randrange(len(ranked))
+		return ranked[min(first, second)][1]
+
+	def evaluate(self, pool = None):
+		"""Returns [(fitness, genome)] for the population, best first.
+
+		Every genome plays the same seeds, so fitness differences come from the
+		genomes and not from the draws.
+		"""
+		start = self.generation * self.games_per_opponent
+		seeds = range(start, start + self.games_per_opponent)
+		opponents = list(self.baseline_classes) + self.elites
+		jobs = [(genome, opponents, seeds, self.pile_factories, self.max_turns) for genome in self.population]
+		if pool is None:
+			scores = [_evaluate(job) for job in jobs]
+		else:
+			scores = pool.map(_evaluate, jobs)
+		ranked = sorted(zip(scores, self.population), key = lambda entry: -entry[0])
+		return ranked
+
+	def step(self, pool = None):
+		"""Evaluates one generation and breeds the next, returns (fitness, genome) of its best genome."""
+		ranked = self.evaluate(pool)
+		self.best = ranked[0]
+		self.elites = [genome for fitness, genome in ranked[:self.elite]]
+		children = list(self.elites)
+		while len(children) < len(self.population):
+			children.append(self.mutate(self.crossover(self.select(ranked), self.select(ranked))))
+		self.population = children
+		self.generation += 1
+		return self.best
+
+	def run(self, generations):
+		"""Runs the given number of generations, yields (generation, fitness, genome) after each one."""
+		pool = None
+		if self.processes != 1:
+			pool = Pool(self.processes or cpu_count())
+		try:
+			for i in range(0, generations):
+				fitness, genome = self.step(pool)
+				yield self.generation, fitness, genome
+		finally:
+			if pool is not None:
+				pool.terminate()
+				pool.join()
+
+if __name__ == "__main__":
+	generations = 10
+	if len(sys.argv) > 1:
+		generations = int(sys.argv[1])
+	optimizer = GeneticOptimizer()
+	for generation, fitness, genome in optimizer.run(generations):
+		print "Generation {0}: fitness {1:.3f} {2}".format(generation, fitness, genome)
+	fitness, genome = optimizer.best
+	print "Against the baseline bots:"
+	for opponent in BASELINE_CLASSES:
+		seeds = range(100000, 100400)
+		print "   {0}: {1:.3f}".format(opponent.name, play_match(genome, opponent, seeds) / len(seeds))
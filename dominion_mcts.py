@@ -0,0 +1,256 @@
+#!/usr/bin/python
+import math
+import time
+from random import Random
+from multiprocessing import Pool
+
+from dominion import Strategy, PHASE_ACTION, PHASE_BUY, CARD_ACTION, CARD_COIN
+from dominion_bots import SmithyBigMoney, has_kind
+
+# Config
+DECISION_BUDGET = 0.05 # Seconds per decision.
+EXPLORATION = 0.7 # UCB1 exploration constant, results are in [0, 1].
+TREE_DEPTH = 2 # Decisions, the root one included, searched by the tree before the default policy takes over.
+PLAYOUT_TURNS = 200 # Turn limit for a single playout, counting every player's turn.
+MARGIN_SCALE = 10.0 # Point margin that counts as a clear win in playout values.
+CONFIDENCE = 1.0 # Standard errors a move must beat the default policy's move by to be picked.
+WORKER_MARGIN = 0.8 # Share of the budget root parallel workers search for, the rest is overhead.
+
+# Moves are "all", "done", "none", ("play", card name) or ("buy", card name).
+
+class Node:
+	"""Search tree node, children are keyed by move."""
+	def __init__(self):
+		self.children = {}
+		self.visits = 0
+		self.value = 0.0
+
+	def select(self, moves, exploration):
+		"""Returns the move to try next among moves, unvisited moves first, otherwise UCB1."""
+		best_move = None
+		best_score = None
+		log_visits = math.log(self.visits or 1)
+		for move in moves:
+			child = self.children.get(move)
+			if child is None or not child.visits:
+				return move
+			score = child.value / child.visits + exploration * math.sqrt(log_visits / child.visits)
+			if best_score is None or score > best_score:
+				best_move = move
+				best_score = score
+		return best_move
+
+	def child(self, move):
+		node = self.children.get(move)
+		if node is None:
+			node = self.children[move] = Node()
+		return node
+
+def play_moves(hand, turn):
+	"""Returns the distinct moves for the action phase."""
+	moves = []
+	if turn.actions > 0:
+		for card in hand:
+			if card.kind is CARD_ACTION and ("play", card.name) not in moves:
+				moves.append(("play", card.name))
+	if has_kind(hand, CARD_COIN):
+		moves.append("all")
+	else:
+		moves.append("done")
+	return moves
+
+def buy_moves(supply, turn):
+	"""Returns every affordable card plus "none"."""
+	return [("buy", pile.get_card().name) for pile in supply.get_affordable_piles(turn.money)] + ["none"]
+
+def to_play(move, hand):
+	"""Turns a move into what Strategy.choose_play returns."""
+	if move == "all" or move == "done":
+		return move
+	for card_index, card in enumerate(hand):
+		if card.name == move[1]:
+			return card_index
+	return "done"
+
+def to_buy(move, supply):
+	"""Turns a move into what Strategy.choose_buy returns."""
+	if move == "none":
+		return "none"
+	return supply.get_pile(move[1]).get_card()
+
+class TreeStrategy(Strategy):
+	"""Plays the searching player inside a playout.
+
+	Makes the root move first, then walks the tree for the next buy decisions
+	and falls back to the default policy below TREE_DEPTH.
+	"""
+	def __init__(self, root, root_move, default, exploration, tree_depth):
+		self.root_move = root_move
+		self.default = default
+		self.exploration = exploration
+		self.tree_depth = tree_depth
+		self.path = [root, root.child(root_move)]
+
+	def choose_play(self, hand, turn):
+		if self.root_move is not None:
+			move = self.root_move
+			self.root_move = None
+			return to_play(move, hand)
+		return self.default.choose_play(hand, turn)
+
+	def choose_buy(self, supply, turn):
+		if self.root_move is not None:
+			move = self.root_move
+			self.root_move = None
+			return to_buy(move, supply)
+		if len(self.path) - 1 >= self.tree_depth: # The path starts at the root node.
+			return self.default.choose_buy(supply, turn)
+		node = self.path[-1]
+		move = node.select(buy_moves(supply, turn), self.exploration)
+		self.path.append(node.child(move))
+		return to_buy(move, supply)
+
+def search(game, phase, moves, deadline, seed, default_class = SmithyBigMoney,
+		   exploration = EXPLORATION, tree_depth = TREE_DEPTH, playout_turns = PLAYOUT_TURNS):
+	"""Runs UCT from a game paused at the current player's decision until the deadline.
+
+	Every iteration plays a clone of the game with freshly shuffled draw piles, so
+	the search never relies on the real (hidden) draw order. The other players
+	use the default policy. Returns {move: (visits, total value)} for the root.
+	"""
+	rng = Random(seed)
+	root = Node()
+	seat = game.curr_index
+	default = default_class()
+	while True:
+		playout = game.clone(seed = rng.getrandbits(32))
+		for turn in playout.turn_objects_list:
+			turn.get_deck().shuffle_draw()
+			turn.strategy = default
+		move = root.select(moves, exploration)
+		tree_strategy = TreeStrategy(root, move, default, exploration, tree_depth)
+		playout.curr_turn_object.strategy = tree_strategy
+		playout.handle_turn(phase)
+		playout.advance_turn()
+		playout.play_game(playout.turn_number + playout_turns)
+		value = playout_value(playout, seat)
+		for node in tree_strategy.path:
+			node.visits += 1
+			node.value += value
+		if time.time() >= deadline:
+			break
+	return dict((move, (child.visits, child.value)) for move, child in root.children.items())
+
+def playout_value(game, seat):
+	"""Returns a value in [0, 1] from the point margin to the best other player.
+
+	A plain win / loss is too noisy for the few playouts a short budget allows,
+	the margin also tells close games from blowouts.
+	"""
+	points = [turn.count_points() for turn in game.turn_objects_list]
+	margin = points[seat] - max(points[:seat] + points[seat + 1:])
+	return 0.5 + 0.5 * math.tanh(margin / MARGIN_SCALE)
+
+def _search_worker(job):
+	"""Root parallel worker, searches its own tree and returns the root statistics."""
+	game, phase, moves, budget, seed, settings = job
+	return search(game, phase, moves, time.time() + budget, seed, **settings)
+
+class MctsStrategy(Strategy):
+	"""Monte Carlo Tree Search player with a wall clock budget per decision.
+
+	Arguments:
+	budget        -- seconds per decision
+	processes     -- root parallel worker processes, 1 searches in this process
+	default_class -- Strategy class used for playouts and for the other players
+	"""
+	name = "mcts"
+
+	def __init__(self, budget = DECISION_BUDGET, processes = 1, default_class = SmithyBigMoney,
+				 exploration = EXPLORATION, tree_depth = TREE_DEPTH, playout_turns = PLAYOUT_TURNS,
+				 seed = None):
+		self.budget = budget
+		self.processes = processes
+		self.settings = {"default_class": default_class, "exploration": exploration,
+						 "tree_depth": tree_depth, "playout_turns": playout_turns}
+		self.default = default_class()
+		self.rng = Random(seed)
+		self.game = None
+		self.pool = None
+
+	def start_game(self, game, turn):
+		self.game = game
+
+	def choose_play(self, hand, turn):
+		moves = play_moves(hand, turn)
+		if len(moves) == 1:
+			return to_play(moves[0], hand)
+		card_to_play = self.default.choose_play(hand, turn)
+		if card_to_play == "all" or card_to_play == "done":
+			default_move = card_to_play
+		else:
+			default_move = ("play", hand[card_to_play].name)
+		return to_play(self.decide(PHASE_ACTION, moves, default_move), hand)
+
+	def choose_buy(self, supply, turn):
+		moves = buy_moves(supply, turn)
+		if len(moves) == 1:
+			return to_buy(moves[0], supply)
+		card_to_buy = self.default.choose_buy(supply, turn)
+		if card_to_buy is "none":
+			default_move = "none"
+		else:
+			default_move = ("buy", card_to_buy.name)
+		return to_buy(self.decide(PHASE_BUY, moves, default_move), supply)
+
+	def decide(self, phase, moves, default_move):
+		"""Searches for the budget and returns the best move.
+
+		The search has few playouts per move under a tight budget, so the default
+		policy's move is kept unless another move's average beats it by
+		CONFIDENCE standard errors.
+		"""
+		start = time.time()
+		if self.processes == 1:
+			stats = search(self.game, phase, moves, start + self.budget, self.rng.getrandbits(32), **self.settings)
+		else:
+			stats = self.search_parallel(phase, moves, start)
+		if default_move not in moves or not stats.get(default_move, (0, 0.0))[0]:
+			return max(moves, key = lambda move: stats.get(move, (0, 0.0)))
+		best_move = default_move
+		default_visits, default_value = stats[default_move]
+		best_score = 0.0
+		for move, (visits, value) in stats.items():
+			if not visits or move == default_move:
+				continue
+			stderr = 0.5 * math.sqrt(1.0 / visits + 1.0 / default_visits)
+			score = (value / visits - default_value / default_visits) / stderr
+			if score > CONFIDENCE and score > best_score:
+				best_move = move
+				best_score = score
+		return best_move
+
+	def search_parallel(self, phase, moves, start):
+		"""Searches one tree per worker and adds up their root statistics."""
+		if self.pool is None:
+			self.pool = Pool(self.processes)
+		game = self.game.clone()
+		default = self.settings["default_class"]()
+		for turn in game.turn_objects_list:
+			turn.strategy = default # Real strategies may not be picklable.
+		budget = max(0.0, start + self.budget * WORKER_MARGIN - time.time())
+		jobs = [(game, phase, moves, budget, self.rng.getrandbits(32), self.settings)
+				for i in range(0, self.processes)]
+		stats = {}
+		for worker_stats in self.pool.map(_search_worker, jobs):
+			for move, (visits, value) in worker_stats.items():
+				total_visits, total_value = stats.get(move, (0, 0.0))
+				stats[move] = (total_visits + visits, total_value + value)
+		return stats
+
+	def close(self):
+		"""Stops the worker processes."""
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool.join()
+			self.pool = None
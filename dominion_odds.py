@@ -0,0 +1,126 @@
+#!/usr/bin/python
+from dominion import DRAW_SIZE, CARD_COIN
+
+# Exact odds for the next hand, the same draws Deck.draw_cards would make:
+# hand_size cards from the draw pile, and if it runs out the rest from the
+# shuffled discard. Zones are reduced to {value: count} so decks with the same
+# value makeup share cache entries.
+
+MAX_CACHE_SIZE = 100000
+_cache = {}
+
+def money_value(card):
+	"""Money the card adds when played, the default value for the odds."""
+	if card.kind is CARD_COIN:
+		return card.value
+	return 0
+
+def kind_value(kind):
+	"""Returns a value function counting cards of the given kind (CARD_ACTION etc.)."""
+	def value(card):
+		if card.kind is kind:
+			return 1
+		return 0
+	return value
+
+def name_value(name):
+	"""Returns a value function counting cards with the given name."""
+	def value(card):
+		if card.name == name:
+			return 1
+		return 0
+	return value
+
+def zone_values(cards, value_of = money_value):
+	"""Returns {value: count} for the given cards."""
+	values = {}
+	for card in cards:
+		value = value_of(card)
+		values[value] = values.get(value, 0) + 1
+	return values
+
+def count_values(counts, value_of = money_value):
+	"""Returns {value: count} for {Card: count}, e.g. from Deck.get_draw_counts."""
+	values = {}
+	for card, count in counts.items():
+		value = value_of(card)
+		values[value] = values.get(value, 0) + count
+	return values
+
+def _choose(n, k):
+	if k < 0 or k > n:
+		return 0
+	result = 1
+	for i in range(0, min(k, n - k)):
+		result = result * (n - i) // (i + 1)
+	return result
+
+def _draw_ways(values, num_cards):
+	"""Returns {total: number of ways} for drawing num_cards from the {value: count} multiset."""
+	ways = {(0, 0): 1} # (cards drawn, total) -> ways
+	for value, count in values.items():
+		next_ways = {}
+		for (drawn, total), num_ways in ways.items():
+			for taken in range(0, min(count, num_cards - drawn) + 1):
+				key = (drawn + taken, total + taken * value)
+				next_ways[key] = next_ways.get(key, 0) + num_ways * _choose(count, taken)
+		ways = next_ways
+	totals = {}
+	for (drawn, total), num_ways in ways.items():
+		if drawn == num_cards:
+			totals[total] = totals.get(total, 0) + num_ways
+	return totals
+
+def _key(values):
+	return tuple(sorted([(value, count) for value, count in values.items() if count]))
+
+def hand_distribution(draw, discard, hand_size = DRAW_SIZE):
+	"""Returns {total: probability} of the summed value of the next hand.
+
+	Arguments:
+	draw      -- {value: count} of the draw pile, its order is unknown
+	discard   -- {value: count} of the discard, shuffled into the draw if the draw runs out
+	hand_size -- number of cards drawn
+	"""
+	key = (_key(draw), _key(discard), hand_size)
+	distribution = _cache.get(key)
+	if distribution is not None:
+		return distribution
+	in_draw = sum(draw.values())
+	if in_draw >= hand_size:
+		ways = _draw_ways(draw, hand_size)
+		shift = 0
+	else:
+		# Every draw card is drawn, the rest comes from the reshuffled discard.
+		shift = sum([value * count for value, count in draw.items()])
+		ways = _draw_ways(discard, min(hand_size - in_draw, sum(discard.values())))
+	total_ways = float(sum(ways.values()))
+	distribution = dict((total + shift, num_ways / total_ways) for total, num_ways in ways.items())
+	if len(_cache) >= MAX_CACHE_SIZE:
+		_cache.clear()
+	_cache[key] = distribution
+	return distribution
+
+def next_hand_distribution(deck, value_of = money_value, hand_size = DRAW_SIZE, cleanup = True):
+	"""Returns {total: probability} for the deck's next hand.
+
+	With cleanup (the default) the hand and in_play cards count as discarded,
+	which is where they are when end_turn draws the next hand. Any card bought
+	this turn is already in the discard.
+	"""
+	discard = deck.get_discard()
+	if cleanup:
+		discard = discard + deck.get_hand() + deck.get_in_play()
+	return hand_distribution(count_values(deck.get_draw_counts(), value_of), zone_values(discard, value_of),
+							 hand_size)
+
+def probability_at_least(distribution, amount):
+	"""Returns the probability that the total is at least amount."""
+	return sum([probability for total, probability in distribution.items() if total >= amount])
+
+def expected_value(distribution):
+	"""Returns the expected total."""
+	return sum([total * probability for total, probability in distribution.items()])
+
+def clear_cache():
+	_cache.clear()
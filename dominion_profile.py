@@ -0,0 +1,119 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+from timeit import default_timer
+
+# Per phase timers and counters for GameStateMachine. Off unless a Profiler is
+# set with GameStateMachine.set_profiler, the engine then times its own steps:
+#
+#	start = default_timer()
+#	self.action_phase(curr_turn, strategy)
+#	if profiler is not None:
+#		profiler.add(PROFILE_ACTION_PHASE, start)
+#
+# Spans nest, e.g. a card's effect is inside the action phase.
+PROFILE_TURN = "turn"
+PROFILE_ACTION_PHASE = "action phase"
+PROFILE_BUY_PHASE = "buy phase"
+PROFILE_CLEANUP = "cleanup"
+PROFILE_CHOOSE_PLAY = "choose play"
+PROFILE_CHOOSE_BUY = "choose buy"
+PROFILE_SHUFFLE = "shuffle"
+PROFILE_CARD_ACTION = "action " # Followed by the card name, e.g. "action smithy".
+
+MAX_TRACE_EVENTS = 1000000 # Spans kept for the Chrome trace, later spans are only counted.
+
+class ProfileStat:
+	"""Totals for one kind of span, times are in seconds."""
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+class Profiler:
+	"""Collects span timings and counters.
+
+	Members:
+	stats  -- span name to ProfileStat
+	counts -- counter name to count, for things worth counting but not timing
+	events -- (name, start, duration) of every span when tracing, for write_trace
+	"""
+	def __init__(self, trace = False, max_events = MAX_TRACE_EVENTS):
+		self.trace = trace
+		self.max_events = max_events
+		self.stats = {}
+		self.counts = {}
+		self.events = []
+
+	def add(self, name, start):
+		"""Records a span that started at start (a default_timer() value) and ends now."""
+		end = default_timer()
+		duration = end - start
+		stat = self.stats.get(name)
+		if stat is None:
+			stat = self.stats[name] = ProfileStat()
+		stat.count += 1
+		stat.total += duration
+		if duration > stat.max:
+			stat.max = duration
+		if self.trace and len(self.events) < self.max_events:
+			self.events.append((name, start, duration))
+
+	def count(self, name, amount = 1):
+		self.counts[name] = self.counts.get(name, 0) + amount
+
+	def merge(self, other):
+		"""Adds another Profiler's stats and counts into this one, trace events are not merged."""
+		for name, other_stat in other.stats.items():
+			stat = self.stats.get(name)
+			if stat is None:
+				stat = self.stats[name] = ProfileStat()
+			stat.count += other_stat.count
+			stat.total += other_stat.total
+			stat.max = max(stat.max, other_stat.max)
+		for name, amount in other.counts.items():
+			self.count(name, amount)
+
+	def summary(self):
+		"""Returns the stats as a table, the slowest spans first."""
+		turn_total = self.stats[PROFILE_TURN].total if PROFILE_TURN in self.stats else 0.0
+		lines = ["{0:<24} {1:>9} {2:>11} {3:>10} {4:>10} {5:>7}".format(
+				"span", "count", "total ms", "mean us", "max us", "% turn")]
+		for name, stat in sorted(self.stats.items(), key = lambda item: -item[1].total):
+			share = 100.0 * stat.total / turn_total if turn_total else 0.0
+			lines.append("{0:<24} {1:>9} {2:>11.2f} {3:>10.2f} {4:>10.2f} {5:>7.1f}".format(
+					name, stat.count, stat.total * 1e3, stat.total / stat.count * 1e6, stat.max * 1e6, share))
+		for name, amount in sorted(self.counts.items()):
+			lines.append("{0:<24} {1:>9}".format(name, amount))
+		return "\n".join(lines)
+
+	def trace_events(self):
+		"""Returns the spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+		pid = os.getpid()
+		events = [{"name": name, "cat": "dominion", "ph": "X", "pid": pid, "tid": 0,
+				   "ts": start * 1e6, "dur": duration * 1e6} for name, start, duration in self.events]
+		for name, amount in sorted(self.counts.items()):
+			events.append({"name": name, "cat": "dominion", "ph": "C", "pid": pid, "tid": 0,
+						   "ts": self.events[-1][1] * 1e6 if self.events else 0, "args": {name: amount}})
+		return events
+
+	def write_trace(self, file_name):
+		"""Writes a Chrome trace file, needs a Profiler made with trace = True."""
+		with open(file_name, "w") as trace_file:
+			json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, trace_file)
+
+if __name__ == "__main__":
+	# Profiles headless bot games: python dominion_profile.py [num games] [trace file]
+	from dominion_bots import BigMoney, SmithyBigMoney
+	from dominion_tournament import play_game
+	num_games = 100
+	if len(sys.argv) > 1:
+		num_games = int(sys.argv[1])
+	trace_file = sys.argv[2] if len(sys.argv) > 2 else None
+	profiler = Profiler(trace = trace_file is not None)
+	for seed in range(0, num_games):
+		play_game([BigMoney, SmithyBigMoney], seed, profiler = profiler)
+	print profiler.summary()
+	if trace_file:
+		profiler.write_trace(trace_file)
@@ -0,0 +1,219 @@
+#!/usr/bin/python
+import struct
+import zlib
+
+from dominion import GameStateMachine, Player, Pile, Strategy, Deck
+from dominion_cards import CreateCard
+from dominion_decks import CountDeck, LazyDeck
+
+# Replays store a game's setup, seed and every play / buy decision. Since all
+# shuffles come from the game's seeded Random, that is enough to rebuild the
+# exact GameStateMachine without storing any draws. The deck backend and the
+# seat seeds decide how the shuffles use the random numbers, so they are
+# stored too.
+#
+# Format: header struct REPLAY_HEADER (magic, version, seed, max turns or 0),
+# the deck backend's name length prefixed, the number of seat seeds (0 for a
+# game without) and the seeds as REPLAY_SEAT_SEED, then the players, supply
+# piles and starting cards as length prefixed names with counts, then the
+# zlib compressed decision bytes. Version 1 replays have no deck backend or
+# seat seeds, they were all played with Deck and the game's seed.
+REPLAY_MAGIC = "DOMR"
+REPLAY_VERSION = 2
+REPLAY_HEADER = "<4sBQI"
+REPLAY_SEAT_SEED = "<Q"
+DECK_CLASSES = dict((deck_class.__name__, deck_class) for deck_class in [Deck, CountDeck, LazyDeck])
+
+# Decision bytes, anything lower is a hand index (play) or supply pile index (buy).
+DECISION_ALL = 253
+DECISION_DONE = 254
+DECISION_NONE = 254
+MAX_DECISION_INDEX = 252
+
+class RecordingStrategy(Strategy):
+	"""Wraps a strategy and appends each of its decisions to a shared bytearray."""
+	def __init__(self, strategy, decisions, pile_indexes):
+		self.strategy = strategy
+		self.name = strategy.name
+		self.decisions = decisions
+		self.pile_indexes = pile_indexes
+
+	def choose_play(self, hand, turn):
+		card_to_play = self.strategy.choose_play(hand, turn)
+		if card_to_play == "all":
+			self.decisions.append(DECISION_ALL)
+		elif card_to_play == "done":
+			self.decisions.append(DECISION_DONE)
+		else:
+			assert int(card_to_play) <= MAX_DECISION_INDEX, "Hand index too large to record."
+			self.decisions.append(int(card_to_play))
+		return card_to_play
+
+	def choose_buy(self, supply, turn):
+		card_to_buy = self.strategy.choose_buy(supply, turn)
+		if card_to_buy is "none":
+			self.decisions.append(DECISION_NONE)
+		else:
+			self.decisions.append(self.pile_indexes[card_to_buy.name])
+		return card_to_buy
+
+	def start_game(self, game, turn):
+		self.strategy.start_game(game, turn)
+
+class ReplayStrategy(Strategy):
+	"""Plays back recorded decisions, every player in a replay shares one iterator."""
+	name = "replay"
+
+	def __init__(self, decisions):
+		self.decisions = decisions
+
+	def _next(self):
+		decision = next(self.decisions, None)
+		assert decision is not None, "Replay ran out of decisions."
+		return decision
+
+	def choose_play(self, hand, turn):
+		decision = self._next()
+		if decision == DECISION_ALL:
+			return "all"
+		if decision == DECISION_DONE:
+			return "done"
+		return decision
+
+	def choose_buy(self, supply, turn):
+		decision = self._next()
+		if decision == DECISION_NONE:
+			return "none"
+		return supply.supply_piles[decision].get_card()
+
+class GameRecord:
+	"""Everything needed to replay a game.
+
+	Members:
+	seed           -- the game's seed
+	max_turns      -- turn limit passed to play_game, None for no limit
+	players        -- player names in turn order
+	piles          -- (card name, count) for each supply pile at the start of the game
+	starting_cards -- (card name, count) of each player's starting cards
+	decisions      -- bytearray of every decision in the order they were made
+	deck_class     -- Deck backend the players used, one of DECK_CLASSES
+	seat_seeds     -- the game's seat seeds, None if it had none
+	"""
+	def __init__(self, seed, max_turns, players, piles, starting_cards, decisions = None, deck_class = Deck,
+				 seat_seeds = None):
+		assert deck_class.__name__ in DECK_CLASSES, "Can't record games played with %s." % deck_class.__name__
+		self.seed = seed
+		self.max_turns = max_turns
+		self.players = players
+		self.piles = piles
+		self.starting_cards = starting_cards
+		self.decisions = decisions if decisions is not None else bytearray()
+		self.deck_class = deck_class
+		self.seat_seeds = seat_seeds
+
+	def encode(self):
+		"""Returns the record as a compact binary string."""
+		parts = [struct.pack(REPLAY_HEADER, REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.max_turns or 0)]
+		deck_name = self.deck_class.__name__
+		parts.append(struct.pack("<B", len(deck_name)) + deck_name)
+		seat_seeds = self.seat_seeds or []
+		parts.append(struct.pack("<B", len(seat_seeds)))
+		parts += [struct.pack(REPLAY_SEAT_SEED, seat_seed) for seat_seed in seat_seeds]
+		parts.append(_pack_names([(name, 0) for name in self.players]))
+		parts.append(_pack_names(self.piles))
+		parts.append(_pack_names(self.starting_cards))
+		parts.append(zlib.compress(str(self.decisions)))
+		return "".join(parts)
+
+	def create_game(self, strategies, **kwargs):
+		"""Returns a new GameStateMachine set up like the recorded game.
+
+		It uses the recorded deck backend and seat seeds unless kwargs say otherwise.
+		"""
+		kwargs.setdefault("deck_class", self.deck_class)
+		kwargs.setdefault("seat_seeds", self.seat_seeds)
+		players = [Player(name) for name in self.players]
+		piles = [Pile(CreateCard(name), count) for name, count in self.piles]
+		starting_cards = []
+		for name, count in self.starting_cards:
+			starting_cards += [CreateCard(name) for i in range(0, count)]
+		return GameStateMachine(players, piles, starting_cards, strategies, seed = self.seed, **kwargs)
+
+def decode_replay(data):
+	"""Returns the GameRecord stored in data, see GameRecord.encode."""
+	magic, version, seed, max_turns = struct.unpack_from(REPLAY_HEADER, data)
+	assert magic == REPLAY_MAGIC, "Not a replay."
+	assert version in (1, REPLAY_VERSION), "Unknown replay version %r" % version
+	offset = struct.calcsize(REPLAY_HEADER)
+	deck_class = Deck
+	seat_seeds = None
+	if version >= 2:
+		length, = struct.unpack_from("<B", data, offset)
+		deck_name = data[offset + 1:offset + 1 + length]
+		assert deck_name in DECK_CLASSES, "Unknown deck backend %r" % deck_name
+		deck_class = DECK_CLASSES[deck_name]
+		offset += 1 + length
+		num_seeds, = struct.unpack_from("<B", data, offset)
+		offset += 1
+		if num_seeds:
+			seat_seeds = list(struct.unpack_from("<%dQ" % num_seeds, data, offset))
+			offset += num_seeds * struct.calcsize(REPLAY_SEAT_SEED)
+	players, offset = _unpack_names(data, offset)
+	piles, offset = _unpack_names(data, offset)
+	starting_cards, offset = _unpack_names(data, offset)
+	decisions = bytearray(zlib.decompress(data[offset:]))
+	return GameRecord(seed, max_turns or None, [name for name, count in players], piles,
+					  starting_cards, decisions, deck_class, seat_seeds)
+
+def _pack_names(names):
+	parts = [struct.pack("<B", len(names))]
+	for name, count in names:
+		parts.append(struct.pack("<BH", len(name), count) + name)
+	return "".join(parts)
+
+def _unpack_names(data, offset):
+	num_names, = struct.unpack_from("<B", data, offset)
+	offset += 1
+	names = []
+	for i in range(0, num_names):
+		length, count = struct.unpack_from("<BH", data, offset)
+		offset += 3
+		names.append((data[offset:offset + length], count))
+		offset += length
+	return names, offset
+
+def _count_names(cards):
+	counts = []
+	for card in cards:
+		if counts and counts[-1][0] == card.name:
+			counts[-1] = (card.name, counts[-1][1] + 1)
+		else:
+			counts.append((card.name, 1))
+	return counts
+
+def record_game(players, supply_piles, starting_cards, strategies, seed = None, max_turns = None, **kwargs):
+	"""Plays a game while recording it, returns (game, GameRecord).
+
+	Extra keyword arguments go to GameStateMachine, e.g. headless = True.
+	"""
+	pile_indexes = dict((pile.get_card().name, index) for index, pile in enumerate(supply_piles))
+	decisions = bytearray()
+	recorders = [RecordingStrategy(strategy, decisions, pile_indexes) for strategy in strategies]
+	game = GameStateMachine(players, supply_piles, starting_cards, recorders, seed = seed, **kwargs)
+	record = GameRecord(game.seed, max_turns, [player.name for player in players],
+						[(pile.get_card().name, pile.get_quantity()) for pile in supply_piles],
+						_count_names(starting_cards), decisions, game.turn_objects_list[0].get_deck().__class__,
+						game.seat_seeds)
+	game.play_game(max_turns)
+	return game, record
+
+def replay_game(record, **kwargs):
+	"""Replays a GameRecord (or its encoded string) headless and returns the finished GameStateMachine."""
+	if isinstance(record, str):
+		record = decode_replay(record)
+	decisions = iter(record.decisions)
+	strategy = ReplayStrategy(decisions)
+	kwargs.setdefault("headless", True)
+	game = record.create_game([strategy] * len(record.players), **kwargs)
+	game.play_game(record.max_turns)
+	return game
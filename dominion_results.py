@@ -0,0 +1,164 @@
+#!/usr/bin/python
+import sys
+import sqlite3
+from multiprocessing import Pool, cpu_count
+
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import create_game, _chunk_jobs, MAX_TURNS, GAMES_PER_CHUNK
+
+# Finished games in a SQLite file, one row per game and per seat so the
+# aggregate queries below run in SQL instead of over printed output:
+#
+#	games   -- id, seed, turns, num_players, num_winners, kingdom (sorted pile names joined by ",")
+#	seats   -- game_id, seat, player, strategy, points, won (1 for every winner, ties included)
+#	emptied -- game_id, card, one row per supply pile the game emptied
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, seed INTEGER, turns INTEGER,
+	num_players INTEGER, num_winners INTEGER, kingdom TEXT);
+CREATE TABLE IF NOT EXISTS seats (game_id INTEGER, seat INTEGER, player TEXT, strategy TEXT,
+	points INTEGER, won INTEGER);
+CREATE TABLE IF NOT EXISTS emptied (game_id INTEGER, card TEXT);
+CREATE INDEX IF NOT EXISTS seats_by_game ON seats (game_id);
+CREATE INDEX IF NOT EXISTS seats_by_strategy ON seats (strategy);
+CREATE INDEX IF NOT EXISTS games_by_kingdom ON games (kingdom);
+"""
+
+def game_rows(game):
+	"""Returns (game row, seat rows, emptied cards) for a finished GameStateMachine, without ids.
+
+	Plain tuples, so worker processes can send them back cheaply.
+	"""
+	winners = game.get_winners()
+	kingdom = ",".join(sorted([pile.get_card().name for pile in game.game_state.supply_piles]))
+	seats = [(seat, turn.player.name, turn.strategy.name, turn.count_points(), int(turn.player in winners))
+			 for seat, turn in enumerate(game.turn_objects_list)]
+	return ((game.seed, game.turn_number, len(seats), len(winners), kingdom), seats,
+			list(game.game_state.emptied))
+
+class ResultsStore:
+	"""Appends game results to a SQLite database and runs aggregate queries over them.
+
+	Arguments:
+	file_name -- database file, ":memory:" keeps everything in memory
+	"""
+	def __init__(self, file_name = ":memory:"):
+		self.file_name = file_name
+		self.connection = sqlite3.connect(file_name)
+		self.connection.text_factory = str
+		if file_name != ":memory:":
+			self.connection.execute("PRAGMA journal_mode = WAL")
+			self.connection.execute("PRAGMA synchronous = NORMAL")
+		self.connection.executescript(SCHEMA)
+
+	def close(self):
+		self.connection.close()
+
+	def add_games(self, rows):
+		"""Appends a batch of game_rows results in one transaction, returns the number added."""
+		games = []
+		seats = []
+		emptied = []
+		with self.connection:
+			next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM games").fetchone()[0]
+			for game_id, (game_row, seat_rows, emptied_cards) in enumerate(rows, next_id):
+				games.append((game_id,) + game_row)
+				seats += [(game_id,) + seat_row for seat_row in seat_rows]
+				emptied += [(game_id, card) for card in emptied_cards]
+			self.connection.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?, ?)", games)
+			self.connection.executemany("INSERT INTO seats VALUES (?, ?, ?, ?, ?, ?)", seats)
+			self.connection.executemany("INSERT INTO emptied VALUES (?, ?)", emptied)
+		return len(games)
+
+	def add_game(self, game):
+		"""Appends one finished GameStateMachine."""
+		return self.add_games([game_rows(game)])
+
+	def count_games(self):
+		return self.connection.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+	def win_rate_by_pair(self):
+		"""Returns {(strategy, opponent): (games, wins, win rate)} over two player games.
+
+		Only outright wins count, a mirror match counts each seat once.
+		"""
+		rows = self.connection.execute("""
+			SELECT s.strategy, o.strategy, COUNT(*), SUM(s.won AND g.num_winners = 1)
+			FROM seats s
+			JOIN seats o ON o.game_id = s.game_id AND o.seat != s.seat
+			JOIN games g ON g.id = s.game_id
+			WHERE g.num_players = 2
+			GROUP BY s.strategy, o.strategy""")
+		return dict(((strategy, opponent), (games, wins, float(wins) / games))
+					for strategy, opponent, games, wins in rows)
+
+	def win_rate_by_kingdom(self, strategy = None):
+		"""Returns {(kingdom, strategy): (games, wins, win rate)}, optionally for one strategy."""
+		query = """
+			SELECT g.kingdom, s.strategy, COUNT(*), SUM(s.won AND g.num_winners = 1)
+			FROM seats s JOIN games g ON g.id = s.game_id"""
+		arguments = ()
+		if strategy is not None:
+			query += " WHERE s.strategy = ?"
+			arguments = (strategy,)
+		query += " GROUP BY g.kingdom, s.strategy"
+		return dict(((kingdom, name), (games, wins, float(wins) / games))
+					for kingdom, name, games, wins in self.connection.execute(query, arguments))
+
+	def average_game_length(self, kingdom = None):
+		"""Returns the average turns per game (every player's turn), optionally for one kingdom."""
+		if kingdom is None:
+			row = self.connection.execute("SELECT AVG(turns) FROM games").fetchone()
+		else:
+			row = self.connection.execute("SELECT AVG(turns) FROM games WHERE kingdom = ?", (kingdom,)).fetchone()
+		return row[0] or 0.0
+
+	def average_points(self):
+		"""Returns {strategy: average final points}."""
+		return dict(self.connection.execute("SELECT strategy, AVG(points) FROM seats GROUP BY strategy"))
+
+	def emptied_piles(self):
+		"""Returns {card name: share of games that emptied its pile}."""
+		num_games = self.count_games()
+		if not num_games:
+			return {}
+		return dict((card, float(count) / num_games) for card, count in
+					self.connection.execute("SELECT card, COUNT(*) FROM emptied GROUP BY card"))
+
+def _play_rows(job):
+	"""Worker entry point, plays the games for a list of seeds and returns their game_rows."""
+	strategy_classes, seeds, pile_factories, max_turns = job
+	rows = []
+	for seed in seeds:
+		game = create_game(strategy_classes, seed, pile_factories)
+		game.play_game(max_turns)
+		rows.append(game_rows(game))
+	return rows
+
+def record_games(store, strategy_classes, num_games, processes = None, base_seed = 0,
+				 chunk_size = GAMES_PER_CHUNK, pile_factories = None, max_turns = MAX_TURNS):
+	"""Plays num_games like dominion_tournament.run_matchup and appends every game to store.
+
+	Each chunk of games is written as one batch as soon as a worker returns it.
+	"""
+	jobs = _chunk_jobs(strategy_classes, num_games, base_seed, chunk_size, pile_factories, max_turns)
+	if processes == 1:
+		for job in jobs:
+			store.add_games(_play_rows(job))
+		return
+	pool = Pool(processes or cpu_count())
+	try:
+		for rows in pool.imap_unordered(_play_rows, jobs):
+			store.add_games(rows)
+	finally:
+		pool.terminate()
+		pool.join()
+
+if __name__ == "__main__":
+	# python dominion_results.py results.db [num games]
+	store = ResultsStore(sys.argv[1] if len(sys.argv) > 1 else ":memory:")
+	num_games = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+	record_games(store, [BigMoney, SmithyBigMoney], num_games, base_seed = store.count_games())
+	for (strategy, opponent), (games, wins, rate) in sorted(store.win_rate_by_pair().items()):
+		print "{0} vs {1}: win rate {2:.3f} over {3} games".format(strategy, opponent, rate, games)
+	print "Average game length: {0:.1f} turns".format(store.average_game_length())
+	store.close()
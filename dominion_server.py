@@ -0,0 +1,271 @@
+#!/usr/bin/python
+import threading
+import time
+import uuid
+from collections import deque, OrderedDict
+
+from dominion import *
+from dominion_cards import CreateStartingCards
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import CreateKingdom, NUM_STARTING_COPPER, NUM_STARTING_ESTATES, MAX_TURNS
+
+# Hosts many games at once for the web front end, see website/flask_test.py.
+# People play through WebStrategy, which hands the decisions the web requests
+# bring in to the same choose_play / choose_buy hooks ConsoleStrategy answers
+# with raw_input. Bots play their whole turn as soon as it is their turn.
+
+# Config
+MAX_GAMES = 5000 # Games kept in memory, the least recently used game is evicted past this.
+MAX_PLAYERS = 6 # People and bots in one game, keeps a single request from building a huge game.
+IDLE_TIMEOUT = 30 * 60 # Seconds without a request before a game is evicted.
+MAX_DELTAS = 32 # State updates each game keeps for clients catching up.
+BOT_CLASSES = {BigMoney.name: BigMoney, SmithyBigMoney.name: SmithyBigMoney}
+
+ERROR_GAME_OVER = 200
+ERROR_NOT_YOUR_TURN = 201
+ERROR_WRONG_PHASE = 202
+ERROR_INVALID_CARD = 203
+ERROR_CANNOT_AFFORD = 204
+ERROR_PILE_EMPTY = 205
+ERROR_UNKNOWN_GAME = 206
+ERROR_BAD_REQUEST = 207
+ERROR_NO_PLAYERS = 208
+ERROR_TOO_MANY_PLAYERS = 209
+ERROR_MESSAGES = {
+	ERROR_GAME_OVER: "The game is over.",
+	ERROR_NOT_YOUR_TURN: "It is not a person's turn.",
+	ERROR_WRONG_PHASE: "Cards can't be played after buying.",
+	ERROR_INVALID_CARD: "No such card.",
+	ERROR_CANNOT_AFFORD: "Not enough money for that card.",
+	ERROR_PILE_EMPTY: "That pile is empty.",
+	ERROR_UNKNOWN_GAME: "No such game, it may have been evicted.",
+	ERROR_BAD_REQUEST: "Malformed request.",
+	ERROR_NO_PLAYERS: "A game needs at least one person or bot.",
+	ERROR_TOO_MANY_PLAYERS: "A game can have at most %d people and bots." % MAX_PLAYERS,
+}
+
+class WebStrategy(Strategy):
+	"""Answers choose_play / choose_buy with the decision of the current web request."""
+	name = "web"
+
+	def __init__(self):
+		self.decision = None
+
+	def choose_play(self, hand, turn):
+		return self.decision
+
+	def choose_buy(self, supply, turn):
+		return self.decision
+
+class WebGame:
+	"""One hosted game, every method must be called holding self.lock.
+
+	Members:
+	game_id     -- key in the GameRegistry
+	game        -- the GameStateMachine
+	phase       -- PHASE_ACTION or PHASE_BUY of the person whose turn it is
+	version     -- counts state updates, clients send back the last one they saw
+	last_access -- time.time() of the last request, for idle eviction
+	"""
+	def __init__(self, game_id, game, max_turns = MAX_TURNS, max_deltas = MAX_DELTAS):
+		self.game_id = game_id
+		self.game = game
+		self.max_turns = max_turns
+		self.lock = threading.Lock()
+		self.phase = PHASE_ACTION
+		self.version = 0
+		self.deltas = deque(maxlen = max_deltas) # (version, {key: value}) oldest first.
+		self.state = {}
+		self.last_access = time.time()
+		self._run_bots()
+		self.state = self.get_state()
+
+	def is_over(self):
+		game = self.game
+		return game.game_state.is_game_over() or game.turn_number >= self.max_turns
+
+	def _run_bots(self):
+		"""Plays bot turns until it is a person's turn or the game is over."""
+		game = self.game
+		while not self.is_over():
+			if isinstance(game.curr_turn_object.strategy, WebStrategy):
+				game.start_turn()
+				self.phase = PHASE_ACTION
+				return
+			game.handle_turn()
+			game.advance_turn()
+
+	def _end_turn(self):
+		self.game.finish_turn()
+		self.game.advance_turn()
+		self._run_bots()
+
+	def _check_turn(self):
+		if self.is_over():
+			return ERROR_GAME_OVER
+		if not isinstance(self.game.curr_turn_object.strategy, WebStrategy):
+			return ERROR_NOT_YOUR_TURN
+		return None
+
+	def play(self, decision):
+		"""Plays a hand index, "all" or "done". Returns None or an ERROR_* code."""
+		error = self._check_turn()
+		if error:
+			return error
+		if self.phase is not PHASE_ACTION:
+			return ERROR_WRONG_PHASE
+		curr_turn = self.game.curr_turn_object
+		if decision != "all" and decision != "done":
+			if not is_number(decision) or not 0 <= int(decision) < len(curr_turn.get_deck().get_hand()):
+				return ERROR_INVALID_CARD
+			decision = int(decision)
+		strategy = curr_turn.strategy
+		strategy.decision = decision
+		if not self.game.apply_play(curr_turn, strategy.choose_play(curr_turn.get_deck().get_hand(), curr_turn)):
+			self.phase = PHASE_BUY
+		self._update()
+		return None
+
+	def buy(self, card_name):
+		"""Buys the named card or "none" to end the turn. Returns None or an ERROR_* code.
+
+		Buying ends the action phase, the turn ends once the player is out of buys.
+		"""
+		error = self._check_turn()
+		if error:
+			return error
+		game = self.game
+		curr_turn = game.curr_turn_object
+		if card_name == "none":
+			card = "none"
+		else:
+			pile = game.game_state.get_pile(card_name)
+			if pile is None:
+				return ERROR_INVALID_CARD
+			if pile.is_empty():
+				return ERROR_PILE_EMPTY
+			card = pile.get_card()
+			if card.cost > curr_turn.money:
+				return ERROR_CANNOT_AFFORD
+		self.phase = PHASE_BUY
+		strategy = curr_turn.strategy
+		strategy.decision = card
+		if not game.apply_buy(curr_turn, strategy.choose_buy(game.game_state, curr_turn)) or not curr_turn.get_buys():
+			self._end_turn()
+		self._update()
+		return None
+
+	def get_state(self):
+		"""Returns the whole visible state as a flat dict, so updates can be sent key by key.
+
+		Only the hand of the person whose turn it is is shown.
+		"""
+		game = self.game
+		curr_turn = game.curr_turn_object
+		state = {"turn": game.turn_number, "player": curr_turn.player.name, "phase": self.phase,
+				 "game_over": self.is_over()}
+		for pile in game.game_state.supply_piles:
+			state["supply." + pile.get_card().name] = pile.get_quantity()
+		for turn in game.turn_objects_list:
+			state["points." + turn.player.name] = turn.count_points()
+		if isinstance(curr_turn.strategy, WebStrategy) and not state["game_over"]:
+			state["hand"] = [card.name for card in curr_turn.get_deck().get_hand()]
+			state["money"] = curr_turn.money
+			state["actions"] = curr_turn.actions
+			state["buys"] = curr_turn.buys
+		else:
+			state["hand"] = []
+			state["money"] = state["actions"] = state["buys"] = 0
+		if state["game_over"]:
+			state["winners"] = [player.name for player in game.get_winners()]
+		return state
+
+	def _update(self):
+		"""Records what changed since the last update as a new version."""
+		state = self.get_state()
+		old_state = self.state
+		delta = dict((key, value) for key, value in state.items() if old_state.get(key) != value)
+		self.state = state
+		if delta:
+			self.version += 1
+			self.deltas.append((self.version, delta))
+
+	def get_updates(self, since = None):
+		"""Returns (version, changes, full) for a client that last saw version since.
+
+		changes holds only the keys that changed after since, or the whole state
+		(full is True) if since is None or too old for the kept deltas.
+		"""
+		if since is None or since > self.version or (since < self.version and
+				(not self.deltas or self.deltas[0][0] > since + 1)):
+			return self.version, dict(self.state), True
+		changes = {}
+		for version, delta in self.deltas:
+			if version > since:
+				changes.update(delta)
+		return self.version, changes, False
+
+class GameRegistry:
+	"""Thread safe in memory store of WebGames.
+
+	The registry lock only guards the dict, each game has its own lock so
+	requests for different games never wait on each other.
+	"""
+	def __init__(self, max_games = MAX_GAMES, idle_timeout = IDLE_TIMEOUT, max_deltas = MAX_DELTAS):
+		self.max_games = max_games
+		self.idle_timeout = idle_timeout
+		self.max_deltas = max_deltas
+		self.lock = threading.Lock()
+		self.games = OrderedDict() # Least recently used first.
+
+	def __len__(self):
+		return len(self.games)
+
+	def create_game(self, people = 1, bots = (BigMoney.name,), seed = None, max_turns = MAX_TURNS):
+		"""Starts a game with the given number of people then the named bots, returns its WebGame."""
+		assert people >= 0 and 0 < people + len(bots) <= MAX_PLAYERS, "A game needs 1 to %d players." % MAX_PLAYERS
+		strategies = [WebStrategy() for i in range(0, people)] + [BOT_CLASSES[name]() for name in bots]
+		players = [Player(str(seat)) for seat in range(0, len(strategies))]
+		game = GameStateMachine(players, CreateKingdom(),
+								CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								strategies, headless = True, seed = seed)
+		web_game = WebGame(uuid.uuid4().hex, game, max_turns, self.max_deltas)
+		with self.lock:
+			self._evict(time.time())
+			while len(self.games) >= self.max_games:
+				self.games.popitem(last = False)
+			self.games[web_game.game_id] = web_game
+		return web_game
+
+	def get_game(self, game_id):
+		"""Returns the WebGame and marks it as used, or None if there is no such game.
+
+		Evicts idle games first, so a server that only gets reads still frees them.
+		"""
+		now = time.time()
+		with self.lock:
+			self._evict(now)
+			web_game = self.games.pop(game_id, None)
+			if web_game is not None:
+				web_game.last_access = now
+				self.games[game_id] = web_game
+		return web_game
+
+	def remove_game(self, game_id):
+		with self.lock:
+			return self.games.pop(game_id, None) is not None
+
+	def evict_idle(self, now = None):
+		"""Removes games idle for longer than idle_timeout, returns how many were removed."""
+		with self.lock:
+			return self._evict(now or time.time())
+
+	def _evict(self, now):
+		removed = 0
+		while self.games:
+			game_id, web_game = next(self.games.iteritems())
+			if now - web_game.last_access <= self.idle_timeout:
+				break
+			del self.games[game_id]
+			removed += 1
+		return removed
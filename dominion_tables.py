@@ -0,0 +1,240 @@
+#!/usr/bin/python
+import sys
+from array import array
+from timeit import default_timer
+
+from dominion import GameStateMachine, Player, Strategy, Supply, Pile, EventBus, CARD_ACTION
+from dominion_cards import CreateStartingCards, CreateCard
+from dominion_bots import BigMoney, SmithyBigMoney
+from dominion_tournament import CreateKingdom, MAX_TURNS, NUM_STARTING_COPPER, NUM_STARTING_ESTATES
+
+# Compiles a rule based bot's buy decisions into a flat table. The table is
+# indexed by (money, buys, turn bucket, Province pile count, deck size, count
+# of each tracked card), all clamped to the compiled range, and holds the
+# supply pile index to buy or DECISION_NONE. compile_strategy asks the real
+# strategy once per entry with a stand-in turn and supply matching it.
+#
+# Anything the entry doesn't capture, other empty piles, deck contents past
+# the tracked cards or values past the clamps, can make the table disagree
+# with the rules. Playing with verify = True (or verify_table) counts those
+# disagreements.
+
+# Config
+MAX_MONEY = 12
+MAX_BUYS = 2
+TURN_BUCKET = 5 # Turns per turn bucket.
+NUM_TURN_BUCKETS = 1 # The bots in dominion_bots ignore the turn.
+MIN_DECK_SIZE = 10
+MAX_DECK_SIZE = 60
+MAX_COUNT = 6 # Copies of a tracked card told apart.
+
+DECISION_NONE = -1
+
+class _TableDeck:
+	"""Stands in for a Deck with the given size and tracked card counts."""
+	def __init__(self, size, counts):
+		self.size = size
+		self.counts = counts
+
+	def count_card(self, card):
+		return self.counts.get(card.name, 0)
+
+	def get_size(self):
+		return self.size
+
+class _TableTurn:
+	"""Stands in for a TurnObject in the middle of its buy phase."""
+	def __init__(self, money, buys, turns, deck):
+		self.money = money
+		self.buys = buys
+		self.actions = 0
+		self.turns = turns
+		self.deck = deck
+
+	def get_buys(self):
+		return self.buys
+
+	def get_deck(self):
+		return self.deck
+
+class DecisionTable:
+	"""A compiled buy table, see compile_strategy.
+
+	Members:
+	strategy_class -- the Strategy class the table was compiled from
+	pile_names     -- supply pile names, decisions are indexes into this
+	tracked_cards  -- names of the cards whose counts are part of the index
+	dims           -- size of each index dimension, the last one varies fastest
+	decisions      -- array of pile indexes, DECISION_NONE to buy nothing
+	"""
+	def __init__(self, strategy_class, pile_names, tracked_cards, dims, decisions):
+		self.strategy_class = strategy_class
+		self.pile_names = pile_names
+		self.tracked_cards = tracked_cards
+		self.dims = dims
+		self.decisions = decisions
+
+	def __len__(self):
+		return len(self.decisions)
+
+def compile_strategy(strategy_class, pile_factories = None, tracked_cards = None, max_money = MAX_MONEY,
+					 max_buys = MAX_BUYS, num_turn_buckets = NUM_TURN_BUCKETS, max_deck_size = MAX_DECK_SIZE,
+					 max_count = MAX_COUNT):
+	"""Returns the DecisionTable for a Strategy class in the given kingdom.
+
+	Arguments:
+	tracked_cards -- card names whose counts the strategy looks at, defaults to every action card
+	"""
+	piles = CreateKingdom(pile_factories)
+	pile_names = [pile.get_card().name for pile in piles]
+	if tracked_cards is None:
+		tracked_cards = [pile.get_card().name for pile in piles if pile.get_card().kind is CARD_ACTION]
+	province_count = 0
+	for pile in piles:
+		if pile.get_card().name == "province":
+			province_count = pile.get_quantity()
+	dims = ([max_money + 1, max_buys, num_turn_buckets, province_count + 1, max_deck_size - MIN_DECK_SIZE + 1] +
+			[max_count + 1] * len(tracked_cards))
+	strategy = strategy_class()
+	decisions = array("b")
+	pile_indexes = dict((name, index) for index, name in enumerate(pile_names))
+	# Loops nest in dims order so entries come out in index order.
+	def fill(index_values):
+		if len(index_values) < len(dims):
+			for value in range(0, dims[len(index_values)]):
+				fill(index_values + [value])
+			return
+		money, buys, turn_bucket, provinces, size = index_values[:5]
+		counts = dict(zip(tracked_cards, index_values[5:]))
+		if sum(counts.values()) > size + MIN_DECK_SIZE:
+			decisions.append(DECISION_NONE) # Can't happen, more tracked cards than cards.
+			return
+		supply = supplies[provinces]
+		turn = _TableTurn(money, buys + 1, turn_bucket * TURN_BUCKET,
+						  _TableDeck(size + MIN_DECK_SIZE, counts))
+		card = strategy.choose_buy(supply, turn)
+		decisions.append(DECISION_NONE if card is "none" else pile_indexes[card.name])
+	supplies = []
+	for provinces in range(0, province_count + 1):
+		province_piles = []
+		for pile in piles:
+			quantity = provinces if pile.get_card().name == "province" else pile.get_quantity()
+			province_piles.append(Pile(pile.get_card(), quantity))
+		supplies.append(Supply(province_piles, events = EventBus()))
+	fill([])
+	return DecisionTable(strategy_class, pile_names, tracked_cards, dims, decisions)
+
+class TableStrategy(Strategy):
+	"""Buys with a DecisionTable and plays like the strategy it was compiled from.
+
+	Arguments:
+	table  -- the DecisionTable
+	verify -- also asks the original strategy for every buy, plays its decision
+	          and counts how often the table disagreed in self.mismatches
+	"""
+	def __init__(self, table, verify = False):
+		self.table = table
+		self.strategy = table.strategy_class()
+		self.name = self.strategy.name
+		self.verify = verify
+		self.decisions = 0
+		self.mismatches = 0
+		self.piles_by_name = None # Supply.piles_by_name the cached piles below were looked up in.
+		dims = table.dims
+		strides = [1] * len(dims)
+		for dim in range(len(dims) - 2, -1, -1):
+			strides[dim] = strides[dim + 1] * dims[dim + 1]
+		self.strides = strides
+		self.max_values = [size - 1 for size in dims]
+
+	def start_game(self, game, turn):
+		self.strategy.start_game(game, turn)
+
+	def choose_play(self, hand, turn):
+		return self.strategy.choose_play(hand, turn)
+
+	def choose_buy(self, supply, turn):
+		card = self.lookup(supply, turn)
+		if self.verify:
+			expected = self.strategy.choose_buy(supply, turn)
+			self.decisions += 1
+			if card is not expected:
+				self.mismatches += 1
+			return expected
+		return card
+
+	def lookup(self, supply, turn):
+		"""Returns the table's decision, the Card to buy or "none"."""
+		if supply.piles_by_name is not self.piles_by_name:
+			self._cache_supply(supply)
+		strides = self.strides
+		max_values = self.max_values
+		deck = turn.get_deck()
+		money = turn.money
+		if money > max_values[0]:
+			money = max_values[0]
+		buys = turn.buys - 1
+		if buys > max_values[1]:
+			buys = max_values[1]
+		turn_bucket = turn.turns // TURN_BUCKET
+		if turn_bucket > max_values[2]:
+			turn_bucket = max_values[2]
+		size = deck.get_size() - MIN_DECK_SIZE
+		if size > max_values[4]:
+			size = max_values[4]
+		elif size < 0:
+			size = 0
+		province_pile = self.province_pile
+		provinces = province_pile.get_quantity() if province_pile else 0
+		if provinces > max_values[3]:
+			provinces = max_values[3]
+		index = (money * strides[0] + buys * strides[1] + turn_bucket * strides[2] +
+				 provinces * strides[3] + size * strides[4])
+		for card, stride, max_value in self.tracked:
+			count = deck.count_card(card)
+			index += (count if count < max_value else max_value) * stride
+		decision = self.table.decisions[index]
+		if decision == DECISION_NONE:
+			return "none"
+		pile = self.piles[decision]
+		if not pile or pile.is_empty():
+			return self.strategy.choose_buy(supply, turn) # The table assumed the pile was there.
+		return pile.get_card()
+
+	def _cache_supply(self, supply):
+		# Keyed on piles_by_name, not the Supply: a cloned supply swaps in new piles
+		# (and a new piles_by_name) when it is first changed, see Supply._unshare.
+		self.piles_by_name = supply.piles_by_name
+		self.piles = [supply.get_pile(name) for name in self.table.pile_names]
+		self.province_pile = supply.get_pile("province") # None counts as no Provinces left.
+		self.tracked = [(CreateCard(name), self.strides[dim], self.max_values[dim])
+						for dim, name in enumerate(self.table.tracked_cards, 5)]
+
+def verify_table(table, num_games, opponent_class = BigMoney, pile_factories = None, max_turns = MAX_TURNS):
+	"""Plays num_games against opponent_class checking every buy, returns (decisions, mismatches)."""
+	decisions = 0
+	mismatches = 0
+	for seed in range(0, num_games):
+		strategy = TableStrategy(table, verify = True)
+		strategies = [strategy, opponent_class()]
+		if seed % 2:
+			strategies.reverse()
+		game = GameStateMachine([Player("0"), Player("1")], CreateKingdom(pile_factories),
+								CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+								strategies, headless = True, seed = seed)
+		game.play_game(max_turns)
+		decisions += strategy.decisions
+		mismatches += strategy.mismatches
+	return decisions, mismatches
+
+if __name__ == "__main__":
+	num_games = 200
+	if len(sys.argv) > 1:
+		num_games = int(sys.argv[1])
+	for strategy_class, tracked_cards in [(BigMoney, []), (SmithyBigMoney, ["smithy"])]:
+		start = default_timer()
+		table = compile_strategy(strategy_class, tracked_cards = tracked_cards)
+		elapsed = default_timer() - start
+		decisions, mismatches = verify_table(table, num_games)
+		print "{0}: {1} entries compiled in {2:.2f}s, {3} of {4} buys differ from the rules".format(
+				strategy_class.name, len(table), elapsed, mismatches, decisions)
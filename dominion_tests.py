@@ -91,4 +91,836 @@ assert (len(in_discard) == len(compare_discard)), "incorrect number of cards in
 
 
 
-print "DECK TESTS PASSED"
\ No newline at end of file
+print "DECK TESTS PASSED"
+
+# Headless game tests
+from dominion_bots import BigMoney, SmithyBigMoney
+def CreateTestPiles():
+	return CreateMoneyPiles() + CreatePointPiles() + CreateCardPiles() + CreateEndingPiles()
+starting_cards = CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES)
+bot_players = [Player("big money"), Player("smithy")]
+bot_game = GameStateMachine(bot_players, CreateTestPiles(), starting_cards,
+							[BigMoney(), SmithyBigMoney()], headless = True)
+# Every player gets their own copy of the starting cards.
+for turn in bot_game.turn_objects_list:
+	assert (len(turn.get_deck().get_deck()) == NUM_STARTING_COPPER + NUM_STARTING_ESTATES), "starting cards are shared"
+assert (len(starting_cards) == NUM_STARTING_COPPER + NUM_STARTING_ESTATES), "starting cards were modified"
+bot_game.play_game(200)
+assert bot_game.game_state.is_game_over(), "bot game did not finish"
+assert (len(bot_game.get_scores()) == 2), "missing scores"
+assert (len(bot_game.get_winners()) >= 1), "no winner"
+# Buys the player can't make gain nothing and spend nothing.
+buy_game = GameStateMachine([Player("0"), Player("1")], CreateMoneyPiles() + CreatePointPiles() + CreateEndingPiles(),
+							starting_cards, [BigMoney(), BigMoney()], headless = True)
+buy_turn = buy_game.curr_turn_object
+buy_turn.money = 5
+buy_game.game_state.get_pile("silver").remove_cards(NUM_MONEY_CARDS)
+for card in [Province(), Silver(), Smithy()]:
+	assert not buy_game.apply_buy(buy_turn, card), "bought " + card.name
+	assert (buy_turn.money == 5) and (buy_turn.get_buys() == 1), "rejected buy spent money or a buy"
+	assert (buy_turn.get_deck().count_card(card) == 0), "rejected buy gained " + card.name
+assert (buy_game.game_state.get_pile("province").get_quantity() == NUM_POINT_CARDS), "province left the supply"
+assert buy_game.apply_buy(buy_turn, Duchie()), "affordable buy failed"
+assert (buy_turn.money == 0) and (buy_turn.get_buys() == 0) and (buy_turn.get_deck().count_card(Duchie()) == 1), "buy not made"
+print "HEADLESS GAME TESTS PASSED"
+
+# Tournament tests
+from dominion_tournament import run_matchup, play_game
+for serial_stats in run_matchup([BigMoney, SmithyBigMoney], 20, processes = 1, chunk_size = 5):
+	pass
+assert (serial_stats.games == 20), "serial matchup did not play every game"
+for pool_stats in run_matchup([BigMoney, SmithyBigMoney], 20, processes = 2, chunk_size = 5):
+	pass
+assert (pool_stats.games == 20), "pool matchup did not play every game"
+assert (pool_stats.wins == serial_stats.wins and pool_stats.points == serial_stats.points), "seeded games differ between runs"
+assert (play_game([BigMoney, SmithyBigMoney], 7) == play_game([BigMoney, SmithyBigMoney], 7)), "same seed played differently"
+print "TOURNAMENT TESTS PASSED"
+
+# Count deck tests
+from dominion_decks import CountDeck, LazyDeck
+count_deck = CountDeck(CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES), EventBus())
+assert (len(count_deck.get_deck()) == NUM_STARTING_COPPER + NUM_STARTING_ESTATES), "count deck is not of size 10"
+assert (count_deck.count_card(estate_card) == NUM_STARTING_ESTATES), "count deck doesn't have 3 estates"
+assert (count_deck.count_card(province_card) == 0), "count deck has provinces"
+assert (len(count_deck.get_hand()) == DRAW_SIZE), "count deck hand was not drawn"
+count_deck.gain_card(province_card, "discard")
+count_deck.gain_card(Smithy(), "draw")
+assert (count_deck.get_draw()[0].name == "smithy"), "gained card not on top of draw"
+assert (count_deck.count_points() == NUM_STARTING_ESTATES + province_card.points), "count deck points wrong"
+count_deck.play_card(0)
+assert (len(count_deck.get_in_play()) == 1), "count deck card not in play"
+for i in range(0, 5):
+	count_deck.end_turn()
+	assert (len(count_deck.get_hand()) == DRAW_SIZE), "count deck hand not drawn after end turn"
+	assert (len(count_deck.get_deck()) == NUM_STARTING_COPPER + NUM_STARTING_ESTATES + 2), "count deck lost cards"
+assert (count_deck.discard_cards(count_deck.get_hand()[0])), "count deck discard failed"
+assert (len(count_deck.get_hand()) == DRAW_SIZE - 1), "count deck discard left card in hand"
+count_game = GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+							  [SmithyBigMoney(), SmithyBigMoney()], headless = True, deck_class = CountDeck)
+count_game.play_game(200)
+assert count_game.game_state.is_game_over(), "count deck game did not finish"
+print "COUNT DECK TESTS PASSED"
+
+# Supply tests
+test_supply = Supply([Pile(Copper(), 1), Pile(Silver(), 2), Pile(Province(), 1), Pile(Smithy(), 0)], events = EventBus())
+assert (test_supply.empty_piles == 1 and test_supply.emptied == ["smithy"]), "empty pile not counted"
+assert (test_supply.get_pile("silver").get_card().name == "silver"), "get pile failed"
+assert (test_supply.get_pile("gold") is None), "found a pile not in supply"
+assert ([pile.card.name for pile in test_supply.get_affordable_piles(3)] == ["silver", "copper"]), "affordable piles wrong"
+assert ([pile.card.name for pile in test_supply.get_affordable_piles(20)] == ["province", "silver", "copper"]), "affordable piles wrong"
+assert (test_supply.get_affordable_piles(-1) == []), "negative money can afford piles"
+assert (test_supply.remove_from_supply(Gold()) == ERROR_CARD_NOT_IN_SUPPLY), "removed card not in supply"
+assert (test_supply.remove_from_supply(Copper()) is False), "game over after one empty pile"
+assert (test_supply.get_affordable_piles(3)[-1].card.name == "silver"), "empty pile still affordable"
+assert (test_supply.remove_from_supply(Copper()) == ERROR_NUM_CARDS_TOO_FEW), "removed from empty pile"
+assert (test_supply.add_to_supply(Copper()) is True and test_supply.empty_piles == 1), "refilled pile still empty"
+assert (test_supply.remove_from_supply(Province()) is True), "empty province pile did not end game"
+assert (test_supply.emptied == ["smithy", "province"]), "emptied piles wrong"
+print "SUPPLY TESTS PASSED"
+
+# Batch engine tests
+from dominion_batch import run_batch, BATCH_BIG_MONEY, BATCH_SMITHY_BIG_MONEY
+batch_stats = run_batch([BATCH_BIG_MONEY, BATCH_SMITHY_BIG_MONEY], 1000, seed = 1)
+for object_stats in run_matchup([BigMoney, SmithyBigMoney], 1000, processes = 1):
+	pass
+assert (batch_stats.games == 1000), "batch engine did not play every game"
+for index in range(0, 2):
+	assert (abs(batch_stats.get_win_rate(index) - object_stats.get_win_rate(index)) < 0.06), "batch win rates differ"
+	assert (abs(batch_stats.get_average_points(index) - object_stats.get_average_points(index)) < 1.5), "batch points differ"
+assert (abs(batch_stats.get_average_turns() - object_stats.get_average_turns()) < 1.5), "batch game length differs"
+# The batch buy rules buy what the bots do, Gold and Smithy piles empty or not.
+from dominion_batch import BATCH_CARDS, CARD_IDS, NUM_CARD_TYPES
+for batch_strategy, bot in [(BATCH_BIG_MONEY, BigMoney()), (BATCH_SMITHY_BIG_MONEY, SmithyBigMoney())]:
+	for empty_piles in [[], ["gold"], ["gold", "smithy"], ["province", "gold"]]:
+		for num_smithies in [0, 1]:
+			parity_game = GameStateMachine([Player("0"), Player("1")], CreateTestPiles(), starting_cards,
+										   [bot, BigMoney()], headless = True)
+			parity_turn = parity_game.curr_turn_object
+			for i in range(0, num_smithies):
+				parity_turn.get_deck().gain_card(Smithy(), "discard")
+			for name in empty_piles:
+				parity_game.game_state.get_pile(name).remove_cards(parity_game.game_state.get_pile(name).get_quantity())
+			batch_supply = [0] * NUM_CARD_TYPES
+			for pile in parity_game.game_state.supply_piles:
+				batch_supply[CARD_IDS[pile.get_card().name]] = pile.get_quantity()
+			batch_owned = [parity_turn.get_deck().count_card(card) for card in BATCH_CARDS]
+			for money in range(0, 12):
+				parity_turn.money = money
+				card = bot.choose_buy(parity_game.game_state, parity_turn)
+				card_id = batch_strategy.choose_buy(money, batch_supply, batch_owned)
+				assert ((card is "none" and card_id is None) or
+						(card is not "none" and card_id == CARD_IDS[card.name])), "batch buy differs from %s at $%d" % (bot.name, money)
+print "BATCH ENGINE TESTS PASSED"
+
+# Event tests
+class ListSink:
+	active = True
+	def __init__(self):
+		self.events = []
+	def handle(self, event, fields):
+		self.events.append(event)
+null_bus = EventBus([NullSink()])
+assert not null_bus.enabled, "null sink enabled the event bus"
+list_sink = null_bus.subscribe(ListSink())
+assert null_bus.enabled, "subscribing a sink did not enable the event bus"
+event_game = GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+							  [BigMoney(), SmithyBigMoney()], events = null_bus)
+event_game.play_game(200)
+for event in [EVENT_DRAW, EVENT_PLAY, EVENT_BUY, EVENT_GAIN, EVENT_SHUFFLE,
+			  EVENT_PILE_EMPTY, EVENT_TURN_START, EVENT_TURN_END]:
+	assert (event in list_sink.events), "no %s event" % event
+assert (list_sink.events.count(EVENT_TURN_START) == event_game.turn_number), "wrong number of turn events"
+null_bus.unsubscribe(list_sink)
+assert not null_bus.enabled, "event bus still enabled after unsubscribe"
+print "EVENT TESTS PASSED"
+
+# Seed and replay tests
+from dominion_replay import record_game, replay_game, decode_replay
+def deck_state(game):
+	state = []
+	for turn in game.turn_objects_list:
+		deck = turn.get_deck()
+		state.append([[card.name for card in cards] for cards in
+					  [deck.get_hand(), deck.get_draw(), deck.get_discard(), deck.get_in_play()]])
+	return state
+seed_games = [GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+							   [BigMoney(), SmithyBigMoney()], headless = True, seed = 42) for i in range(0, 2)]
+for seed_game in seed_games:
+	seed_game.play_game(200)
+assert (deck_state(seed_games[0]) == deck_state(seed_games[1])), "same seed played differently"
+recorded_game, game_record = record_game([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+										 [SmithyBigMoney(), BigMoney()], max_turns = 200, headless = True)
+replay_data = game_record.encode()
+assert (decode_replay(replay_data).decisions == game_record.decisions), "decisions changed when decoded"
+replayed_game = replay_game(replay_data)
+assert (replayed_game.turn_number == recorded_game.turn_number), "replay has a different number of turns"
+assert (replayed_game.get_scores() == recorded_game.get_scores()), "replay has different scores"
+assert (deck_state(replayed_game) == deck_state(recorded_game)), "replay decks differ"
+assert ([pile.get_quantity() for pile in replayed_game.game_state.supply_piles] ==
+		[pile.get_quantity() for pile in recorded_game.game_state.supply_piles]), "replay supply differs"
+# The deck backend and seat seeds are part of the replay, they change how the shuffles come out.
+from dominion_decks import LazyDeck
+import struct
+from dominion_replay import REPLAY_HEADER
+lazy_game, lazy_record = record_game([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+									 [SmithyBigMoney(), BigMoney()], seed = 7, max_turns = 200, headless = True,
+									 deck_class = LazyDeck, seat_seeds = [11, (1 << 63) - 1])
+lazy_decoded = decode_replay(lazy_record.encode())
+assert (lazy_decoded.deck_class is LazyDeck) and (lazy_decoded.seat_seeds == [11, (1 << 63) - 1]), "setup not decoded"
+lazy_replayed = replay_game(lazy_record.encode())
+assert (lazy_replayed.get_scores() == lazy_game.get_scores()) and (deck_state(lazy_replayed) == deck_state(lazy_game)), \
+		"replay used the wrong shuffles"
+assert (decode_replay(replay_data).deck_class is Deck) and (decode_replay(replay_data).seat_seeds is None), "defaults not kept"
+header_size = struct.calcsize(REPLAY_HEADER)
+old_replay = (replay_data[:4] + "\x01" + replay_data[5:header_size] + replay_data[header_size + 2 + len("Deck"):])
+old_record = decode_replay(old_replay)
+assert (old_record.deck_class is Deck) and (old_record.decisions == game_record.decisions), "version 1 replay not read"
+assert (replay_game(old_replay).get_scores() == recorded_game.get_scores()), "version 1 replay played differently"
+print "REPLAY TESTS PASSED"
+
+# Clone tests
+for clone_deck_class in [None, CountDeck, LazyDeck]:
+	clone_source = GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+									[SmithyBigMoney(), BigMoney()], headless = True, seed = 7,
+									deck_class = clone_deck_class)
+	for i in range(0, 6):
+		clone_source.handle_turn()
+		clone_source.advance_turn()
+	before_clone = deck_state(clone_source)
+	supply_before_clone = [pile.get_quantity() for pile in clone_source.game_state.supply_piles]
+	game_clone = clone_source.clone()
+	assert (deck_state(game_clone) == before_clone), "clone has different decks"
+	assert (game_clone.curr_turn_object.player == clone_source.curr_turn_object.player), "clone has a different current player"
+	game_clone.play_game(200)
+	assert game_clone.game_state.is_game_over(), "clone did not finish"
+	assert (deck_state(clone_source) == before_clone), "playing the clone changed the original decks"
+	assert ([pile.get_quantity() for pile in clone_source.game_state.supply_piles] == supply_before_clone), "playing the clone changed the original supply"
+	clone_source.play_game(200)
+	assert (deck_state(clone_source) == deck_state(game_clone)), "clone and original played differently"
+print "CLONE TESTS PASSED"
+
+# MCTS tests
+import time
+from dominion_mcts import MctsStrategy
+for mcts_processes in [1, 2]:
+	mcts = MctsStrategy(budget = 0.01, processes = mcts_processes, seed = 3)
+	mcts_game = GameStateMachine([Player("mcts"), Player("big money")], CreateTestPiles(), starting_cards,
+								 [mcts, BigMoney()], headless = True, seed = 3)
+	for i in range(0, 4):
+		mcts_game.handle_turn()
+		mcts_game.advance_turn()
+	mcts_turn = mcts_game.curr_turn_object
+	mcts_turn.play_all_money()
+	decision_start = time.time()
+	mcts_buy = mcts.choose_buy(mcts_game.game_state, mcts_turn)
+	assert (time.time() - decision_start < 0.1), "mcts went over its decision budget"
+	assert (mcts_buy is "none" or mcts_buy.cost <= mcts_turn.money), "mcts bought a card it can't afford"
+	mcts.close()
+mcts_game = GameStateMachine([Player("mcts"), Player("big money")], CreateTestPiles(), starting_cards,
+							 [MctsStrategy(budget = 0.002, seed = 1), BigMoney()], headless = True, seed = 1)
+mcts_game.play_game(200)
+assert mcts_game.game_state.is_game_over(), "mcts game did not finish"
+print "MCTS TESTS PASSED"
+
+# Deck statistics tests
+for stats_deck_class in [None, CountDeck, LazyDeck]:
+	stats_game = GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+								  [SmithyBigMoney(), BigMoney()], headless = True, seed = 11,
+								  deck_class = stats_deck_class)
+	stats_game.play_game(200)
+	for turn in stats_game.turn_objects_list:
+		stats_deck = turn.get_deck()
+		all_cards = stats_deck.get_deck()
+		assert (stats_deck.get_size() == len(all_cards)), "running deck size is wrong"
+		assert (stats_deck.count_points() == sum([card.points for card in all_cards])), "running points are wrong"
+		assert (stats_deck.get_money() == sum([card.value for card in all_cards if card.kind is CARD_COIN])), "running money is wrong"
+		assert (stats_deck.count_kind(CARD_ACTION) == len([card for card in all_cards if card.kind is CARD_ACTION])), "running action count is wrong"
+		assert (stats_deck.count_card(copper_card) == len([card for card in all_cards if card.name == "copper"])), "running copper count is wrong"
+	trash_deck = turn.get_deck()
+	trash_size = trash_deck.get_size()
+	trash_target = trash_deck.get_hand()[0]
+	trash_count = trash_deck.count_card(trash_target)
+	assert trash_deck.trash_card(trash_target), "trash failed"
+	assert (trash_deck.get_size() == trash_size - 1 == len(trash_deck.get_deck())), "trash did not shrink the deck"
+	assert (trash_deck.count_card(trash_target) == trash_count - 1), "trash did not update card count"
+	assert not trash_deck.trash_card(Colony()), "trashed a card not in hand"
+print "DECK STATISTICS TESTS PASSED"
+
+# Next hand odds tests
+from itertools import combinations
+from dominion_odds import hand_distribution, next_hand_distribution, zone_values, probability_at_least
+from dominion_odds import money_value, kind_value
+def brute_force_distribution(draw_cards, discard_cards, value_of):
+	if len(draw_cards) >= DRAW_SIZE:
+		hands = list(combinations(draw_cards, DRAW_SIZE))
+	else:
+		hands = [tuple(draw_cards) + rest for rest in combinations(discard_cards, DRAW_SIZE - len(draw_cards))]
+	distribution = {}
+	for hand in hands:
+		total = sum([value_of(card) for card in hand])
+		distribution[total] = distribution.get(total, 0) + 1.0 / len(hands)
+	return distribution
+odds_draw = [Copper(), Copper(), Silver(), Gold(), Estate(), Smithy(), Copper()]
+odds_discard = [Gold(), Silver(), Estate(), Copper(), Province(), Village()]
+for odds_value in [money_value, kind_value(CARD_ACTION)]:
+	for draw_size in [7, 3, 0]:
+		expected = brute_force_distribution(odds_draw[:draw_size], odds_discard, odds_value)
+		actual = hand_distribution(zone_values(odds_draw[:draw_size], odds_value), zone_values(odds_discard, odds_value))
+		assert (sorted(expected.keys()) == sorted(actual.keys())), "odds have the wrong totals"
+		for total in expected:
+			assert (abs(expected[total] - actual[total]) < 1e-9), "odds are wrong"
+assert (hand_distribution({1: 7, 0: 3}, {}) is hand_distribution({0: 3, 1: 7}, {})), "odds were not cached"
+assert (abs(sum(next_hand_distribution(test_deck).values()) - 1.0) < 1e-9), "next hand odds don't add up to 1"
+assert (probability_at_least(next_hand_distribution(test_deck), 0) > 0.999999), "next hand can't make $0"
+print "ODDS TESTS PASSED"
+
+# Web server tests
+from dominion_server import GameRegistry, ERROR_NOT_YOUR_TURN, ERROR_WRONG_PHASE, ERROR_INVALID_CARD
+from dominion_server import ERROR_CANNOT_AFFORD, ERROR_GAME_OVER
+registry = GameRegistry(max_games = 3, idle_timeout = 60, max_deltas = 4)
+web_game = registry.create_game(1, ["big money"], seed = 5)
+assert (registry.get_game(web_game.game_id) is web_game), "game not registered"
+version, changes, full = web_game.get_updates()
+assert full and (changes["player"] == "0") and (len(changes["hand"]) == DRAW_SIZE), "bad starting state"
+assert (web_game.get_updates(version) == (version, {}, False)), "updates without changes"
+assert (web_game.play(str(DRAW_SIZE)) == ERROR_INVALID_CARD), "played a card not in hand"
+assert (web_game.buy("colony") == ERROR_INVALID_CARD), "bought a card not in the supply"
+assert (web_game.buy("province") == ERROR_CANNOT_AFFORD), "bought an unaffordable card"
+assert (web_game.play("all") is None), "play all failed"
+version, changes, full = web_game.get_updates(version)
+assert not full and ("money" in changes) and ("supply.copper" not in changes), "bad play delta"
+assert (web_game.buy("copper") is None), "buy failed"
+assert (web_game.game.curr_index == 0) and (web_game.game.turn_number == 2), "bot did not take its turn"
+version, changes, full = web_game.get_updates(version)
+assert (changes["supply.copper"] == web_game.game.game_state.get_pile("copper").get_quantity()), "supply delta missing"
+assert (web_game.play("all") is None) and (web_game.play("done") is None), "playing after the bot's turn failed"
+assert (web_game.play("all") == ERROR_WRONG_PHASE), "played after the action phase"
+assert (web_game.buy("none") is None) and (web_game.game.turn_number == 4), "buying nothing did not end the turn"
+while not web_game.is_over():
+	web_game.buy("none")
+assert (web_game.get_updates(0)[2]), "old version did not get the full state"
+assert (web_game.buy("none") == ERROR_GAME_OVER) and web_game.get_updates()[1]["game_over"], "game did not end"
+old_games = [registry.create_game(0, ["big money", "smithy big money"], max_turns = 40) for i in range(0, 3)]
+assert (len(registry) == 3) and (registry.get_game(web_game.game_id) is None), "least recently used game not evicted"
+assert old_games[0].get_updates()[1]["game_over"], "bot only game did not finish"
+assert (registry.evict_idle(time.time() + 61) == 3) and not len(registry), "idle games not evicted"
+from dominion_server import MAX_PLAYERS
+idle_game = registry.create_game(MAX_PLAYERS, [])
+busy_game = registry.create_game(1, [])
+idle_game.last_access -= 61
+assert (registry.get_game(busy_game.game_id) is busy_game) and (len(registry) == 1), "reading did not evict idle games"
+too_many_created = True
+try:
+	registry.create_game(MAX_PLAYERS, ["big money"])
+except AssertionError:
+	too_many_created = False
+assert not too_many_created, "game with too many players created"
+print "WEB SERVER TESTS PASSED"
+
+# Web route tests, need Flask
+try:
+	import flask
+except ImportError:
+	flask = None
+if flask is None:
+	print "WEB ROUTE TESTS SKIPPED, Flask is not installed"
+else:
+	import json
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "website"))
+	import flask_test
+	from dominion_server import ERROR_BAD_REQUEST, ERROR_NO_PLAYERS, ERROR_TOO_MANY_PLAYERS, ERROR_UNKNOWN_GAME
+	client = flask_test.app.test_client()
+	def post_json(url, body):
+		response = client.post(url, data = json.dumps(body), content_type = "application/json")
+		return response.status_code, json.loads(response.data)
+	def get_json(url):
+		response = client.get(url)
+		return response.status_code, json.loads(response.data)
+	status, body = post_json("/games", {"people": 1, "bots": ["big money"], "seed": 5})
+	assert (status == 200) and body["full"] and (body["changes"]["player"] == "0"), "game not created"
+	game_url = "/games/" + body["game_id"]
+	for bad_game in [{"people": "two"}, {"people": -1}, {"people": [1]}, {"bots": "big money"}, {"bots": [1]},
+					 {"bots": ["no such bot"]}, {"seed": "abc"}]:
+		status, body = post_json("/games", bad_game)
+		assert (status == 400) and (body["error"] == ERROR_BAD_REQUEST), "bad game options accepted: %r" % bad_game
+	status, body = post_json("/games", {"people": 0, "bots": []})
+	assert (status == 400) and (body["error"] == ERROR_NO_PLAYERS), "game without seats created"
+	for big_game in [{"people": 10000000}, {"people": MAX_PLAYERS}, {"people": 0, "bots": ["big money"] * (MAX_PLAYERS + 1)}]:
+		status, body = post_json("/games", big_game)
+		assert (status == 400) and (body["error"] == ERROR_TOO_MANY_PLAYERS), "game with too many seats created"
+	assert (post_json("/games", {"people": MAX_PLAYERS, "bots": []})[0] == 200), "full game not created"
+	status, body = post_json("/games", [1, 2])
+	assert (status == 400) and (body["error"] == ERROR_BAD_REQUEST), "non object body accepted"
+	for bad_since in ["abc", "-1", "1.5"]:
+		status, body = get_json(game_url + "?since=" + bad_since)
+		assert (status == 400) and (body["error"] == ERROR_BAD_REQUEST), "bad since accepted: " + bad_since
+	status, body = get_json(game_url + "?since=0")
+	assert (status == 200) and (body["version"] == 0) and not body["full"], "since not read"
+	assert (get_json("/games/nosuchgame")[0] == 404), "unknown game found"
+	status, body = post_json(game_url + "/buy", {"card": u"\u00e9p\u00e9e"})
+	assert (status == 400) and (body["error"] == ERROR_INVALID_CARD), "non ASCII card accepted"
+	status, body = post_json(game_url + "/play", {})
+	assert (status == 400) and (body["error"] == ERROR_BAD_REQUEST), "missing card accepted"
+	status, body = post_json(game_url + "/play", {"card": {"index": 0}})
+	assert (status == 400) and (body["error"] == ERROR_BAD_REQUEST), "non string card accepted"
+	status, body = post_json(game_url + "/play", {"card": "all", "since": "x"})
+	assert (status == 400) and (get_json(game_url)[1]["changes"]["money"] == 0), "bad since played the card"
+	status, body = post_json(game_url + "/play", {"card": "all", "since": 0})
+	assert (status == 200) and not body["full"] and ("money" in body["changes"]), "play failed"
+	status, body = post_json(game_url + "/buy", {"card": "copper"})
+	assert (status == 200) and (body["changes"]["turn"] == 2), "buy failed"
+	assert (client.delete(game_url).status_code == 200) and (get_json(game_url)[0] == 404), "game not deleted"
+	print "WEB ROUTE TESTS PASSED"
+
+# Benchmark tests
+from dominion_bench import run_benchmarks, compare_runs
+bench_results = run_benchmarks(loops = 200, num_games = 2, repeat = 1, memory_games = 2)
+assert (len(set([result.name for result in bench_results])) == 12), "missing benchmarks"
+assert not [result for result in bench_results if result.value < 0], "negative benchmark"
+old_bench = {"a": {"value": 100.0, "higher_is_better": True}, "b": {"value": 10.0, "higher_is_better": False}}
+new_bench = {"a": {"value": 85.0, "higher_is_better": True}, "b": {"value": 9.0, "higher_is_better": False},
+			 "c": {"value": 1.0, "higher_is_better": True}}
+bench_comparison = compare_runs(old_bench, new_bench, 0.1)
+assert ([entry[0] for entry in bench_comparison] == ["a", "b"]), "compared benchmarks missing from the old run"
+assert bench_comparison[0][4] and not bench_comparison[1][4], "wrong regressions"
+assert (abs(bench_comparison[1][3] - 0.1) < 1e-9), "lower is better change has the wrong sign"
+print "BENCHMARK TESTS PASSED"
+
+# Profiler tests
+from dominion_profile import Profiler, PROFILE_TURN, PROFILE_ACTION_PHASE, PROFILE_CLEANUP, PROFILE_SHUFFLE
+from dominion_bots import SmithyBigMoney
+profiler = Profiler(trace = True)
+profiled_game = GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+								 [SmithyBigMoney(), SmithyBigMoney()], headless = True, seed = 3)
+profiled_game.play_game(10)
+assert not profiler.stats, "profiled before the profiler was set"
+profiled_game.set_profiler(profiler)
+profiled_game.play_game(30)
+assert (profiler.stats[PROFILE_TURN].count == 20), "wrong number of profiled turns"
+assert (profiler.stats[PROFILE_CLEANUP].count == profiler.stats[PROFILE_ACTION_PHASE].count == 20), "phases not profiled"
+assert profiler.stats[PROFILE_SHUFFLE].count, "shuffles not profiled"
+assert ("action smithy" in profiler.stats), "card actions not profiled"
+assert (profiler.stats[PROFILE_TURN].total >= profiler.stats[PROFILE_ACTION_PHASE].total), "phase longer than the turn"
+profiled_clone = profiled_game.clone()
+assert (profiled_clone.profiler is None) and (profiled_clone.curr_turn_object.get_deck().profiler is None), "clone was profiled"
+assert (len([event for event in profiler.trace_events() if event["ph"] == "X"]) == len(profiler.events)), "trace events missing"
+assert (len(profiler.summary().splitlines()) == 1 + len(profiler.stats) + len(profiler.counts)), "summary rows missing"
+profiled_game.set_profiler(None)
+profiled_game.play_game(50)
+assert (profiler.stats[PROFILE_TURN].count == 20), "profiled after the profiler was removed"
+print "PROFILER TESTS PASSED"
+
+# Card registry tests
+import pickle
+from dominion_cards import LoadCards, RegisterCard, CARD_FILE
+assert (Copper() is Copper()) and (CreateCard("smithy") is Smithy()), "cards are not shared"
+assert (len(set([id(card) for card in CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES)])) == 2), "starting cards not shared"
+assert (Copper() != Silver()) and (Copper() != "none") and not (Copper() == "copper"), "card equality is not identity"
+assert (Card("copper", 0, CARD_COIN, 1, 0) != Copper()), "unregistered card equal to registered card"
+try:
+	Copper().value = 100
+	assert False, "changed a shared card"
+except AttributeError:
+	pass
+assert (pickle.loads(pickle.dumps(Province(), 2)) is Province()), "unpickled card is a copy"
+assert (copy.deepcopy([Gold(), Gold()])[1] is Gold()), "deep copied card is a copy"
+assert (CoinCard("copper", 0, 1) is Copper()), "re-registering made a new card"
+try:
+	CoinCard("copper", 1, 1)
+	assert False, "registered a card twice differently"
+except AssertionError, error:
+	assert ("registered twice" in str(error)), "registered a card twice differently"
+assert ([card.name for card in LoadCards(CARD_FILE)][:3] == ["copper", "silver", "gold"]), "definition file not in order"
+assert (Village().kind is CARD_ACTION) and (Village().effect == (EFFECT_CARDS, 1, EFFECT_ACTIONS, 2)), "loaded card kind or effect is wrong"
+assert (Province().end_game and not Duchie().end_game), "end game flags not loaded"
+print "CARD REGISTRY TESTS PASSED"
+
+# Card effect tests
+effect_card = ActionCard("test market", 5, [("cards", 1), ("actions", 1), ("buys", 1), ("money", 2),
+											("gain", "silver"), ("trash", "estate")])
+assert (effect_card.effect == (EFFECT_CARDS, 1, EFFECT_ACTIONS, 1, EFFECT_BUYS, 1, EFFECT_MONEY, 2,
+							   EFFECT_GAIN, Silver().card_id, EFFECT_TRASH, Estate().card_id)), "effect compiled wrong"
+assert (describe_effect(Smithy().effect) == "+3 cards"), "effect described wrong"
+assert (effect_totals(Village().effect)[EFFECT_ACTIONS] == 2), "effect totals wrong"
+effect_game = GameStateMachine([Player("a")], CreateTestPiles(), starting_cards, [Strategy()], headless = True, seed = 1)
+effect_turn = effect_game.curr_turn_object
+effect_deck = effect_turn.get_deck()
+effect_deck.gain_card(effect_card, "hand")
+effect_deck.gain_card(Estate(), "hand")
+effect_size = effect_deck.get_size()
+effect_silver = effect_game.game_state.get_pile("silver").get_quantity()
+effect_game.resolve_card(effect_turn.play_card(effect_deck.get_hand().index(effect_card)))
+assert (effect_turn.actions == 1) and (effect_turn.buys == 2) and (effect_turn.money == 2), "effect counters wrong"
+assert (len(effect_deck.get_hand()) == DRAW_SIZE + 2 - 1 + 1 - 1), "effect drew or trashed the wrong number of cards"
+assert (effect_game.game_state.get_pile("silver").get_quantity() == effect_silver - 1), "effect did not gain from the supply"
+assert (effect_deck.get_discard()[0] is Silver()) and (effect_deck.get_size() == effect_size), "effect gain or trash wrong"
+print "CARD EFFECT TESTS PASSED"
+
+# Lazy deck tests
+lazy_cards = [Copper(), Silver(), Gold(), Estate(), Duchie(), Province()]
+position_counts = [dict((card.name, 0) for card in lazy_cards) for i in range(0, len(lazy_cards))]
+lazy_runs = 6000
+for seed in range(0, lazy_runs):
+	lazy_deck = LazyDeck(lazy_cards, EventBus(), Random(seed))
+	for position, card in enumerate(lazy_deck.get_hand() + lazy_deck.get_draw()):
+		position_counts[position][card.name] += 1
+for counts in position_counts:
+	for count in counts.values():
+		assert (abs(count - lazy_runs / len(lazy_cards)) < 150), "lazy shuffle is not uniform"
+lazy_deck = LazyDeck(starting_cards, EventBus(), Random(4))
+lazy_deck.gain_card(Gold(), "draw")
+assert (lazy_deck.get_draw()[0] is Gold()), "gained card not on top of draw"
+lazy_deck.gain_card(Province(), "discard")
+assert (lazy_deck.get_discard()[0] is Province()), "gained card not on top of discard"
+lazy_deck.end_turn()
+assert (lazy_deck.get_hand()[0] is Gold()) and (len(lazy_deck.get_hand()) == DRAW_SIZE), "lazy draw order wrong"
+lazy_deck.end_turn()
+lazy_draw = lazy_deck.get_draw()
+assert (lazy_deck.get_draw() == lazy_draw), "settled draw order changed"
+lazy_deck.draw_cards(len(lazy_draw))
+assert (lazy_deck.get_hand()[DRAW_SIZE:] == lazy_draw), "draws don't follow the settled order"
+assert (sorted([card.name for card in lazy_deck.get_deck()]) ==
+		sorted([card.name for card in starting_cards + [Gold(), Province()]])), "lazy deck lost cards"
+lazy_game = GameStateMachine([Player("a"), Player("b")], CreateTestPiles(), starting_cards,
+							 [SmithyBigMoney(), SmithyBigMoney()], headless = True, deck_class = LazyDeck, seed = 2)
+lazy_game.play_game(400)
+assert lazy_game.game_state.is_game_over(), "lazy deck game did not finish"
+for turn in lazy_game.turn_objects_list:
+	assert (len(turn.get_deck().get_deck()) == turn.get_deck().get_size()), "lazy deck size is wrong"
+from dominion_odds import next_hand_distribution
+class OddsSmithyBigMoney(SmithyBigMoney):
+	def choose_buy(self, supply, turn):
+		next_hand_distribution(turn.get_deck())
+		return SmithyBigMoney.choose_buy(self, supply, turn)
+odds_results = []
+for strategy_class in [SmithyBigMoney, OddsSmithyBigMoney]:
+	odds_game = GameStateMachine([Player("0"), Player("1")], CreateTestPiles(), starting_cards,
+								 [BigMoney(), strategy_class()], headless = True, deck_class = LazyDeck, seed = 5)
+	odds_game.play_game(400)
+	odds_results.append((odds_game.turn_number, [turn.count_points() for turn in odds_game.turn_objects_list]))
+assert (odds_results[0] == odds_results[1]), "odds query changed the lazy deck game"
+lazy_deck = LazyDeck(starting_cards, EventBus(), Random(6))
+lazy_deck.end_turn()
+lazy_unshuffled = lazy_deck.unshuffled
+lazy_counts = lazy_deck.get_draw_counts()
+assert (lazy_deck.unshuffled == lazy_unshuffled), "draw counts fixed the draw order"
+assert (sum(lazy_counts.values()) == len(lazy_deck.draw)), "wrong draw counts"
+for deck_class in [Deck, CountDeck, LazyDeck]:
+	counted_deck = deck_class(starting_cards + [Gold(), Smithy()], EventBus(), Random(7))
+	draw_counts = {}
+	for card in counted_deck.get_draw():
+		draw_counts[card] = draw_counts.get(card, 0) + 1
+	assert (counted_deck.get_draw_counts() == draw_counts), "draw counts don't match the draw"
+print "LAZY DECK TESTS PASSED"
+
+# Results store tests
+from dominion_results import ResultsStore, record_games, game_rows
+from dominion_tournament import create_game, MatchupStats, MAX_TURNS
+results_store = ResultsStore()
+record_games(results_store, [BigMoney, SmithyBigMoney], 20, processes = 1, chunk_size = 7)
+assert (results_store.count_games() == 20), "games not stored"
+result_stats = MatchupStats(["big money", "smithy big money"])
+for seed in range(0, 20):
+	result_stats.add_game(*play_game([BigMoney, SmithyBigMoney], seed))
+pair_rates = results_store.win_rate_by_pair()
+assert (pair_rates[("big money", "smithy big money")][:2] == (20, result_stats.wins[0])), "pair win rate wrong"
+assert (pair_rates[("smithy big money", "big money")][:2] == (20, result_stats.wins[1])), "pair win rate wrong"
+assert (abs(results_store.average_game_length() - result_stats.get_average_turns()) < 1e-9), "average length wrong"
+assert (abs(results_store.average_points()["big money"] - result_stats.get_average_points(0)) < 1e-9), "average points wrong"
+result_game = create_game([BigMoney, SmithyBigMoney], 0)
+result_game.play_game(MAX_TURNS)
+result_kingdom = game_rows(result_game)[0][4]
+assert (results_store.win_rate_by_kingdom("big money")[(result_kingdom, "big money")][1] == result_stats.wins[0]), "kingdom win rate wrong"
+assert (results_store.emptied_piles().get("province", 0) > 0), "emptied piles not stored"
+results_store.add_game(result_game)
+assert (results_store.count_games() == 21), "single game not stored"
+print "RESULTS STORE TESTS PASSED"
+
+# Genetic optimizer tests
+from dominion_genetic import GeneticOptimizer, ParamStrategy, play_match, kingdom_genes
+genetic_genes = kingdom_genes()
+assert (("max smithy", 0, 6) in genetic_genes) and (("max village", 0, 6) in genetic_genes), "action card genes missing"
+optimizer = GeneticOptimizer(population_size = 6, elite = 2, games_per_opponent = 4, processes = 1, seed = 3)
+for generation, fitness, genome in optimizer.run(2):
+	assert (0.0 <= fitness <= 1.0), "fitness out of range"
+	for name, low, high in genetic_genes:
+		assert (low <= genome[name] <= high), "gene out of range"
+assert (optimizer.generation == 2) and (len(optimizer.population) == 6), "wrong population"
+assert (optimizer.population[:2] == optimizer.elites), "elites not kept"
+assert (play_match(optimizer.best[1], BigMoney, range(0, 6)) == play_match(optimizer.best[1], BigMoney, range(0, 6))), "matches not repeatable"
+no_smithy = dict((name, 0) for name, low, high in genetic_genes)
+no_smithy_game = GameStateMachine([Player("0")], CreateTestPiles(), starting_cards, [ParamStrategy(no_smithy)],
+								  headless = True, seed = 1)
+no_smithy_game.play_game(60)
+assert not no_smithy_game.curr_turn_object.get_deck().count_card(Smithy()), "bought a smithy over the limit"
+print "GENETIC OPTIMIZER TESTS PASSED"
+
+# Decision table tests
+from dominion_tables import compile_strategy, verify_table, TableStrategy, DECISION_NONE
+from dominion_tournament import CreateKingdom
+big_money_table = compile_strategy(BigMoney, tracked_cards = [])
+smithy_table = compile_strategy(SmithyBigMoney, tracked_cards = ["smithy"])
+for table in [big_money_table, smithy_table]:
+	table_size = 1
+	for size in table.dims:
+		table_size *= size
+	assert (len(table) == table_size), "table size doesn't match its dims"
+	assert (verify_table(table, 6)[1] == 0), "table disagrees with the rules"
+assert (verify_table(smithy_table, 6)[0] > 0), "no buys verified"
+assert (big_money_table.decisions[0] == DECISION_NONE), "bought something with no money"
+table_game = GameStateMachine([Player("0"), Player("1")], CreateKingdom(),
+							  CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+							  [TableStrategy(smithy_table), SmithyBigMoney()], headless = True, seed = 5)
+rules_game = GameStateMachine([Player("0"), Player("1")], CreateKingdom(),
+							  CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+							  [SmithyBigMoney(), SmithyBigMoney()], headless = True, seed = 5)
+table_game.play_game(MAX_TURNS)
+rules_game.play_game(MAX_TURNS)
+assert (table_game.turn_number == rules_game.turn_number), "table game played differently"
+assert ([turn.count_points() for turn in table_game.turn_objects_list] ==
+		[turn.count_points() for turn in rules_game.turn_objects_list]), "table game played differently"
+# Cloning shares the supply's piles until one of the games changes them, then that game gets new piles.
+table_strategy = TableStrategy(smithy_table, verify = True)
+clone_game = GameStateMachine([Player("0"), Player("1")], CreateKingdom(),
+							  CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+							  [table_strategy, SmithyBigMoney()], headless = True, seed = 5)
+clone_game.play_game(6)
+lookahead_game = clone_game.clone()
+lookahead_game.play_game(20)
+clone_game.play_game(MAX_TURNS)
+assert (table_strategy.province_pile is clone_game.game_state.get_pile("province")), "table kept a stale pile"
+assert (table_strategy.decisions > 0) and (table_strategy.mismatches == 0), "table decided from stale piles"
+assert ([turn.count_points() for turn in clone_game.turn_objects_list] ==
+		[turn.count_points() for turn in rules_game.turn_objects_list]), "cloned table game played differently"
+no_province_kingdom = [CreateMoneyPiles, CreatePointPiles]
+for table in [big_money_table, compile_strategy(BigMoney, no_province_kingdom, tracked_cards = [])]:
+	decisions, mismatches = verify_table(table, 2, pile_factories = no_province_kingdom, max_turns = 60)
+	assert (decisions > 0) and (mismatches == 0), "table wrong without a Province pile"
+print "DECISION TABLE TESTS PASSED"
+
+# Async game loop tests
+from dominion_async import GameLoop, AsyncGameStateMachine, ThinkingStrategy, RemoteStrategy, Decision
+from dominion_async import create_async_game
+async_loop = GameLoop()
+for seed in range(0, 20):
+	async_loop.add_game(create_async_game([ThinkingStrategy(BigMoney(), async_loop, 0.001),
+										   ThinkingStrategy(SmithyBigMoney(), async_loop, 0.001)], seed), MAX_TURNS)
+async_start = time.time()
+async_games = async_loop.run()
+assert (time.time() - async_start < 2.0), "games were not interleaved"
+assert (len(async_games) == 20) and (async_loop.waiting == 0), "not every game finished"
+for async_game in async_games:
+	sync_game = create_async_game([BigMoney(), SmithyBigMoney()], async_game.seed)
+	sync_game.play_game(MAX_TURNS)
+	assert (async_game.turn_number == sync_game.turn_number), "async game played differently"
+	assert ([turn.count_points() for turn in async_game.turn_objects_list] ==
+			[turn.count_points() for turn in sync_game.turn_objects_list]), "async game played differently"
+remote = RemoteStrategy()
+remote_game = create_async_game([remote, BigMoney()], 3)
+remote_loop = GameLoop()
+remote_loop.add_game(remote_game, MAX_TURNS)
+remote_loop.run()
+assert (remote_loop.waiting == 1) and (remote.phase is PHASE_ACTION), "game didn't wait for the remote player"
+assert remote.decide("all"), "remote move not taken"
+remote_loop.run()
+assert (remote.phase is PHASE_ACTION), "game didn't ask for the next play"
+remote.decide("done")
+remote_loop.run()
+assert (remote.phase is PHASE_BUY), "game didn't move on to buying"
+assert not [card for card in remote_game.curr_turn_object.get_deck().get_hand() if card.kind is CARD_COIN], "money not played"
+remote.decide("none")
+remote_loop.run()
+assert (remote_game.turn_number == 2) and (remote.phase is PHASE_ACTION), "turn didn't finish"
+assert not RemoteStrategy().decide("done"), "decided without a pending move"
+try:
+	create_async_game([RemoteStrategy(), BigMoney()], 3).play_game(MAX_TURNS)
+	assert False, "play_game waited on a remote player"
+except RuntimeError:
+	pass
+print "ASYNC GAME LOOP TESTS PASSED"
+
+# Distributed simulation tests
+import socket
+import threading
+from dominion_distributed import Coordinator, sweep_jobs, run_worker, send_message, read_message
+from dominion_tournament import run_matchup
+distributed_jobs = sweep_jobs([("big money", "smithy big money")], 60, chunk_size = 10)
+assert (len(distributed_jobs) == 6) and (distributed_jobs[-1]["seeds"] == [50, 60]), "wrong jobs"
+coordinator = Coordinator(distributed_jobs)
+coordinator_host, coordinator_port = coordinator.listen("127.0.0.1", 0)
+dead_worker = socket.create_connection((coordinator_host, coordinator_port))
+send_message(dead_worker, {"type": "request", "count": 3, "results": []})
+assert (len(read_message(dead_worker.makefile("rb"))["jobs"]) == 3), "jobs not handed out"
+dead_worker.close()
+worker_threads = [threading.Thread(target = run_worker, args = (coordinator_host, coordinator_port, 1, 2))
+				  for i in range(0, 3)]
+for thread in worker_threads:
+	thread.start()
+distributed_stats = coordinator.run(timeout = 60)
+for thread in worker_threads:
+	thread.join()
+assert (distributed_stats is not None), "sweep didn't finish"
+assert (coordinator.requeued == 3), "dead worker's jobs not requeued"
+for local_stats in run_matchup([BigMoney, SmithyBigMoney], 60, processes = 1):
+	pass
+distributed_stats = distributed_stats[("big money", "smithy big money")]
+assert ((distributed_stats.games, distributed_stats.wins, distributed_stats.points, distributed_stats.turns) ==
+		(local_stats.games, local_stats.wins, local_stats.points, local_stats.turns)), "distributed results differ"
+steal_coordinator = Coordinator(sweep_jobs([("big money", "big money")], 2, chunk_size = 1))
+assert (len(steal_coordinator.handle_request(0, {"count": 2})["jobs"]) == 2), "jobs not handed out"
+stolen = steal_coordinator.handle_request(1, {"count": 1})["jobs"]
+assert (len(stolen) == 1) and (steal_coordinator.stolen == 1), "idle worker didn't steal"
+assert (steal_coordinator.handle_request(1, {"results": [[stolen[0]["id"], {}]]})["type"] == "jobs"), "no second copy stolen"
+assert (steal_coordinator.handle_request(2, {"count": 1})["type"] == "wait"), "job handed out past max copies"
+print "DISTRIBUTED SIMULATION TESTS PASSED"
+
+# Strategy comparison tests
+from dominion_compare import Comparison, compare, play_pair, seat_seeds, COMPARE_FIRST, COMPARE_SECOND
+class MirrorBigMoney(BigMoney):
+	name = "mirror big money"
+seat_games = [GameStateMachine([Player("0"), Player("1")], CreateKingdom(), starting_cards, strategies,
+							   headless = True, seat_seeds = [11, 12])
+			  for strategies in ([BigMoney(), SmithyBigMoney()], [SmithyBigMoney(), BigMoney()])]
+for seat in range(0, 2):
+	assert (seat_games[0].turn_objects_list[seat].get_deck().get_hand() ==
+			seat_games[1].turn_objects_list[seat].get_deck().get_hand()), "seats don't shuffle the same"
+seat_clone = seat_games[0].clone()
+seat_games[0].play_game(MAX_TURNS)
+seat_clone.play_game(MAX_TURNS)
+assert ([turn.count_points() for turn in seat_clone.turn_objects_list] ==
+		[turn.count_points() for turn in seat_games[0].turn_objects_list]), "clone didn't keep the seat streams"
+assert (seat_seeds(4) == seat_seeds(4)) and (seat_seeds(4) != seat_seeds(5)), "seat seeds not repeatable"
+assert ([play_pair([BigMoney, MirrorBigMoney], seed) for seed in range(0, 10)] == [0.5] * 10), "mirrored pairs don't cancel"
+assert ([play_pair([BigMoney, MirrorBigMoney], seed, common = False) for seed in range(0, 10)] != [0.5] * 10), "independent games matched"
+comparison = compare([BigMoney, SmithyBigMoney])
+assert (comparison.decision is COMPARE_SECOND) and (comparison.get_winner() == "smithy big money"), "wrong comparison"
+assert (comparison.get_games() < 200), "comparison didn't stop early"
+comparison = compare([MirrorBigMoney, BigMoney], max_pairs = 30)
+assert (comparison.decision is None) and (comparison.pairs == 30), "decided between identical strategies"
+comparison = Comparison(["a", "b"])
+for score in [1.0, 0.5] * 10:
+	if comparison.add_pair(score, min_pairs = 4) is not None:
+		break
+assert (comparison.decision is COMPARE_FIRST) and (comparison.pairs == 9), "test didn't stop"
+assert (abs(comparison.get_score() - 7.0 / 9) < 1e-9), "wrong score"
+print "STRATEGY COMPARISON TESTS PASSED"
+
+# Game archive tests
+import os
+import shutil
+import tempfile
+from dominion_archive import ArchiveWriter, GameArchive, archive_games, rebuild_index, INDEX_SUFFIX
+from dominion_replay import replay_game
+archive_dir = tempfile.mkdtemp()
+archive_file = os.path.join(archive_dir, "games.dom")
+archive_writer = ArchiveWriter(archive_file)
+archive_games(archive_writer, [BigMoney, SmithyBigMoney], range(0, 10))
+archive_writer.close()
+archive_writer = ArchiveWriter(archive_file)
+assert (archive_writer.num_games == 10), "archive not reopened"
+archive_games(archive_writer, [SmithyBigMoney, BigMoney], range(10, 15))
+archive_writer.close()
+archive = GameArchive(archive_file)
+assert (len(archive) == 15), "games not archived"
+for game_index in [0, 7, 14]:
+	archived = archive[game_index]
+	replayed = replay_game(archived.get_record())
+	assert (archived.get_record().seed == game_index), "wrong game read"
+	assert (archived.points == [turn.count_points() for turn in replayed.turn_objects_list]), "wrong points"
+	assert (archived.turns == replayed.turn_number == archive.get_turns(game_index)), "wrong turns"
+assert (archive[-1].strategies == ["smithy big money", "big money"]), "wrong strategies"
+assert ([game.turns for game in archive.scan()] == [archive.get_turns(i) for i in range(0, 15)]), "scan out of order"
+assert ([game.replay for game in archive.scan(12)] == [archive[i].replay for i in range(12, 15)]), "scan didn't start at start"
+try:
+	archive[15]
+	assert False, "read past the last game"
+except IndexError:
+	pass
+archive.close()
+with open(archive_file, "ab") as torn_file:
+	torn_file.write("\x50\x00\x00\x00torn") # A writer that died part way through an entry.
+os.remove(archive_file + INDEX_SUFFIX)
+assert (rebuild_index(archive_file) == 15), "index not rebuilt"
+archive_writer = ArchiveWriter(archive_file)
+archive_games(archive_writer, [BigMoney, BigMoney], [15])
+archive_writer.close()
+archive = GameArchive(archive_file)
+assert (len(archive) == 16) and (archive[15].get_record().seed == 15), "torn entry not cut off"
+assert (len(list(archive.scan())) == 16), "scan read the torn entry"
+archive.close()
+archive_size = os.path.getsize(archive_file)
+with open(archive_file, "r+b") as short_file:
+	short_file.truncate(archive_size - 10) # The index got to disk before the last entry did.
+archive = GameArchive(archive_file)
+assert (len(archive) == 15), "read an entry past the end of the data"
+archive.close()
+archive_writer = ArchiveWriter(archive_file, sync = True)
+assert (archive_writer.num_games == 15) and (os.path.getsize(archive_file) < archive_size - 10), "index not cut back"
+archive_games(archive_writer, [BigMoney, BigMoney], [16])
+archive_writer.close()
+archive = GameArchive(archive_file)
+assert (len(archive) == 16) and (archive[15].get_record().seed == 16), "entry not appended after the cut"
+assert ([game.turns for game in archive.scan()] == [archive.get_turns(i) for i in range(0, 16)]), "archive corrupted"
+archive.close()
+shutil.rmtree(archive_dir)
+print "GAME ARCHIVE TESTS PASSED"
+
+# Bulk money play tests
+from dominion_decks import card_ids
+def check_hand_counts(deck):
+	names = {}
+	kinds = {}
+	for card in deck.get_hand():
+		names[card.name] = names.get(card.name, 0) + 1
+		kinds[card.kind] = kinds.get(card.kind, 0) + 1
+	assert (dict((name, count) for name, count in deck.hand_names.items() if count) == names), "hand names out of step"
+	assert (dict((kind, count) for kind, count in deck.hand_kinds.items() if count) == kinds), "hand kinds out of step"
+bulk_hand = [Copper(), Estate(), Smithy(), Gold(), Village(), Silver(), Copper(), Province()]
+for deck_class in [Deck, CountDeck, LazyDeck]:
+	bulk_turn = TurnObject(Player("0"), bulk_hand, None, EventBus(), deck_class, Random(0))
+	bulk_deck = bulk_turn.get_deck()
+	bulk_deck.draw_cards(len(bulk_hand) - DRAW_SIZE)
+	bulk_order = list(bulk_deck.get_hand())
+	check_hand_counts(bulk_deck)
+	assert (bulk_deck.find_kind(CARD_ACTION) == [index for index, card in enumerate(bulk_order)
+												  if card.kind is CARD_ACTION]), "wrong action indexes"
+	bulk_clone = bulk_turn.clone()
+	bulk_turn.actions = 1
+	bulk_turn.play_all_money()
+	assert (bulk_turn.money == 7) and (bulk_turn.actions == 0), "money not played"
+	assert (bulk_deck.get_hand() == [card for card in bulk_order if card.kind is not CARD_COIN]), "hand order changed"
+	assert (bulk_deck.get_in_play() == [card for card in bulk_order if card.kind is CARD_COIN]), "in play order changed"
+	assert (bulk_clone.get_deck().get_hand() == bulk_order), "clone's hand changed"
+	check_hand_counts(bulk_deck)
+	check_hand_counts(bulk_clone.get_deck())
+	assert (bulk_deck.find_kind(CARD_COIN) == []) and (bulk_deck.play_kind(CARD_COIN) == []), "money left in hand"
+	assert not bulk_deck.discard_cards(Copper()) and not bulk_deck.trash_card(Gold()), "card not in hand removed"
+	assert bulk_deck.discard_cards(Estate()) and bulk_deck.trash_card(Province()), "card in hand not removed"
+	bulk_deck.gain_card(Silver(), "hand")
+	bulk_deck.play_card(len(bulk_deck.get_hand()) - 1)
+	bulk_deck.gain_card(Silver(), "hand")
+	check_hand_counts(bulk_deck)
+	assert (bulk_deck.hand_kinds[CARD_POINT] == 0) and (bulk_deck.hand_names["silver"] == 1), "wrong hand counts"
+	bulk_turn.play_all_money()
+	assert (bulk_turn.money == 9) and (bulk_deck.hand_kinds[CARD_COIN] == 0), "gained money not played"
+	bulk_turn.play_all_money()
+	assert (bulk_turn.money == 9), "money played twice"
+	if deck_class is CountDeck:
+		assert (bulk_deck.hand_counts[card_ids["copper"]] == 0) and (bulk_deck.in_play_counts[card_ids["copper"]] == 2), "counts not moved"
+	bulk_turn.end_turn()
+	check_hand_counts(bulk_deck)
+	assert (sorted([card.name for card in bulk_deck.get_deck()]) ==
+			sorted([card.name for card in bulk_hand if card.name != "province"] + ["silver", "silver"])), "cards lost"
+	bulk_deck.set_hand([Gold(), Copper(), Province()])
+	check_hand_counts(bulk_deck)
+	for check in range(0, 2):
+		bulk_cards = bulk_deck.get_deck()
+		assert (bulk_deck.get_size() == len(bulk_cards)), "set_hand left the size behind"
+		assert (bulk_deck.count_points() == sum([card.points for card in bulk_cards])), "set_hand left the points behind"
+		for card in [Gold(), Copper(), Estate(), Province(), Smithy()]:
+			assert (bulk_deck.count_card(card) == len([other for other in bulk_cards if other is card])), "set_hand left the counts behind"
+		if deck_class is CountDeck:
+			assert (bulk_deck.get_composition(bulk_deck.hand_counts) ==
+					dict((name, count) for name, count in bulk_deck.hand_names.items() if count)), "hand count vector out of step"
+		bulk_deck.end_turn()
+print "BULK MONEY PLAY TESTS PASSED"
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+import sys
+from itertools import combinations
+from multiprocessing import Pool, cpu_count
+
+from dominion import GameStateMachine, Player
+from dominion_cards import *
+from dominion_bots import BigMoney, SmithyBigMoney
+
+# Config
+NUM_STARTING_COPPER = 7
+NUM_STARTING_ESTATES = 3
+MAX_TURNS = 400 # Counts every player's turn, stops bots that never end the game.
+GAMES_PER_CHUNK = 100 # Games a worker plays before sending results back.
+DEFAULT_KINGDOM = [CreateMoneyPiles, CreatePointPiles, CreateCardPiles, CreateEndingPiles]
+
+class MatchupStats:
+	"""Aggregated results for one matchup, seat 0 is always strategies[0].
+
+	Members:
+	strategies -- names of the strategies in the matchup
+	games      -- number of games played
+	wins       -- outright wins per strategy
+	ties       -- games with more than one winner
+	points     -- total points scored per strategy
+	turns      -- total turns played (every player's turn)
+	"""
+	def __init__(self, strategies):
+		self.strategies = strategies
+		self.games = 0
+		self.wins = [0] * len(strategies)
+		self.ties = 0
+		self.points = [0] * len(strategies)
+		self.turns = 0
+
+	def __repr__(self):
+		return str(self)
+
+	def __str__(self):
+		lines = ["{0} games, {1} ties, {2:.1f} turns per game".format(
+				self.games, self.ties, self.get_average_turns())]
+		for index, name in enumerate(self.strategies):
+			lines.append("   {0}: win rate {1:.3f} average points {2:.2f}".format(
+					name, self.get_win_rate(index), self.get_average_points(index)))
+		return "\n".join(lines)
+
+	def add_game(self, points, winners, turns):
+		"""Adds one game, points and winners are indexed by strategy not by seat."""
+		self.games += 1
+		self.turns += turns
+		for index, score in enumerate(points):
+			self.points[index] += score
+		if len(winners) > 1:
+			self.ties += 1
+		else:
+			self.wins[winners[0]] += 1
+
+	def merge(self, other):
+		"""Adds the results in other into these stats."""
+		self.games += other.games
+		self.ties += other.ties
+		self.turns += other.turns
+		for index in range(0, len(self.strategies)):
+			self.wins[index] += other.wins[index]
+			self.points[index] += other.points[index]
+
+	def get_win_rate(self, index):
+		if not self.games:
+			return 0.0
+		return float(self.wins[index]) / self.games
+
+	def get_average_points(self, index):
+		if not self.games:
+			return 0.0
+		return float(self.points[index]) / self.games
+
+	def get_average_turns(self):
+		if not self.games:
+			return 0.0
+		return float(self.turns) / self.games
+
+def CreateKingdom(pile_factories = None):
+	"""Returns fresh supply piles from the given dominion_cards pile factories."""
+	piles = []
+	for factory in pile_factories or DEFAULT_KINGDOM:
+		piles += factory()
+	return piles
+
+def create_game(strategy_classes, seed, pile_factories = None, profiler = None):
+	"""Returns a headless GameStateMachine with a fresh kingdom, player names are strategy indexes.
+
+	Seats rotate with the seed so no strategy always goes first.
+	"""
+	num_players = len(strategy_classes)
+	seats = [(seed + seat) % num_players for seat in range(0, num_players)]
+	players = [Player(str(index)) for index in seats]
+	strategies = [strategy_classes[index]() for index in seats]
+	return GameStateMachine(players, CreateKingdom(pile_factories),
+							CreateStartingCards(NUM_STARTING_COPPER, NUM_STARTING_ESTATES),
+							strategies, headless = True, seed = seed, profiler = profiler)
+
+def play_game(strategy_classes, seed, pile_factories = None, max_turns = MAX_TURNS, profiler = None):
+	"""Plays one headless game and returns (points, winners, turns) indexed by strategy.
+
+	A Profiler passed in collects the game's phase timings.
+	"""
+	game = create_game(strategy_classes, seed, pile_factories, profiler)
+	game.play_game(max_turns)
+	points = [0] * len(strategy_classes)
+	for player, score in game.get_scores():
+		points[int(player.name)] = score
+	winners = [int(player.name) for player in game.get_winners()]
+	return points, winners, game.turn_number
+
+def _play_chunk(job):
+	"""Worker entry point, plays the games for a list of seeds and returns their MatchupStats."""
+	strategy_classes, seeds, pile_factories, max_turns = job
+	stats = MatchupStats([cls.name for cls in strategy_classes])
+	for seed in seeds:
+		stats.add_game(*play_game(strategy_classes, seed, pile_factories, max_turns))
+	return stats
+
+def _chunk_jobs(strategy_classes, num_games, base_seed, chunk_size, pile_factories, max_turns):
+	for start in range(0, num_games, chunk_size):
+		seeds = range(base_seed + start, base_seed + min(start + chunk_size, num_games))
+		yield (strategy_classes, seeds, pile_factories, max_turns)
+
+def run_matchup(strategy_classes, num_games, processes = None, base_seed = 0,
+				chunk_size = GAMES_PER_CHUNK, pile_factories = None, max_turns = MAX_TURNS, pool = None):
+	"""Plays num_games between the given Strategy classes across a process pool.
+
+	Yields the running MatchupStats every time a chunk of games finishes. Game i
+	uses seed base_seed + i so any single game can be replayed with play_game.
+
+	Arguments:
+	strategy_classes -- module level Strategy classes, they are sent to the workers
+	processes        -- worker processes, defaults to every core, 1 plays in this process
+	pile_factories   -- dominion_cards pile factories making up the kingdom
+	pool             -- an existing multiprocessing Pool to reuse
+	"""
+	stats = MatchupStats([cls.name for cls in strategy_classes])
+	jobs = _chunk_jobs(strategy_classes, num_games, base_seed, chunk_size, pile_factories, max_turns)
+	if pool is None and processes == 1:
+		for job in jobs:
+			stats.merge(_play_chunk(job))
+			yield stats
+		return
+	own_pool = pool is None
+	if own_pool:
+		pool = Pool(processes or cpu_count())
+	try:
+		for chunk_stats in pool.imap_unordered(_play_chunk, jobs):
+			stats.merge(chunk_stats)
+			yield stats
+	finally:
+		if own_pool:
+			pool.terminate()
+			pool.join()
+
+def run_tournament(strategy_classes, num_games, processes = None, base_seed = 0,
+				   chunk_size = GAMES_PER_CHUNK, pile_factories = None, max_turns = MAX_TURNS):
+	"""Plays num_games for every pair of strategies, returns a dict of (name, name) to MatchupStats."""
+	results = {}
+	pool = None
+	if processes != 1:
+		pool = Pool(processes or cpu_count())
+	try:
+		for matchup in combinations(strategy_classes, 2):
+			stats = None
+			for stats in run_matchup(matchup, num_games, processes, base_seed, chunk_size,
+									 pile_factories, max_turns, pool):
+				pass
+			results[tuple(cls.name for cls in matchup)] = stats
+	finally:
+		if pool is not None:
+			pool.terminate()
+			pool.join()
+	return results
+
+if __name__ == "__main__":
+	num_games = 1000
+	if len(sys.argv) > 1:
+		num_games = int(sys.argv[1])
+	for stats in run_matchup([BigMoney, SmithyBigMoney], num_games):
+		pass
+	print stats
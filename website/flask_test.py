@@ -1,5 +1,13 @@
-from flask import Flask, render_template
+import os
+import sys
+from flask import Flask, render_template, request, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dominion_server import GameRegistry, ERROR_MESSAGES, ERROR_UNKNOWN_GAME, ERROR_BAD_REQUEST, ERROR_NO_PLAYERS
+from dominion_server import ERROR_TOO_MANY_PLAYERS, ERROR_INVALID_CARD, BOT_CLASSES, MAX_PLAYERS
+
 app = Flask(__name__)
+registry = GameRegistry()
 
 @app.route('/')
 def index():
@@ -10,6 +18,124 @@ def index():
 def hello(name="Unknown user"):
 	return render_template('dom-html.html', name = name)
 
+# Game server, state responses only carry what changed since the client's
+# ?since=<version> (or the "since" field of a POST), see WebGame.get_updates.
+# Malformed requests get a 400 with an ERROR_* code like any other error.
+class RequestError(Exception):
+	"""Raised while reading a request, the route answers with error_response(error, message)."""
+	def __init__(self, message, error = ERROR_BAD_REQUEST):
+		Exception.__init__(self, message)
+		self.error = error
+		self.message = message
+
+def error_response(error, message = None):
+	status = 404 if error == ERROR_UNKNOWN_GAME else 400
+	return jsonify(error = error, message = message or ERROR_MESSAGES[error]), status
+
+@app.errorhandler(RequestError)
+def request_error(error):
+	return error_response(error.error, error.message)
+
+def request_options():
+	"""Returns the JSON body as a dict, {} if there is none."""
+	options = request.get_json(silent = True)
+	if options is None:
+		return {}
+	if not isinstance(options, dict):
+		raise RequestError("The body must be a JSON object.")
+	return options
+
+def parse_count(value, name):
+	"""Returns value, a JSON number or query string, as an int of at least 0."""
+	if isinstance(value, bool) or not isinstance(value, (int, long, basestring)):
+		raise RequestError(name + " must be a whole number.")
+	try:
+		count = int(value)
+	except ValueError:
+		raise RequestError(name + " must be a whole number.")
+	if count < 0:
+		raise RequestError(name + " can't be negative.")
+	return count
+
+def updates_response(web_game, since):
+	version, changes, full = web_game.get_updates(since)
+	return jsonify(game_id = web_game.game_id, version = version, changes = changes, full = full)
+
+def request_since():
+	since = request.args.get('since')
+	if since is None:
+		since = request_options().get('since')
+	if since is None:
+		return None
+	return parse_count(since, "since")
+
+@app.route('/games', methods = ['POST'])
+def create_game():
+	"""Body: {"people": number of people, "bots": [bot name, ...], "seed": number}"""
+	options = request_options()
+	people = parse_count(options.get('people', 1), "people")
+	bots = options.get('bots', ['big money'])
+	if not isinstance(bots, list) or [name for name in bots if not isinstance(name, basestring) or
+										 name not in BOT_CLASSES]:
+		raise RequestError("Bots are " + ", ".join(sorted(BOT_CLASSES)))
+	if not people + len(bots):
+		raise RequestError(ERROR_MESSAGES[ERROR_NO_PLAYERS], ERROR_NO_PLAYERS)
+	if people + len(bots) > MAX_PLAYERS:
+		raise RequestError(ERROR_MESSAGES[ERROR_TOO_MANY_PLAYERS], ERROR_TOO_MANY_PLAYERS)
+	seed = options.get('seed')
+	if seed is not None:
+		seed = parse_count(seed, "seed")
+	web_game = registry.create_game(people, bots, seed)
+	with web_game.lock:
+		return updates_response(web_game, None)
+
+@app.route('/games/<game_id>', methods = ['GET'])
+def get_game(game_id):
+	web_game = registry.get_game(game_id)
+	if web_game is None:
+		return error_response(ERROR_UNKNOWN_GAME)
+	since = request_since()
+	with web_game.lock:
+		return updates_response(web_game, since)
+
+@app.route('/games/<game_id>', methods = ['DELETE'])
+def delete_game(game_id):
+	if not registry.remove_game(game_id):
+		return error_response(ERROR_UNKNOWN_GAME)
+	return jsonify(game_id = game_id)
+
+@app.route('/games/<game_id>/play', methods = ['POST'])
+def play(game_id):
+	"""Body: {"card": hand index, "all" or "done", "since": version}"""
+	return decide(game_id, 'play', 'card')
+
+@app.route('/games/<game_id>/buy', methods = ['POST'])
+def buy(game_id):
+	"""Body: {"card": card name or "none", "since": version}"""
+	return decide(game_id, 'buy', 'card')
+
+def decide(game_id, method, field):
+	web_game = registry.get_game(game_id)
+	if web_game is None:
+		return error_response(ERROR_UNKNOWN_GAME)
+	decision = request_options().get(field, request.args.get(field))
+	if decision is None:
+		raise RequestError(field + " is missing.")
+	if isinstance(decision, (int, long)) and not isinstance(decision, bool):
+		decision = str(decision)
+	if not isinstance(decision, basestring):
+		raise RequestError(field + " must be a string or a hand index.")
+	try:
+		decision = decision.encode("ascii") # Card names and decisions are plain ASCII.
+	except UnicodeError:
+		return error_response(ERROR_INVALID_CARD)
+	since = request_since()
+	with web_game.lock:
+		error = getattr(web_game, method)(decision)
+		if error:
+			return error_response(error)
+		return updates_response(web_game, since)
+
 if __name__ == '__main__':
    app.debug = True
-   app.run()
\ No newline at end of file
+   app.run(threaded = True)